@@ -1,18 +1,19 @@
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
 from flask_login import LoginManager
 from flask_mail import Mail
 from flask_wtf.csrf import CSRFProtect
 from dotenv import load_dotenv
 import os
 import re
+import sys
 from markupsafe import Markup
 from zoneinfo import ZoneInfo
 
 
-db = SQLAlchemy()
-migrate = Migrate()
+# reads of @replica_reads views go to DATABASE_REPLICA_URL when it is set
+from .utils.replica import RoutingSession
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 login_manager = LoginManager()
 mail = Mail()
 csrf = CSRFProtect()
@@ -25,8 +26,38 @@ def create_app() -> Flask:
 
     app.config.from_object("config.Config")
 
+    # compiled templates persist across processes (instance/jinja_cache, `flask templates compile`)
+    from .utils.template_cache import init_template_cache
+    init_template_cache(app)
+
+    # pool sizing and fail-fast timeouts from the DB_* settings; explicit engine options win
+    from .utils.db_pool import engine_options, init_pool_metrics
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+        **engine_options(app.config), **app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {}),
+    }
+
     db.init_app(app)
-    migrate.init_app(app, db)
+    with app.app_context():
+        init_pool_metrics(app, db.engine)
+
+    # /metrics; its timer hook goes first so cached pages are measured too
+    from .utils.metrics import init_metrics
+    init_metrics(app)
+
+    # opt-in cProfile / stack sampler for a fraction of requests or X-Profile, /_profiles
+    from .utils.profiler import init_profiler
+    init_profiler(app)
+
+    # per-request statement count / DB time (Server-Timing, log), slow-query and N+1 warnings
+    from .utils.sqlstats import init_sql_instrumentation
+    init_sql_instrumentation(app)
+
+    from .utils.replica import init_replica_routing
+    init_replica_routing(app, db)
+    # Flask-Migrate imports alembic, a large share of startup; only the `flask db` commands need it
+    if os.environ.get("FLASK_RUN_FROM_CLI") or "flask_migrate" in sys.modules:
+        from flask_migrate import Migrate
+        Migrate(app, db)
     login_manager.init_app(app)
     mail.init_app(app)
     csrf.init_app(app)
@@ -47,6 +78,14 @@ def create_app() -> Flask:
     app.register_blueprint(tourism_bp)
     app.register_blueprint(reviews_bp)
     app.register_blueprint(bookings_bp)
+    from .routes.uploads import uploads_bp
+    app.register_blueprint(uploads_bp)
+
+    from .cli import media_cli, seed_command, templates_cli, tours_cli
+    app.cli.add_command(media_cli)
+    app.cli.add_command(tours_cli)
+    app.cli.add_command(templates_cli)
+    app.cli.add_command(seed_command)
 
     login_manager.login_view = "auth.login"
     login_manager.login_message_category = "warning"
@@ -54,6 +93,14 @@ def create_app() -> Flask:
     # Ensure models are imported so Flask-Login user_loader is registered
     from .models import user as _user  # noqa: F401
 
+    # listing views are counted first, so pages served from cache (or 304) still count
+    from .utils.view_counter import init_view_counter
+    init_view_counter(app)
+
+    # anonymous GETs of public pages are answered from cache before the hooks below run
+    from .utils.page_cache import init_page_cache
+    init_page_cache(app)
+
     @app.before_request
     def _inject_unread_counter():
         # lightweight unread count for the navbar badge
@@ -72,6 +119,14 @@ def create_app() -> Flask:
             # avoid breaking requests if DB is not reachable for some reason
             pass
 
+    from flask import flash, redirect, request, url_for
+    from werkzeug.exceptions import RequestEntityTooLarge
+
+    @app.errorhandler(RequestEntityTooLarge)
+    def _upload_too_large(_e):
+        flash("Слишком большой объём загрузки. Уменьшите количество или размер файлов.", "warning")
+        return redirect(request.referrer or url_for("main.index"))
+
     # Jinja filter: linkify urls (used for platform notifications)
     _url_re = re.compile(r"(https?://[\w\-./?=&%#:+]+)")
 
@@ -84,16 +139,53 @@ def create_app() -> Flask:
     app.jinja_env.filters["linkify"] = linkify
 
     # media filter: converts stored relative paths (uploads/..) to full static URL
-    from flask import url_for
+    # With a size (``photo|media(320)``) uploads resolve to the closest resized rendition.
+    from .utils.images import derivative_path, derivative_widths, has_derivatives, media_subdir, pick_width
 
-    def media(src: str):
+    def media(src: str, size: int | None = None):
         if not src:
             return ""
+        if size and has_derivatives(src):
+            src = derivative_path(src, pick_width(derivative_widths(media_subdir(src)), size), "jpg")
         if src.startswith("http") or src.startswith("data:"):
             return src
         return url_for("static", filename=src)
 
+    # srcset filter: "url 320w, url 800w, ..." for uploads with renditions, "" otherwise
+    def srcset(src: str, ext: str = "webp") -> str:
+        if not src or not has_derivatives(src):
+            return ""
+        return ", ".join(
+            f"{media(derivative_path(src, width, ext))} {width}w" for width in derivative_widths(media_subdir(src))
+        )
+
     app.jinja_env.filters["media"] = media
+    app.jinja_env.filters["srcset"] = srcset
+
+    # dimensions + inline placeholder of an upload (preloaded per page via preload_media_meta)
+    from .utils.media_refs import media_meta
+    app.jinja_env.filters["media_meta"] = media_meta
+
+    # cached_card('exchange/_search_card.html', item): card markup cached per row version
+    from .utils.fragment_cache import init_fragment_cache
+    init_fragment_cache(app)
+
+    # per-city "most booked tours" boards kept up to date by the booking routes
+    from .utils.leaderboard import init_leaderboard
+    init_leaderboard(app)
+
+    # workers forked from a preloading master get fresh pools, clients and in-process caches
+    from .utils.prefork import init_fork_safety
+    init_fork_safety(app)
+
+    @app.after_request
+    def _cache_uploaded_media(response):
+        # uploaded media never changes under the same name; let browsers/CDN keep it
+        if request.endpoint == "static" and response.status_code == 200:
+            filename = (request.view_args or {}).get("filename", "")
+            if media_subdir(filename) and app.config.get("MEDIA_CACHE_CONTROL"):
+                response.headers["Cache-Control"] = app.config["MEDIA_CACHE_CONTROL"]
+        return response
 
     # datetime formatting filter with timezone (default Europe/Moscow)
     def format_dt(value, fmt: str = "%d.%m.%Y %H:%M", tz_name: str | None = None) -> Markup:
@@ -0,0 +1,502 @@
+import heapq
+import os
+import shutil
+import tempfile
+import time
+from itertools import groupby
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+from app.utils.images import MEDIA_SUBDIRS, derivative_paths, is_derivative, media_subdir
+
+
+media_cli = AppGroup("media", help="Maintenance commands for uploaded media.")
+tours_cli = AppGroup("tours", help="Maintenance commands for tour offers.")
+templates_cli = AppGroup("templates", help="Jinja template bytecode cache.")
+
+# Rows fetched per round trip while streaming referenced paths, and lines
+# held in memory before a sorted run is spilled to disk by media gc.
+_GC_YIELD_PER = 1000
+_GC_RUN_SIZE = 100_000
+
+
+def _local_originals(subdir: str):
+    """Yield static-relative paths of original uploads in static/<subdir>."""
+    folder = os.path.join(current_app.static_folder, subdir)
+    if not os.path.isdir(folder):
+        return
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if entry.is_file() and not is_derivative(entry.name):
+                yield f"{subdir}/{entry.name}"
+
+
+def _s3_keys(s3, bucket: str, subdir: str) -> set:
+    keys = set()
+    paginator = s3.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket, Prefix=f"{subdir}/"):
+        for obj in page.get("Contents", []):
+            keys.add(obj["Key"])
+    return keys
+
+
+def _mark_renditions(paths) -> None:
+    """Flag the MediaObject rows of ``paths`` as having their renditions stored."""
+    from app import db
+    from app.models import MediaObject
+
+    paths = list(paths)
+    for i in range(0, len(paths), 1000):
+        db.session.execute(
+            db.update(MediaObject).where(MediaObject.path.in_(paths[i:i + 1000])).values(has_renditions=True)
+        )
+    db.session.commit()
+
+
+@media_cli.command("derivatives")
+@click.option("--subdir", "subdirs", multiple=True, type=click.Choice(MEDIA_SUBDIRS),
+              help="Limit to these upload directories (default: all).")
+@click.option("--force", is_flag=True, help="Re-render renditions that already exist.")
+def backfill_derivatives(subdirs, force):
+    """Render missing WebP/JPEG renditions for uploads stored before they existed.
+
+    Uploads whose renditions are all in place are flagged (MediaObject.has_renditions),
+    which is what makes the templates link them.
+    """
+    from app.utils.helpers import _get_s3_client, _s3_public_url, _store_derivatives
+    from app.utils.page_cache import clear_pages
+
+    subdirs = subdirs or MEDIA_SUBDIRS
+    rendered = skipped = failed = 0
+    complete = []
+
+    for subdir in subdirs:
+        for rel in _local_originals(subdir):
+            targets = [os.path.join(current_app.static_folder, p) for p in derivative_paths(rel)]
+            if not force and all(os.path.exists(t) for t in targets):
+                skipped += 1
+                complete.append(rel)
+                continue
+            with open(os.path.join(current_app.static_folder, rel), "rb") as f:
+                ok = _store_derivatives(f, rel, subdir, use_s3=False)
+            rendered += ok
+            failed += not ok
+            if ok:
+                complete.append(rel)
+
+    s3 = _get_s3_client()
+    bucket = current_app.config.get("S3_BUCKET")
+    if s3 and bucket:
+        for subdir in subdirs:
+            keys = _s3_keys(s3, bucket, subdir)
+            for key in sorted(k for k in keys if not is_derivative(k)):
+                if not force and all(p in keys for p in derivative_paths(key)):
+                    skipped += 1
+                    complete.append(_s3_public_url(key))
+                    continue
+                with tempfile.SpooledTemporaryFile(max_size=current_app.config.get("MEDIA_SPOOL_MAX_MEMORY", 1024 * 1024)) as spool:
+                    s3.download_fileobj(bucket, key, spool)
+                    spool.seek(0)
+                    ok = _store_derivatives(spool, key, subdir, use_s3=True)
+                rendered += ok
+                failed += not ok
+                if ok:
+                    complete.append(_s3_public_url(key))
+
+    _mark_renditions(complete)
+    if complete:
+        # cards pick the new state up by themselves (see fragment_cache), whole pages do not
+        clear_pages()
+    click.echo(f"rendered: {rendered}, up to date: {skipped}, failed: {failed}")
+
+
+def _external_sort(lines, run_size: int = _GC_RUN_SIZE):
+    """Sort an arbitrarily long stream of text lines with bounded memory.
+
+    Runs of ``run_size`` lines are sorted and spilled to temp files, then
+    merged lazily with heapq.merge. Small inputs never touch the disk.
+    """
+    runs, chunk = [], []
+    try:
+        for line in lines:
+            chunk.append(line)
+            if len(chunk) >= run_size:
+                chunk.sort()
+                run = tempfile.TemporaryFile("w+", encoding="utf-8")
+                run.writelines(f"{item}\n" for item in chunk)
+                run.seek(0)
+                runs.append(run)
+                chunk = []
+        chunk.sort()
+        if not runs:
+            yield from chunk
+            return
+        streams = [(item.rstrip("\n") for item in run) for run in runs]
+        yield from heapq.merge(chunk, *streams)
+    finally:
+        for run in runs:
+            run.close()
+
+
+def _storage_ref(path: str):
+    """Map a stored path/URL to the "<backend>\t<key>" form used by media gc, or None."""
+    from app.utils.helpers import _s3_key_from_url
+
+    if not media_subdir(path):
+        return None
+    if path.startswith("http"):
+        key = _s3_key_from_url(path)
+        return f"s3\t{key}" if key else None
+    rel = path[len("/static/"):] if path.startswith("/static/") else path
+    return f"local\t{rel}"
+
+
+def _referenced_refs(stats: dict):
+    """Stream every storage ref (originals and renditions) the database points at.
+
+    Referenced upload URLs that map to no storage key (e.g. stored under an
+    older S3_PUBLIC_URL) are counted in ``stats["unmapped"]``, the first few
+    printed: their objects cannot be told apart from garbage.
+    """
+    from app import db
+    from app.models import HousingExchange, RemoteTourism, User
+
+    def paths():
+        for column in (HousingExchange.photos, RemoteTourism.photos):
+            stmt = db.select(column).execution_options(yield_per=_GC_YIELD_PER)
+            for (photos,) in db.session.execute(stmt):
+                yield from photos or ()
+        stmt = db.select(User.avatar).where(User.avatar.isnot(None)).execution_options(yield_per=_GC_YIELD_PER)
+        for (avatar,) in db.session.execute(stmt):
+            yield avatar
+
+    for path in paths():
+        ref = _storage_ref(path)
+        if not ref:
+            if media_subdir(path):
+                stats["unmapped"] += 1
+                if stats["unmapped"] <= 5:
+                    click.echo(f"referenced but not mapped to a storage key: {path}", err=True)
+            continue
+        backend, key = ref.split("\t", 1)
+        yield ref
+        for derivative in derivative_paths(key):
+            yield f"{backend}\t{derivative}"
+
+
+def _stored_refs(subdirs, s3, bucket):
+    """Stream "<backend>\t<key>\t<mtime>\t<size>" for every object in storage."""
+    for subdir in subdirs:
+        folder = os.path.join(current_app.static_folder, subdir)
+        if os.path.isdir(folder):
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        st = entry.stat()
+                        yield f"local\t{subdir}/{entry.name}\t{st.st_mtime:.0f}\t{st.st_size}"
+        if s3 and bucket:
+            paginator = s3.get_paginator("list_objects_v2")
+            for page in paginator.paginate(Bucket=bucket, Prefix=f"{subdir}/"):
+                for obj in page.get("Contents", []):
+                    yield f"s3\t{obj['Key']}\t{obj['LastModified'].timestamp():.0f}\t{obj['Size']}"
+
+
+def _find_orphans(subdirs, s3, bucket, cutoff: float, stats: dict):
+    """Merge the sorted storage listing against the sorted referenced set.
+
+    Both sides are ordered by "<backend>\t<key>" (the tab sorts below any key
+    character, so the trailing mtime/size never changes the order). Yields
+    (backend, key, size) for unreferenced objects last modified before ``cutoff``.
+    The referenced side is read completely before the first orphan is yielded,
+    so ``stats["unmapped"]`` is final by then.
+    """
+    referenced = (ref for ref, _ in groupby(_external_sort(_referenced_refs(stats))))
+    current = next(referenced, None)
+    for line in _external_sort(_stored_refs(subdirs, s3, bucket)):
+        backend, key, mtime, size = line.split("\t")
+        ref = f"{backend}\t{key}"
+        while current is not None and current < ref:
+            current = next(referenced, None)
+        stats["scanned"] += 1
+        if ref == current:
+            stats["referenced"] += 1
+        elif float(mtime) > cutoff:
+            stats["recent"] += 1
+        else:
+            yield backend, key, int(size)
+
+
+def _delete_orphans(batch) -> dict:
+    """Remove a batch of orphans from storage and drop their refcount rows."""
+    from app import db
+    from app.models import MediaObject
+    from app.utils.helpers import _s3_public_url
+    from app.utils.media_deletion import delete_stored
+
+    s3_keys = [key for backend, key in batch if backend == "s3"]
+    local = [key for backend, key in batch if backend == "local"]
+    result = delete_stored(s3_keys, local)
+    paths = local + [_s3_public_url(key) for key in s3_keys]
+    db.session.execute(db.delete(MediaObject).where(MediaObject.path.in_(paths)))
+    db.session.commit()
+    return result
+
+
+@media_cli.command("gc")
+@click.option("--subdir", "subdirs", multiple=True, type=click.Choice(MEDIA_SUBDIRS),
+              help="Limit to these upload directories (default: all).")
+@click.option("--grace-hours", type=float, default=None,
+              help="Keep orphans modified within this many hours (default: MEDIA_GC_GRACE_HOURS).")
+@click.option("--dry-run", is_flag=True, help="Only report what would be deleted.")
+@click.option("--verbose", "-v", is_flag=True, help="List every orphan.")
+@click.option("--force", is_flag=True,
+              help="Delete even though some referenced URLs map to no storage key (see below).")
+def collect_garbage(subdirs, grace_hours, dry_run, verbose, force):
+    """Delete uploaded files that no listing, tour or avatar references any more.
+
+    A referenced upload URL that maps to no storage key (say S3_PUBLIC_URL or
+    the CDN host changed since it was stored) makes its object look
+    unreferenced, so nothing is deleted while there are any unless --force.
+    """
+    from app.utils.helpers import _get_s3_client
+    from app.utils.media_deletion import _S3_BATCH_SIZE
+
+    subdirs = sorted(subdirs or MEDIA_SUBDIRS)
+    if grace_hours is None:
+        grace_hours = current_app.config.get("MEDIA_GC_GRACE_HOURS", 24)
+    # uploads are stored before their row commits; the grace period keeps
+    # in-flight forms from losing their files
+    cutoff = time.time() - grace_hours * 3600
+    s3 = _get_s3_client()
+    bucket = current_app.config.get("S3_BUCKET")
+
+    stats = dict(scanned=0, referenced=0, unmapped=0, recent=0, orphans=0, bytes=0, deleted=0, failed=0)
+    batch = []
+    for backend, key, size in _find_orphans(subdirs, s3, bucket, cutoff, stats):
+        stats["orphans"] += 1
+        stats["bytes"] += size
+        if verbose or dry_run:
+            click.echo(f"{'would delete' if dry_run else 'delete'} {backend}:{key} ({size} B)")
+        if dry_run:
+            continue
+        if stats["unmapped"] and not force:
+            raise click.ClickException(
+                f"{stats['unmapped']} referenced upload URLs map to no storage key, their objects would be "
+                "deleted as orphans. Fix S3_PUBLIC_URL (or the stored URLs) or rerun with --force."
+            )
+        batch.append((backend, key))
+        if len(batch) >= _S3_BATCH_SIZE:
+            result = _delete_orphans(batch)
+            stats["deleted"] += result.get("deleted", 0)
+            stats["failed"] += result.get("failed", 0)
+            batch = []
+    if batch:
+        result = _delete_orphans(batch)
+        stats["deleted"] += result.get("deleted", 0)
+        stats["failed"] += result.get("failed", 0)
+
+    click.echo(
+        f"scanned: {stats['scanned']}, referenced: {stats['referenced']}, unmapped: {stats['unmapped']}, "
+        f"within grace period: {stats['recent']}, orphans: {stats['orphans']} "
+        f"({stats['bytes'] / 1024 / 1024:.1f} MiB)"
+        + ("" if dry_run else f", deleted: {stats['deleted']}, failed: {stats['failed']}")
+    )
+
+
+@media_cli.command("placeholders")
+@click.option("--force", is_flag=True, help="Recompute for uploads that already have one.")
+@click.option("--batch-size", type=int, default=200, show_default=True, help="Rows updated per commit.")
+def backfill_placeholders(force, batch_size):
+    """Store dimensions, blurred placeholders and perceptual hashes for uploads made before they were computed."""
+    from app import db
+    from app.models import MediaObject
+    from app.utils.helpers import _get_s3_client, _s3_key_from_url
+    from app.utils.images import describe_image
+    from app.utils.page_cache import clear_pages
+
+    s3 = _get_s3_client()
+    bucket = current_app.config.get("S3_BUCKET")
+    stmt = db.select(MediaObject.id)
+    if not force:
+        stmt = stmt.where(db.or_(MediaObject.placeholder.is_(None), MediaObject.phash.is_(None)))
+    ids = db.session.execute(stmt.order_by(MediaObject.id)).scalars().all()
+    updated = missing = failed = 0
+
+    for i in range(0, len(ids), batch_size):
+        rows = db.session.execute(db.select(MediaObject).where(MediaObject.id.in_(ids[i:i + batch_size]))).scalars()
+        for row in rows:
+            try:
+                with tempfile.SpooledTemporaryFile(max_size=current_app.config.get("MEDIA_SPOOL_MAX_MEMORY", 1024 * 1024)) as spool:
+                    if row.path.startswith("http"):
+                        key = _s3_key_from_url(row.path)
+                        if not (s3 and bucket and key):
+                            missing += 1
+                            continue
+                        s3.download_fileobj(bucket, key, spool)
+                    else:
+                        local = os.path.join(current_app.static_folder, row.path)
+                        if not os.path.isfile(local):
+                            missing += 1
+                            continue
+                        with open(local, "rb") as f:
+                            shutil.copyfileobj(f, spool)
+                    spool.seek(0)
+                    meta = describe_image(spool)
+            except Exception as e:
+                current_app.logger.warning("Could not describe %s: %s", row.path, e)
+                failed += 1
+                continue
+            row.width, row.height, row.placeholder = meta["width"], meta["height"], meta["placeholder"]
+            row.phash = meta["phash"]
+            updated += 1
+        db.session.commit()
+
+    if updated:
+        clear_pages()
+    click.echo(f"updated: {updated}, missing files: {missing}, failed: {failed}")
+
+
+@media_cli.command("inline-avatars")
+@click.option("--batch-size", type=int, default=100, show_default=True, help="Users updated per commit.")
+def move_inline_avatars(batch_size):
+    """Store avatars saved inline as data: URLs like uploaded ones; users.avatar keeps the path.
+
+    Avatars that cannot be decoded are cleared. Run once after ``flask db upgrade``.
+    """
+    from app import db
+    from app.models import User
+    from app.utils.helpers import data_url_upload, save_images
+
+    ids = db.session.execute(
+        db.select(User.id).where(User.avatar.like("data:%")).order_by(User.id)
+    ).scalars().all()
+    moved = cleared = 0
+
+    for i in range(0, len(ids), batch_size):
+        for user in db.session.execute(db.select(User).where(User.id.in_(ids[i:i + batch_size]))).scalars():
+            upload = data_url_upload(user.avatar, filename="avatar")
+            # takes the reference and records dimensions, placeholder and renditions
+            stored, _rejected = save_images([upload], subdir="avatars") if upload else ([], [])
+            if stored:
+                user.avatar = stored[0]
+                moved += 1
+            else:
+                current_app.logger.warning("Inline avatar of user %s could not be decoded, clearing it", user.id)
+                user.avatar = None
+                cleared += 1
+        db.session.commit()
+
+    click.echo(f"moved: {moved}, cleared: {cleared}")
+
+
+@media_cli.command("duplicates")
+@click.option("--distance", type=int, help="Max differing dHash bits (default: PHASH_MAX_DISTANCE).")
+@click.option("--min-photos", type=int, help="Shared photos that link two listings (default: DUPLICATE_MIN_PHOTOS).")
+@click.option("--mark", is_flag=True, help="Set duplicate_of on every listing but the earliest of its group.")
+def find_duplicates(distance, min_photos, mark):
+    """Group listings that use the same or near-identical photos."""
+    from app import db
+    from app.models import HousingExchange
+    from app.utils.duplicates import cluster_listings
+
+    cfg = current_app.config
+    started = time.monotonic()
+    clusters = cluster_listings(
+        cfg.get("PHASH_MAX_DISTANCE", 6) if distance is None else distance,
+        cfg.get("DUPLICATE_MIN_PHOTOS", 2) if min_photos is None else min_photos,
+        yield_per=_GC_YIELD_PER,
+    )
+    elapsed = time.monotonic() - started
+    for ids in clusters:
+        owners = db.session.execute(
+            db.select(HousingExchange.id, HousingExchange.owner_id).where(HousingExchange.id.in_(ids))
+        ).all()
+        click.echo(f"listings {', '.join(map(str, ids))} (owners: {', '.join(sorted({str(o) for _, o in owners}))})")
+        if mark:
+            db.session.execute(
+                db.update(HousingExchange)
+                .where(HousingExchange.id.in_(ids[1:]), HousingExchange.duplicate_of_id.is_(None))
+                .values(duplicate_of_id=ids[0])
+            )
+    if mark:
+        db.session.commit()
+    click.echo(f"groups: {len(clusters)}, listings: {sum(map(len, clusters))}, took {elapsed:.2f} s")
+
+
+@tours_cli.command("reconcile")
+@click.option("--dry-run", is_flag=True, help="Only report tours whose booking_count is off.")
+def reconcile_booking_counts(dry_run):
+    """Recount booking_count from the bookings table and rebuild the popular-tours boards."""
+    from app import db
+    from app.models import Booking, RemoteTourism
+    from app.utils.leaderboard import tour_leaderboard
+
+    actual = dict(db.session.execute(
+        db.select(Booking.tourism_id, db.func.count(Booking.id))
+        .where(Booking.status != "cancelled")
+        .group_by(Booking.tourism_id)
+    ).all())
+    fixes = []
+    for tour_id, stored in db.session.execute(db.select(RemoteTourism.id, RemoteTourism.booking_count)):
+        if stored != actual.get(tour_id, 0):
+            click.echo(f"tour {tour_id}: booking_count {stored} -> {actual.get(tour_id, 0)}")
+            fixes.append({"b_id": tour_id, "b_count": actual.get(tour_id, 0)})
+    if fixes and not dry_run:
+        table = RemoteTourism.__table__
+        db.session.execute(
+            db.update(table).where(table.c.id == db.bindparam("b_id"))
+            .values(booking_count=db.bindparam("b_count"), updated_at=table.c.updated_at),
+            fixes,
+        )
+        db.session.commit()
+        tour_leaderboard().clear()
+    click.echo(f"tours fixed: {len(fixes)}{' (dry run)' if dry_run else ''}")
+
+
+@click.command("seed")
+@click.option("--scale", type=click.Choice(["small", "medium", "large"]), default="small", show_default=True,
+              help="Preset sizes; 'large' writes a million messages.")
+@click.option("--users", type=int, help="Override the preset number of users.")
+@click.option("--listings", type=int, help="Override the preset number of housing listings.")
+@click.option("--tours", type=int, help="Override the preset number of tours.")
+@click.option("--bookings", type=int, help="Override the preset number of tour bookings.")
+@click.option("--messages", type=int, help="Override the preset number of messages.")
+@click.option("--seed", "rng_seed", type=int, default=1, show_default=True, help="Random seed.")
+@click.option("--date", "today", type=click.DateTime(formats=["%Y-%m-%d"]),
+              help="Day the generated dates are relative to (default: today).")
+@click.option("--batch-size", type=int, default=5000, show_default=True, help="Rows per INSERT batch.")
+def seed_command(scale, users, listings, tours, bookings, messages, rng_seed, today, batch_size):
+    """Fill the database with synthetic users, listings, tours, bookings and messages."""
+    from app.utils.leaderboard import tour_leaderboard
+    from app.utils.seed import SCALES, seed
+
+    overrides = {"users": users, "listings": listings, "tours": tours, "bookings": bookings, "messages": messages}
+    counts = {key: overrides[key] if overrides[key] is not None else n for key, n in SCALES[scale].items()}
+    if counts["users"] < 2:
+        raise click.BadParameter("at least 2 users are needed", param_hint="--users")
+
+    started = time.monotonic()
+    written = seed(counts, rng_seed=rng_seed, batch_size=batch_size, today=today.date() if today else None,
+                   progress=lambda table, done, total: click.echo(f"\r{table}: {done}/{total}", nl=done >= total))
+    tour_leaderboard().clear()
+    click.echo(", ".join(f"{key}: {n}" for key, n in written.items()) + f" in {time.monotonic() - started:.1f} s")
+
+
+@templates_cli.command("compile")
+@click.option("--clear", is_flag=True, help="Empty the bytecode cache first.")
+def compile_templates(clear):
+    """Compile every template into the bytecode cache ahead of the first request."""
+    from app.utils.template_cache import precompile_templates
+
+    cache = current_app.jinja_env.bytecode_cache
+    if cache is None:
+        raise click.ClickException("JINJA_BYTECODE_CACHE is off or its directory is not usable")
+    if clear:
+        cache.clear()
+    started = time.monotonic()
+    compiled, failed = precompile_templates(current_app)
+    click.echo(f"compiled: {compiled}, failed: {len(failed)} in {time.monotonic() - started:.2f} s ({cache.directory})")
+    if failed:
+        raise click.ClickException(f"templates with errors: {', '.join(failed)}")
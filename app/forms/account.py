@@ -1,4 +1,4 @@
-from wtforms import StringField, TextAreaField, SubmitField
+from wtforms import HiddenField, StringField, TextAreaField, SubmitField
 from wtforms.validators import Length, Optional
 from flask_wtf import FlaskForm
 from flask_wtf.file import FileField, FileAllowed
@@ -14,6 +14,8 @@ class ProfileForm(FlaskForm):
         validators=[Optional(), FileAllowed(["jpg", "jpeg", "png", "webp"], "Только изображения: JPG, PNG, WEBP")],
         render_kw={"accept": "image/jpeg,image/png,image/webp"},
     )
+    # cropped avatar as a data: URL (filled in by main.js), decoded into storage on save
+    avatar_data = HiddenField()
     description = TextAreaField("О себе", validators=[Optional(), Length(max=2000)])
     submit = SubmitField("Сохранить")
 
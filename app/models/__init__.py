@@ -5,3 +5,4 @@ from .remote_tourism import RemoteTourism  # noqa: F401
 from .review import Review  # noqa: F401
 from .booking import Booking  # noqa: F401
 
+from .media_object import MediaObject  # noqa: F401
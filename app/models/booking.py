@@ -19,4 +19,7 @@ class Booking(db.Model):
 
     created_date = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
 
+    user = db.relationship("User", backref=db.backref("bookings", lazy="dynamic", passive_deletes=True))
+    listing = db.relationship("HousingExchange", backref=db.backref("bookings", lazy="dynamic", passive_deletes=True))
+    tour = db.relationship("RemoteTourism", backref=db.backref("bookings", lazy="dynamic", passive_deletes=True))
 
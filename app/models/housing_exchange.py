@@ -26,7 +26,13 @@ class HousingExchange(db.Model):
 
     is_active = db.Column(db.Boolean, default=True, nullable=False)
     created_date = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    # bumped on every ORM update; versions cached card markup (app.utils.fragment_cache)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
     views_count = db.Column(db.Integer, default=0, nullable=False)
+    # HyperLogLog registers of distinct viewers (app.utils.view_counter)
+    views_hll = db.Column(db.LargeBinary)
+    # set on create when the photos match an earlier listing (see app.utils.duplicates)
+    duplicate_of_id = db.Column(db.Integer, db.ForeignKey("housing_exchange.id", ondelete="SET NULL"), index=True)
 
     owner = db.relationship("User", backref=db.backref("housing_listings", lazy="dynamic"))
 
@@ -0,0 +1,31 @@
+from datetime import datetime
+
+from app import db
+
+
+class MediaObject(db.Model):
+    """Reference count for a stored upload.
+
+    ``path`` is exactly what rows store in ``photos``/``avatar`` (public URL or
+    static-relative path). Uploads are keyed by the SHA-256 of their content, so
+    the same photo attached twice is one object with ``ref_count`` 2.
+    ``width``/``height`` (as displayed) and the inline blurred ``placeholder``
+    are captured at upload so pages can reserve space and paint immediately.
+    ``phash`` is the 64-bit difference hash used to spot the same photo
+    re-encoded or resized (see app.utils.duplicates). ``has_renditions`` is set
+    once the resized WebP/JPEG renditions are stored; until then templates link
+    the original only.
+    """
+
+    __tablename__ = "media_objects"
+
+    id = db.Column(db.Integer, primary_key=True)
+    path = db.Column(db.String(512), unique=True, nullable=False, index=True)
+    sha256 = db.Column(db.String(64), index=True)
+    ref_count = db.Column(db.Integer, default=0, nullable=False)
+    width = db.Column(db.Integer)
+    height = db.Column(db.Integer)
+    placeholder = db.Column(db.String(512))
+    phash = db.Column(db.BigInteger, index=True)
+    has_renditions = db.Column(db.Boolean, default=False, nullable=False)
+    created_date = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
@@ -17,4 +17,4 @@ class Message(db.Model):
 
     sender = db.relationship("User", foreign_keys=[sender_id])
     receiver = db.relationship("User", foreign_keys=[receiver_id])
-
+    listing = db.relationship("HousingExchange")
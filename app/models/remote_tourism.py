@@ -21,8 +21,17 @@ class RemoteTourism(db.Model):
 
     is_active = db.Column(db.Boolean, default=True, nullable=False, index=True)
     created_date = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    # bumped on every ORM update; versions cached card markup (app.utils.fragment_cache)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    # bookings not cancelled; maintained by app.utils.leaderboard.adjust_booking_count
     booking_count = db.Column(db.Integer, default=0, nullable=False)
 
+    __table_args__ = (
+        # per-city "most booked" boards (app.utils.leaderboard)
+        db.Index("ix_remote_tourism_city_booking_count", "city", "booking_count"),
+        db.Index("ix_remote_tourism_booking_count", "booking_count"),
+    )
+
     guide = db.relationship("User", backref=db.backref("tour_offers", lazy="dynamic"))
 
 
@@ -15,4 +15,10 @@ class Review(db.Model):
     comment = db.Column(db.Text)
     created_date = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
 
+    reviewer = db.relationship("User", foreign_keys=[reviewer_id])
+    reviewed = db.relationship(
+        "User", foreign_keys=[reviewed_id], backref=db.backref("reviews_received", lazy="dynamic", passive_deletes=True)
+    )
+    listing = db.relationship("HousingExchange")
+    tour = db.relationship("RemoteTourism")
 
@@ -24,6 +24,8 @@ class User(UserMixin, db.Model):
     is_active = db.Column(db.Boolean, default=True, nullable=False)
     rating = db.Column(db.Float, default=0.0, nullable=False)
     review_count = db.Column(db.Integer, default=0, nullable=False)
+    # bumped on every ORM update; part of the ETag of pages showing the user
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
 
     def set_password(self, password: str) -> None:
         self.password_hash = generate_password_hash(password)
@@ -8,6 +8,7 @@ from app.models.booking import Booking
 from app.models.housing_exchange import HousingExchange
 from app.models.review import Review
 from sqlalchemy import select, func
+from sqlalchemy.orm import selectinload
 
 
 account_bp = Blueprint("account", __name__, url_prefix="/account")
@@ -50,15 +51,28 @@ def profile():
         current_user.last_name = form.last_name.data.strip() if form.last_name.data else None
         current_user.city = form.city.data.strip() if form.city.data else None
         current_user.phone = form.phone.data.strip() if form.phone.data else None
-        if form.avatar.data:
-            from app.utils.helpers import save_image
-            rel_path = save_image(form.avatar.data, subdir="avatars")
-            if rel_path:
-                current_user.avatar = rel_path
+        # a cropped data: URL wins over the raw file; only the stored key ends up in users.avatar
+        from app.utils.helpers import data_url_upload
+        # (without a new file the field holds the current path, populated from obj=current_user)
+        avatar = data_url_upload(form.avatar_data.data, filename="avatar")
+        if not avatar and getattr(form.avatar.data, "filename", ""):
+            avatar = form.avatar.data
+        if form.avatar_data.data and not avatar:
+            flash("Не удалось обработать обрезанное изображение.", "warning")
+        if avatar:
+            from app.utils.helpers import save_images
+            from app.utils.media_deletion import schedule_media_deletion
+            stored, _rejected = save_images([avatar], subdir="avatars")
+            if stored:
+                if current_user.avatar:
+                    schedule_media_deletion([current_user.avatar])
+                current_user.avatar = stored[0]
             else:
                 flash("Не удалось загрузить изображение. Проверьте формат или повторите позже.", "warning")
         current_user.description = form.description.data.strip() if form.description.data else None
         db.session.commit()
+        from app.utils.page_cache import purge_pages
+        purge_pages(f"user-{current_user.id}")
         flash("Профиль обновлён", "success")
         return redirect(url_for("account.profile"))
     return render_template("account/profile.html", form=form)
@@ -72,6 +86,8 @@ def my_tours():
             db.select(RemoteTourism).where(RemoteTourism.guide_id == current_user.id).order_by(RemoteTourism.created_date.desc())
         ).scalars().all()
     )
+    from app.utils.media_refs import preload_media_meta
+    preload_media_meta(t.photos[0] for t in tours if t.photos)
     return render_template("account/my_tours.html", tours=tours)
 
 
@@ -104,7 +120,10 @@ def my_excursions():
 def my_bookings():
     bookings = (
         db.session.execute(
-            db.select(Booking).where(Booking.user_id == current_user.id).order_by(Booking.created_date.desc())
+            db.select(Booking)
+            .where(Booking.user_id == current_user.id)
+            .options(selectinload(Booking.tour), selectinload(Booking.listing))
+            .order_by(Booking.created_date.desc())
         ).scalars().all()
     )
     return render_template("account/my_bookings.html", bookings=bookings)
@@ -3,7 +3,7 @@ from flask_login import login_required, current_user
 from sqlalchemy import select
 
 from app import db
-from app.models import Booking, RemoteTourism, Message, User
+from app.models import Booking, Message, User
 from app.utils.helpers import get_or_create_platform_user
 from datetime import date
 from sqlalchemy import and_, func
@@ -21,11 +21,10 @@ def cancel_booking(booking_id: int):
         return redirect(request.referrer or url_for("account.my_bookings"))
 
     # Разрешаем отмену владельцу брони или гиду предложения
+    tour = booking.tour
     allowed = booking.user_id == current_user.id
-    if not allowed and booking.tourism_id:
-        tour = db.session.get(RemoteTourism, booking.tourism_id)
-        if tour and tour.guide_id == current_user.id:
-            allowed = True
+    if not allowed and tour and tour.guide_id == current_user.id:
+        allowed = True
 
     if not allowed:
         flash("Недостаточно прав для отмены брони", "danger")
@@ -33,7 +32,6 @@ def cancel_booking(booking_id: int):
 
     platform_user = get_or_create_platform_user(db, User)
     # Кто инициатор? Если гид — уведомляем клиента. Если клиент — уведомляем гида
-    tour = db.session.get(RemoteTourism, booking.tourism_id) if booking.tourism_id else None
     if tour and current_user.id == tour.guide_id:
         # инициатор — гид
         client_link = url_for("messages.chat", user_id=tour.guide_id, _external=True)
@@ -60,6 +58,9 @@ def cancel_booking(booking_id: int):
         db.session.add(notify)
 
     # Полное удаление брони
+    if tour and booking.status != "cancelled":
+        from app.utils.leaderboard import adjust_booking_count
+        adjust_booking_count(tour, -1)
     db.session.delete(booking)
     db.session.commit()
     flash("Бронь удалена", "info")
@@ -73,7 +74,7 @@ def edit(booking_id: int):
     if not booking:
         flash("Бронь не найдена", "warning")
         return redirect(url_for("account.my_excursions"))
-    tour = db.session.get(RemoteTourism, booking.tourism_id) if booking.tourism_id else None
+    tour = booking.tour
     if not tour or tour.guide_id != current_user.id:
         flash("Недостаточно прав", "danger")
         return redirect(url_for("account.my_excursions"))
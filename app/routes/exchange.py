@@ -1,16 +1,22 @@
-from flask import Blueprint, render_template, redirect, url_for, request, flash
+from flask import Blueprint, current_app, make_response, render_template, redirect, url_for, request, flash
 from flask_login import login_required, current_user
 from sqlalchemy import select, and_, or_
+from sqlalchemy.orm import joinedload
 
 from app import db
 from app.models.housing_exchange import HousingExchange
 from app.models.booking import Booking
 from app.models import Message, User
 from app.utils.helpers import get_or_create_platform_user
+from app.utils.conditional import not_modified, page_validators, with_validators
+from app.utils.page_cache import cached_page, page_keys, purge_pages
+from app.utils.replica import replica_reads
 from app.forms.exchange import ListingForm, FilterForm
 
 
 exchange_bp = Blueprint("exchange", __name__, url_prefix="/exchange")
+# everything listing_detail renders, for its ETag
+_DETAIL_TEMPLATES = ("base.html", "_media.html", "exchange/detail.html")
 
 
 @exchange_bp.route("/my")
@@ -21,6 +27,8 @@ def my_listings():
             select(HousingExchange).where(HousingExchange.owner_id == current_user.id).order_by(HousingExchange.created_date.desc())
         ).scalars().all()
     )
+    from app.utils.media_refs import preload_media_meta
+    preload_media_meta(item.photos[0] for item in listings if item.photos)
     return render_template("exchange/my_listings.html", listings=listings)
 
 
@@ -30,17 +38,20 @@ def new_listing():
     form = ListingForm()
     if form.validate_on_submit():
         amenities = [s.strip() for s in (form.amenities.data or "").split(",") if s.strip()]
-        photos = []
-        # handle multiple files
-        if "photos" in request.files:
-            files = request.files.getlist("photos")
-            from app.utils.helpers import save_image
-            for f in files:
-                rel = save_image(f, subdir="listing_photos")
-                if rel:
-                    photos.append(rel)
-                else:
-                    flash("Некоторые файлы отклонены: неподдерживаемый формат или повреждённое изображение (HEIC конвертируется автоматически).", "warning")
+        # handle multiple files (processed concurrently, upload order preserved)
+        from app.utils.helpers import save_images
+        photos, rejected = save_images(request.files.getlist("photos"), subdir="listing_photos")
+        # photos the browser already uploaded straight to storage (see app.utils.direct_uploads)
+        from app.utils.direct_uploads import claim_photos
+        from app.utils.media_refs import acquire_media
+        direct = claim_photos(request.form.getlist("uploaded_photos"), "listing_photos", current_user.id)
+        acquire_media(direct)
+        photos += direct
+        if rejected:
+            flash(f"Некоторые файлы отклонены ({', '.join(rejected)}): неподдерживаемый формат или повреждённое изображение (HEIC конвертируется автоматически).", "warning")
+        # the same (or re-encoded) photos as an earlier listing: flag it for review
+        from app.utils.duplicates import find_duplicate_listing
+        original = find_duplicate_listing(photos)
         listing = HousingExchange(
             owner_id=current_user.id,
             title=form.title.data.strip(),
@@ -53,9 +64,16 @@ def new_listing():
             available_to=form.available_to.data,
             amenities=amenities,
             photos=photos,
+            duplicate_of_id=original.id if original else None,
         )
         db.session.add(listing)
         db.session.commit()
+        purge_pages("listings")
+        if original:
+            current_app.logger.warning(
+                "Listing %s by user %s duplicates photos of listing %s (user %s)",
+                listing.id, current_user.id, original.id, original.owner_id,
+            )
         if not photos:
             flash("Объявление создано без изображений.", "info")
         else:
@@ -92,25 +110,23 @@ def edit_listing(listing_id: int):
         else:
             listing.amenities = [s.strip() for s in str(amenities_raw or "").split(",") if s.strip()]
         # handle deletions
-        to_delete = set(request.form.getlist("delete_photos"))
+        # only photos that belong to this listing can be removed; files go after the commit
+        to_delete = set(request.form.getlist("delete_photos")) & set(listing.photos or [])
         if to_delete:
-            from app.utils.helpers import delete_media_file
+            from app.utils.media_deletion import schedule_media_deletion
+            removed = [p for p in (listing.photos or []) if p in to_delete]
             listing.photos = [p for p in (listing.photos or []) if p not in to_delete]
-            for p in to_delete:
-                delete_media_file(p)
+            schedule_media_deletion(removed)
         # photos: merge existing + uploaded
-        new_photos = []
-        if "photos" in request.files:
-            files = request.files.getlist("photos")
-            from app.utils.helpers import save_image
-            for f in files:
-                rel = save_image(f, subdir="listing_photos")
-                if rel:
-                    new_photos.append(rel)
+        from app.utils.helpers import save_images
+        new_photos, rejected = save_images(request.files.getlist("photos"), subdir="listing_photos")
+        if rejected:
+            flash(f"Некоторые файлы отклонены ({', '.join(rejected)}): неподдерживаемый формат или повреждённое изображение (HEIC конвертируется автоматически).", "warning")
         # if no new uploads, keep existing; if uploads present, append to existing
         if new_photos:
             listing.photos = (listing.photos or []) + new_photos
         db.session.commit()
+        purge_pages(f"listing-{listing.id}", "listings")
         flash("Объявление обновлено", "success")
         return redirect(url_for("exchange.my_listings"))
     return render_template("exchange/edit.html", form=form, listing=listing)
@@ -126,13 +142,18 @@ def delete_listing(listing_id: int):
 
     # уведомить всех клиентов, у кого есть брони этого объявления (для обмена жилья броней пока нет — placeholder)
     # В случае туров уведомляем клиентов там, здесь просто удаляем
+    from app.utils.media_deletion import schedule_media_deletion
+    schedule_media_deletion(listing.photos)
     db.session.delete(listing)
     db.session.commit()
+    purge_pages(f"listing-{listing_id}", "listings")
     flash("Объявление удалено", "info")
     return redirect(url_for("exchange.my_listings"))
 
 
 @exchange_bp.route("/")
+@cached_page
+@replica_reads
 def listing_search():
     form = FilterForm(request.args)
     conditions = [HousingExchange.is_active.is_(True)]
@@ -152,15 +173,44 @@ def listing_search():
         select(HousingExchange).where(and_(*conditions)).order_by(HousingExchange.created_date.desc())
     ).scalars().all()
 
+    # one query for the cover photos' dimensions/placeholders instead of one per card
+    from app.utils.media_refs import preload_media_meta
+    preload_media_meta(item.photos[0] for item in listings if item.photos)
+    page_keys("listings")
     return render_template("exchange/search.html", listings=listings, form=form)
 
 
 @exchange_bp.get("/<int:listing_id>")
+@cached_page
+@replica_reads
 def listing_detail(listing_id: int):
-    listing = db.session.get(HousingExchange, listing_id)
+    validators = None
+    if not current_user.is_authenticated:
+        # revalidation costs one primary-key lookup of the two timestamps
+        stamps = db.session.execute(
+            select(HousingExchange.updated_at, User.updated_at)
+            .join(User, User.id == HousingExchange.owner_id)
+            .where(HousingExchange.id == listing_id)
+        ).first()
+        if stamps:
+            validators = page_validators(_DETAIL_TEMPLATES, *stamps)
+            response = not_modified(*validators)
+            if response is not None:
+                return response
+    listing = db.session.get(HousingExchange, listing_id, options=[joinedload(HousingExchange.owner)])
     if not listing:
         flash("Объявление не найдено", "warning")
         return redirect(url_for("exchange.listing_search"))
-    return render_template("exchange/detail.html", listing=listing)
+    from app.utils.media_refs import preload_media_meta
+    preload_media_meta(listing.photos)
+    page_keys(f"listing-{listing.id}", f"user-{listing.owner_id}")
+    views = None
+    if current_user.is_authenticated and current_user.id == listing.owner_id:
+        from app.utils.view_counter import listing_views
+        views = listing_views(listing)
+    response = make_response(render_template("exchange/detail.html", listing=listing, views=views))
+    if validators:
+        with_validators(response, *validators)
+    return response
 
 
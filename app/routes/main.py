@@ -1,4 +1,4 @@
-from flask import Blueprint, render_template
+from flask import Blueprint, current_app, render_template
 import random
 
 
@@ -74,9 +74,14 @@ ATTRACTIONS = [
 main_bp = Blueprint("main", __name__)
 
 
+# not in the page cache: every visit shows another random attraction
 @main_bp.get("/")
 def index():
     attraction = random.choice(ATTRACTIONS)
-    return render_template("index.html", attraction=attraction)
+    from app.utils.leaderboard import top_tours
+    from app.utils.media_refs import preload_media_meta
+    popular = top_tours(current_app.config.get("HOME_TOP_TOURS", 5))
+    preload_media_meta(t.photos[0] for t in popular if t.photos)
+    return render_template("index.html", attraction=attraction, popular_tours=popular)
 
 
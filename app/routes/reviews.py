@@ -5,6 +5,7 @@ from sqlalchemy import select
 from app import db
 from app.models import Review, User, HousingExchange, RemoteTourism
 from app.forms.reviews import ReviewForm
+from app.utils.page_cache import purge_pages
 
 
 reviews_bp = Blueprint("reviews", __name__, url_prefix="/reviews")
@@ -18,6 +19,7 @@ def _recalculate_user_rating(user_id: int) -> None:
             user.rating = 0
             user.review_count = 0
             db.session.commit()
+            purge_pages(f"user-{user_id}")
         return
     ratings = [r[0] for r in rows]
     avg = sum(ratings) / len(ratings)
@@ -26,6 +28,7 @@ def _recalculate_user_rating(user_id: int) -> None:
         user.rating = round(avg, 2)
         user.review_count = len(ratings)
     db.session.commit()
+    purge_pages(f"user-{user_id}")
 
 
 @reviews_bp.post("/user/<int:reviewed_id>")
@@ -1,18 +1,26 @@
-from flask import Blueprint, render_template, redirect, url_for, request, flash
+from flask import Blueprint, make_response, render_template, redirect, url_for, request, flash
 from flask_login import login_required, current_user
 from sqlalchemy import select, or_, and_, func
+from sqlalchemy.orm import joinedload
 from datetime import date
 
 from app import db
 from app.models import RemoteTourism, User, Message, Booking
 from app.forms.booking import TourBookingForm
 from app.forms.tourism import TourismOfferForm, TourismFilterForm
+from app.utils.conditional import not_modified, page_validators, with_validators
+from app.utils.page_cache import cached_page, page_keys, purge_pages
+from app.utils.replica import replica_reads
 
 
 tourism_bp = Blueprint("tourism", __name__, url_prefix="/tourism")
+# everything tourism_detail renders, for its ETag
+_DETAIL_TEMPLATES = ("base.html", "_media.html", "tourism/detail.html")
 
 
 @tourism_bp.get("/")
+@cached_page
+@replica_reads
 def tourism_search():
     form = TourismFilterForm(request.args)
     conditions = [RemoteTourism.is_active.is_(True)]
@@ -25,6 +33,9 @@ def tourism_search():
     tours = db.session.execute(
         select(RemoteTourism).where(and_(*conditions)).order_by(RemoteTourism.created_date.desc())
     ).scalars().all()
+    from app.utils.media_refs import preload_media_meta
+    preload_media_meta(t.photos[0] for t in tours if t.photos)
+    page_keys("tours")
     return render_template("tourism/search.html", form=form, tours=tours)
 
 
@@ -33,16 +44,16 @@ def tourism_search():
 def tourism_new():
     form = TourismOfferForm()
     if form.validate_on_submit():
-        photos = []
-        if "photos" in request.files:
-            files = request.files.getlist("photos")
-            from app.utils.helpers import save_image
-            for f in files:
-                rel = save_image(f, subdir="tour_photos")
-                if rel:
-                    photos.append(rel)
-                else:
-                    flash("Некоторые файлы отклонены: неподдерживаемый формат или повреждённое изображение (HEIC конвертируется автоматически).", "warning")
+        from app.utils.helpers import save_images
+        photos, rejected = save_images(request.files.getlist("photos"), subdir="tour_photos")
+        # photos the browser already uploaded straight to storage (see app.utils.direct_uploads)
+        from app.utils.direct_uploads import claim_photos
+        from app.utils.media_refs import acquire_media
+        direct = claim_photos(request.form.getlist("uploaded_photos"), "tour_photos", current_user.id)
+        acquire_media(direct)
+        photos += direct
+        if rejected:
+            flash(f"Некоторые файлы отклонены ({', '.join(rejected)}): неподдерживаемый формат или повреждённое изображение (HEIC конвертируется автоматически).", "warning")
         tour = RemoteTourism(
             guide_id=current_user.id,
             city=form.city.data.strip() if form.city.data else None,
@@ -56,6 +67,7 @@ def tourism_new():
         )
         db.session.add(tour)
         db.session.commit()
+        purge_pages("tours")
         if not photos:
             flash("Предложение добавлено без изображений.", "info")
         else:
@@ -75,32 +87,34 @@ def tourism_edit(tour_id: int):
     if request.method == "GET":
         form.photos.data = None
     if form.validate_on_submit():
+        old_city = tour.city
         tour.city = form.city.data.strip() if form.city.data else None
+        if tour.city != old_city:
+            from app.utils.leaderboard import unrank_tour
+            unrank_tour(tour, old_city)
         tour.title = form.title.data.strip()
         tour.description = form.description.data.strip() if form.description.data else None
         tour.price_per_hour = form.price_per_hour.data
         tour.duration_hours = form.duration_hours.data
         # handle deletions
-        to_delete = set(request.form.getlist("delete_photos"))
+        # only photos that belong to this tour can be removed; files go after the commit
+        to_delete = set(request.form.getlist("delete_photos")) & set(tour.photos or [])
         if to_delete:
-            from app.utils.helpers import delete_media_file
+            from app.utils.media_deletion import schedule_media_deletion
+            removed = [p for p in (tour.photos or []) if p in to_delete]
             tour.photos = [p for p in (tour.photos or []) if p not in to_delete]
-            for p in to_delete:
-                delete_media_file(p)
+            schedule_media_deletion(removed)
 
-        new_photos = []
-        if "photos" in request.files:
-            files = request.files.getlist("photos")
-            from app.utils.helpers import save_image
-            for f in files:
-                rel = save_image(f, subdir="tour_photos")
-                if rel:
-                    new_photos.append(rel)
+        from app.utils.helpers import save_images
+        new_photos, rejected = save_images(request.files.getlist("photos"), subdir="tour_photos")
+        if rejected:
+            flash(f"Некоторые файлы отклонены ({', '.join(rejected)}): неподдерживаемый формат или повреждённое изображение (HEIC конвертируется автоматически).", "warning")
         if new_photos:
             tour.photos = (tour.photos or []) + new_photos
         tour.available_from = form.available_from.data
         tour.available_to = form.available_to.data
         db.session.commit()
+        purge_pages(f"tour-{tour.id}", "tours")
         flash("Предложение обновлено", "success")
         return redirect(url_for("account.my_tours"))
     return render_template("tourism/edit.html", form=form, tour=tour)
@@ -135,19 +149,45 @@ def tourism_delete(tour_id: int):
             db.session.add(notify)
             informed_user_ids.add(b.user_id)
         db.session.delete(b)
+    from app.utils.media_deletion import schedule_media_deletion
+    schedule_media_deletion(tour.photos)
+    from app.utils.leaderboard import unrank_tour
+    unrank_tour(tour)
     db.session.delete(tour)
     db.session.commit()
+    purge_pages(f"tour-{tour_id}", "tours")
     flash("Предложение удалено", "info")
     return redirect(url_for("account.my_tours"))
 
 
 @tourism_bp.get("/<int:tour_id>")
+@cached_page
+@replica_reads
 def tourism_detail(tour_id: int):
-    tour = db.session.get(RemoteTourism, tour_id)
+    validators = None
+    if not current_user.is_authenticated:
+        # revalidation costs one primary-key lookup of the two timestamps
+        stamps = db.session.execute(
+            select(RemoteTourism.updated_at, User.updated_at)
+            .join(User, User.id == RemoteTourism.guide_id)
+            .where(RemoteTourism.id == tour_id)
+        ).first()
+        if stamps:
+            validators = page_validators(_DETAIL_TEMPLATES, *stamps)
+            response = not_modified(*validators)
+            if response is not None:
+                return response
+    tour = db.session.get(RemoteTourism, tour_id, options=[joinedload(RemoteTourism.guide)])
     if not tour:
         flash("Предложение не найдено", "warning")
         return redirect(url_for("tourism.tourism_search"))
-    return render_template("tourism/detail.html", tour=tour)
+    from app.utils.media_refs import preload_media_meta
+    preload_media_meta(tour.photos)
+    page_keys(f"tour-{tour.id}", f"user-{tour.guide_id}")
+    response = make_response(render_template("tourism/detail.html", tour=tour))
+    if validators:
+        with_validators(response, *validators)
+    return response
 
 
 @tourism_bp.route("/<int:tour_id>/book", methods=["GET", "POST"])
@@ -201,6 +241,8 @@ def tourism_book(tour_id: int):
             total_price=total_price,
         )
         db.session.add(booking)
+        from app.utils.leaderboard import adjust_booking_count
+        adjust_booking_count(tour, 1)
         db.session.commit()
 
         from app.utils.helpers import get_or_create_platform_user
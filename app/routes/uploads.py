@@ -0,0 +1,107 @@
+import os
+
+from flask import Blueprint, abort, current_app, jsonify, request
+from flask_login import login_required, current_user
+
+from app import db
+from app.models import HousingExchange, RemoteTourism
+from app.utils.direct_uploads import (
+    DirectUploadError, _use_s3, create_upload, finalize_upload, sign_photo, staging_path,
+)
+
+
+uploads_bp = Blueprint("uploads", __name__, url_prefix="/uploads")
+
+# kind sent by the browser -> (upload directory, model, owner column)
+# (the cached pages showing a target are tagged "<kind>-<id>", see app.utils.page_cache)
+_TARGETS = {
+    "listing": ("listing_photos", HousingExchange, "owner_id"),
+    "tour": ("tour_photos", RemoteTourism, "guide_id"),
+}
+
+
+def _target(kind: str):
+    if kind not in _TARGETS:
+        abort(400)
+    return _TARGETS[kind]
+
+
+@uploads_bp.post("/presign")
+@login_required
+def presign():
+    """Hand out an upload URL for one photo; the file goes straight to storage."""
+    if not current_app.config.get("DIRECT_UPLOADS_ENABLED", True):
+        abort(404)
+    data = request.get_json(silent=True) or {}
+    subdir, _, _ = _target(data.get("kind"))
+    try:
+        upload = create_upload(subdir, data.get("content_type"), current_user.id)
+    except DirectUploadError as e:
+        return jsonify(error=str(e)), 400
+    return jsonify(upload)
+
+
+@uploads_bp.put("/local/<token>")
+@login_required
+def local_upload(token: str):
+    """Development stand-in for the bucket: stores the raw request body in static/."""
+    if not current_app.config.get("DIRECT_UPLOADS_ENABLED", True):
+        abort(404)
+    if _use_s3():
+        abort(404)
+    try:
+        path = staging_path(token, current_user.id)
+    except DirectUploadError as e:
+        return jsonify(error=str(e)), 403
+
+    from app.utils.helpers import _SPOOL_CHUNK
+    max_bytes = current_app.config.get("MEDIA_MAX_FILE_SIZE") or 0
+    if max_bytes and (request.content_length or 0) > max_bytes:
+        return jsonify(error="Файл слишком большой"), 413
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    total = 0
+    with open(path, "wb") as f:
+        for chunk in iter(lambda: request.stream.read(_SPOOL_CHUNK), b""):
+            total += len(chunk)
+            if max_bytes and total > max_bytes:
+                break
+            f.write(chunk)
+    if max_bytes and total > max_bytes:
+        os.remove(path)
+        return jsonify(error="Файл слишком большой"), 413
+    return "", 204
+
+
+@uploads_bp.post("/complete")
+@login_required
+def complete():
+    """Validate an uploaded photo and attach it.
+
+    With ``target_id`` the photo is appended to that listing/tour right away;
+    without it (a form for a new listing/tour) a signed ``photo`` token is
+    returned for the form to submit as ``uploaded_photos``.
+    """
+    if not current_app.config.get("DIRECT_UPLOADS_ENABLED", True):
+        abort(404)
+    data = request.get_json(silent=True) or {}
+    subdir, model, owner_column = _target(data.get("kind"))
+    obj = None
+    if data.get("target_id"):
+        obj = db.session.get(model, data.get("target_id"))
+        if not obj or getattr(obj, owner_column) != current_user.id:
+            return jsonify(error="Объявление не найдено"), 404
+    try:
+        path = finalize_upload(data.get("token"), current_user.id, subdir)
+    except DirectUploadError as e:
+        return jsonify(error=str(e)), 400
+    if not path:
+        return jsonify(error="Не удалось сохранить файл"), 500
+    if obj is None:
+        return jsonify(path=path, photo=sign_photo(path, current_user.id))
+    from app.utils.media_refs import acquire_media
+    obj.photos = (obj.photos or []) + [path]
+    acquire_media([path])
+    db.session.commit()
+    from app.utils.page_cache import purge_pages
+    purge_pages(f"{data.get('kind')}-{obj.id}", "listings" if model is HousingExchange else "tours")
+    return jsonify(path=path)
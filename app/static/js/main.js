@@ -1,2 +1,126 @@
-// Placeholder for future JS
+// Direct photo uploads: files picked in an <input data-direct-upload> go straight
+// to storage (presigned URL from the app), so the form only submits small tokens.
+// Files that cannot go direct (e.g. HEIC) stay in the input and are posted as before.
+(function () {
+  function csrfToken(form) {
+    var input = form.querySelector('input[name="csrf_token"]');
+    return input ? input.value : '';
+  }
 
+  function postJSON(url, data, form) {
+    return fetch(url, {
+      method: 'POST',
+      credentials: 'same-origin',
+      headers: { 'Content-Type': 'application/json', 'X-CSRFToken': csrfToken(form) },
+      body: JSON.stringify(data)
+    }).then(function (resp) {
+      return resp.json().catch(function () { return {}; }).then(function (body) {
+        if (!resp.ok) throw new Error(body.error || 'Ошибка загрузки');
+        return body;
+      });
+    });
+  }
+
+  function send(upload, file, form) {
+    var options;
+    if (upload.method === 'PUT') {
+      options = { method: 'PUT', credentials: 'same-origin', headers: { 'X-CSRFToken': csrfToken(form) }, body: file };
+    } else {
+      var data = new FormData();
+      Object.keys(upload.fields).forEach(function (name) { data.append(name, upload.fields[name]); });
+      data.append('file', file);  // must be the last field
+      options = { method: 'POST', body: data };
+    }
+    return fetch(upload.url, options).then(function (resp) {
+      if (!resp.ok) throw new Error('Хранилище отклонило файл');
+    });
+  }
+
+  function uploadOne(input, file) {
+    var form = input.form;
+    var kind = input.dataset.directUpload;
+    var targetId = input.dataset.targetId || null;
+    return postJSON(input.dataset.presignUrl, { kind: kind, content_type: file.type }, form)
+      .then(function (upload) {
+        return send(upload, file, form).then(function () {
+          return postJSON(input.dataset.completeUrl, { kind: kind, token: upload.token, target_id: targetId }, form);
+        });
+      })
+      .then(function (result) {
+        if (result.photo) {
+          var hidden = document.createElement('input');
+          hidden.type = 'hidden';
+          hidden.name = 'uploaded_photos';
+          hidden.value = result.photo;
+          form.appendChild(hidden);
+        }
+      });
+  }
+
+  function handleChange(input) {
+    var files = Array.prototype.slice.call(input.files || []);
+    if (!files.length || !window.fetch || !window.DataTransfer) return;
+    var status = input.parentNode.querySelector('.direct-upload-status');
+    if (!status) {
+      status = document.createElement('div');
+      status.className = 'direct-upload-status form-text';
+      input.parentNode.appendChild(status);
+    }
+    var submit = input.form.querySelector('[type="submit"]');
+    if (submit) submit.disabled = true;
+    status.textContent = 'Загрузка фото…';
+
+    var done = 0, failed = [], leftover = [];
+    Promise.all(files.map(function (file) {
+      return uploadOne(input, file).then(
+        function () { done += 1; },
+        function (err) { failed.push(file.name + ': ' + err.message); leftover.push(file); }
+      );
+    })).then(function () {
+      // whatever did not go direct is submitted with the form the usual way
+      var keep = new DataTransfer();
+      leftover.forEach(function (file) { keep.items.add(file); });
+      input.files = keep.files;
+      status.textContent = 'Загружено фото: ' + done + (failed.length ? '. Будут отправлены с формой: ' + failed.join('; ') : '');
+      if (submit) submit.disabled = false;
+    });
+  }
+
+  document.addEventListener('change', function (event) {
+    var input = event.target;
+    if (input.matches && input.matches('input[type="file"][data-direct-upload]')) handleChange(input);
+  });
+})();
+
+// Avatar crop: a picked file is cut to a centred square (max 512 px) in the browser
+// and sent as a data: URL in the hidden field named by data-avatar-crop; the server
+// decodes it into storage. Images the browser cannot draw (HEIC) are sent as files.
+(function () {
+  var SIZE = 512;
+
+  document.addEventListener('change', function (event) {
+    var input = event.target;
+    if (!input.matches || !input.matches('input[type="file"][data-avatar-crop]')) return;
+    var hidden = input.form && input.form.elements[input.dataset.avatarCrop];
+    var file = input.files && input.files[0];
+    if (!hidden || !file || !window.URL) return;
+    hidden.value = '';
+
+    var url = URL.createObjectURL(file);
+    var img = new Image();
+    img.onload = function () {
+      var side = Math.min(img.naturalWidth, img.naturalHeight);
+      var out = Math.min(side, SIZE);
+      var canvas = document.createElement('canvas');
+      canvas.width = canvas.height = out;
+      canvas.getContext('2d').drawImage(
+        img, (img.naturalWidth - side) / 2, (img.naturalHeight - side) / 2, side, side, 0, 0, out, out
+      );
+      URL.revokeObjectURL(url);
+      hidden.value = canvas.toDataURL('image/jpeg', 0.9);
+      input.value = '';  // the cropped copy replaces the original upload
+    };
+    img.onerror = function () { URL.revokeObjectURL(url); };
+    img.src = url;
+  });
+})();
@@ -0,0 +1,72 @@
+"""Conditional GET (ETag / Last-Modified) for pages rendered from a few rows.
+
+The validators come from the rows' ``updated_at`` columns plus a digest of
+the page templates, so an edit or a deploy that changes the markup both
+produce a new ETag. Views fetch the timestamps with one indexed query and
+answer ``304 Not Modified`` before loading anything else or rendering.
+
+Only anonymous pages get validators: signed-in pages differ per viewer and
+embed CSRF tokens that expire, so they are always rendered.
+"""
+import hashlib
+from datetime import timezone
+from typing import Optional
+
+from flask import Response, current_app, request
+
+
+_DIGEST_KEY = "template_digests"
+
+
+def template_digest(*names) -> str:
+    """Short digest of the sources of ``names`` and of the partials they import,
+    include or extend (computed once per process)."""
+    digests = current_app.extensions.setdefault(_DIGEST_KEY, {})
+    if names not in digests:
+        from jinja2 import meta
+
+        env = current_app.jinja_env
+        sha = hashlib.sha1()
+        seen, queue = set(), list(names)
+        while queue:
+            name = queue.pop(0)
+            if name in seen:
+                continue
+            seen.add(name)
+            source = env.loader.get_source(env, name)[0]
+            sha.update(source.encode("utf-8"))
+            # names computed at render time come back as None and can't be followed
+            queue.extend(n for n in meta.find_referenced_templates(env.parse(source)) if n)
+        digests[names] = sha.hexdigest()[:10]
+    return digests[names]
+
+
+def page_validators(templates, *stamps) -> tuple:
+    """``(etag, last_modified)`` of a page rendered from ``templates`` and rows changed at ``stamps``.
+
+    ``stamps`` are naive UTC datetimes (``updated_at`` values).
+    """
+    stamps = [s for s in stamps if s is not None]
+    sha = hashlib.sha1(template_digest(*templates).encode("ascii"))
+    for stamp in stamps:
+        sha.update(stamp.isoformat().encode("ascii"))
+    last_modified = max(stamps).replace(tzinfo=timezone.utc, microsecond=0) if stamps else None
+    return sha.hexdigest()[:20], last_modified
+
+
+def not_modified(etag: str, last_modified) -> Optional[Response]:
+    """A 304 response if the client's copy is current, None otherwise."""
+    if request.if_none_match:
+        fresh = request.if_none_match.contains_weak(etag)
+    else:
+        fresh = bool(last_modified and request.if_modified_since and request.if_modified_since >= last_modified)
+    if not fresh:
+        return None
+    return with_validators(Response(status=304), etag, last_modified)
+
+
+def with_validators(response: Response, etag: str, last_modified) -> Response:
+    response.set_etag(etag, weak=True)
+    if last_modified:
+        response.last_modified = last_modified
+    return response
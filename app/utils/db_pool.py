@@ -0,0 +1,118 @@
+"""Database engine options from the environment, and connection pool metrics.
+
+``engine_options(config)`` turns the DB_* settings into
+SQLALCHEMY_ENGINE_OPTIONS for PostgreSQL: a bounded QueuePool that gives up
+after DB_POOL_TIMEOUT s instead of queueing forever, pre-ping and recycling
+of stale connections, a TCP connect timeout and a server-side
+statement_timeout, so a database outage fails requests in seconds instead of
+hanging every worker.
+
+Behind PgBouncer in transaction mode (DB_PGBOUNCER=true) startup parameters
+and server-side prepared statements are not available: the statement
+timeout is sent as ``SET LOCAL`` at the start of each transaction and
+psycopg's automatic prepares are turned off.
+
+``pool_stats()`` reports checkout counts and waits (time spent in
+``pool.connect()``, including pre-ping and new connections), timeouts and
+the live pool occupancy, for capacity planning.
+"""
+import logging
+import threading
+import time
+from collections import Counter
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+
+logger = logging.getLogger(__name__)
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+_max_wait = 0.0
+
+
+def _count(**increments) -> None:
+    with _stats_lock:
+        _stats.update(increments)
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waits."""
+
+    slow_checkout = 0.5
+
+    def connect(self):
+        global _max_wait
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            _count(timeouts=1)
+            raise
+        waited = time.perf_counter() - started
+        with _stats_lock:
+            _stats["checkouts"] += 1
+            _stats["checkout_wait_ms"] += waited * 1000
+            _max_wait = max(_max_wait, waited)
+        if waited > self.slow_checkout:
+            logger.warning("DB connection checkout took %.0f ms (%s)", waited * 1000, self.status())
+        return connection
+
+
+def engine_options(config) -> dict:
+    """SQLALCHEMY_ENGINE_OPTIONS for ``config``; SQLite keeps Flask-SQLAlchemy's defaults."""
+    url = make_url(config["SQLALCHEMY_DATABASE_URI"])
+    if url.get_backend_name() != "postgresql":
+        return {}
+    connect_args = {"connect_timeout": config.get("DB_CONNECT_TIMEOUT", 5)}
+    statement_timeout = config.get("DB_STATEMENT_TIMEOUT", 0)
+    if config.get("DB_PGBOUNCER"):
+        if url.get_driver_name() == "psycopg":
+            # transaction pooling hands each transaction a different server connection
+            connect_args["prepare_threshold"] = None
+    elif statement_timeout:
+        connect_args["options"] = f"-c statement_timeout={statement_timeout}"
+    InstrumentedQueuePool.slow_checkout = config.get("DB_POOL_SLOW_CHECKOUT_MS", 500) / 1000
+    return {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": config.get("DB_POOL_SIZE", 5),
+        "max_overflow": config.get("DB_MAX_OVERFLOW", 10),
+        "pool_timeout": config.get("DB_POOL_TIMEOUT", 10),
+        "pool_recycle": config.get("DB_POOL_RECYCLE", 1800),
+        "pool_pre_ping": config.get("DB_POOL_PRE_PING", True),
+        "connect_args": connect_args,
+    }
+
+
+def init_pool_metrics(app, engine) -> None:
+    """Count new and invalidated connections; apply the PgBouncer statement timeout."""
+    event.listen(engine.pool, "connect", lambda *args: _count(connects=1))
+    event.listen(engine.pool, "invalidate", lambda *args: _count(invalidated=1))
+
+    statement_timeout = app.config.get("DB_STATEMENT_TIMEOUT", 0)
+    if app.config.get("DB_PGBOUNCER") and statement_timeout and engine.dialect.name == "postgresql":
+        @event.listens_for(engine, "begin")
+        def _set_statement_timeout(conn):
+            conn.exec_driver_sql(f"SET LOCAL statement_timeout = {int(statement_timeout)}")
+
+
+def pool_stats(engine=None) -> dict:
+    """Pool occupancy right now plus checkout totals since process start."""
+    if engine is None:
+        from app import db
+
+        engine = db.engine
+    pool = engine.pool
+    with _stats_lock:
+        stats = dict(_stats, checkout_wait_ms_max=_max_wait * 1000)
+    if isinstance(pool, QueuePool):
+        stats.update(
+            size=pool.size(),
+            checked_out=pool.checkedout(),
+            checked_in=pool.checkedin(),
+            overflow=max(0, pool.overflow()),
+            capacity=pool.size() + pool._max_overflow,
+        )
+    return stats
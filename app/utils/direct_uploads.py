@@ -0,0 +1,252 @@
+"""Direct-to-storage browser uploads.
+
+The browser asks for a presigned POST (``create_upload``), sends the file
+straight to the bucket under a staging key ``<subdir>/incoming-<uuid>.<ext>``
+and then calls back (``finalize_upload``). Only the callback touches the app
+tier: the object is checked (size, magic bytes, pixel limit), promoted to its
+content-addressed key with a server-side copy and gets its renditions, exactly
+like a photo that went through ``save_image``.
+
+Without S3 the same protocol runs against the app itself: the "presigned" URL
+is a signed PUT endpoint writing into static/ (development stand-in).
+Abandoned staging objects are unreferenced and removed by ``flask media gc``.
+"""
+import os
+import tempfile
+import uuid
+from typing import Optional
+
+from flask import current_app, url_for
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+
+from app.utils.images import MEDIA_SUBDIRS, StoredImage, media_subdir
+from app.utils.media_refs import _SHARED_SUBDIRS, find_stored
+
+
+_STAGING_PREFIX = "incoming-"
+# Content-Type the browser declares -> Pillow format (see helpers._IMAGE_FORMATS)
+_DIRECT_TYPES = {"image/jpeg": "JPEG", "image/png": "PNG", "image/webp": "WEBP"}
+_UPLOAD_SALT = "direct-upload"
+_PHOTO_SALT = "direct-upload-photo"
+
+
+class DirectUploadError(Exception):
+    """The upload cannot be accepted; the message is safe to show to the user."""
+
+
+def sniff_image_format(head: bytes) -> Optional[str]:
+    """Pillow format name from the first bytes of a file, None if not an accepted image."""
+    if head.startswith(b"\xff\xd8\xff"):
+        return "JPEG"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "PNG"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "WEBP"
+    return None
+
+
+def _serializer(salt: str) -> URLSafeTimedSerializer:
+    return URLSafeTimedSerializer(current_app.config["SECRET_KEY"], salt=salt)
+
+
+def _use_s3() -> bool:
+    from app.utils.helpers import _get_s3_client, s3_available
+
+    return bool(_get_s3_client() and current_app.config.get("S3_BUCKET") and s3_available())
+
+
+def create_upload(subdir: str, content_type: str, user_id: int) -> dict:
+    """Issue a one-off upload target for a single photo.
+
+    Returns ``{"method", "url", "fields", "token"}``: the browser sends the
+    file with ``method`` to ``url`` (POST as multipart with ``fields`` first,
+    PUT as the raw body) and then passes ``token`` to the completion callback.
+    """
+    from app.utils.helpers import _IMAGE_FORMATS, _get_s3_client
+
+    if subdir not in MEDIA_SUBDIRS:
+        raise DirectUploadError("Недопустимый каталог загрузки")
+    fmt = _DIRECT_TYPES.get((content_type or "").lower())
+    if not fmt:
+        raise DirectUploadError("Поддерживаются только JPEG, PNG и WebP")
+    ext, content_type = _IMAGE_FORMATS[fmt]
+    key = f"{subdir}/{_STAGING_PREFIX}{uuid.uuid4().hex}{ext}"
+    token = _serializer(_UPLOAD_SALT).dumps({"k": key, "u": user_id})
+    cfg = current_app.config
+    max_bytes = cfg.get("MEDIA_MAX_FILE_SIZE") or cfg.get("MAX_CONTENT_LENGTH") or 0
+
+    if not _use_s3():
+        if cfg.get("S3_BUCKET"):
+            # storage configured but unreachable; the form upload falls back to disk
+            raise DirectUploadError("Хранилище временно недоступно")
+        return {"method": "PUT", "url": url_for("uploads.local_upload", token=token), "fields": {}, "token": token}
+
+    conditions = [{"Content-Type": content_type}]
+    if max_bytes:
+        # enforced by S3 itself, oversized bodies never land in the bucket
+        conditions.append(["content-length-range", 1, max_bytes])
+    post = _get_s3_client().generate_presigned_post(
+        Bucket=cfg["S3_BUCKET"],
+        Key=key,
+        Fields={"Content-Type": content_type},
+        Conditions=conditions,
+        ExpiresIn=cfg.get("DIRECT_UPLOAD_EXPIRES", 900),
+    )
+    return {"method": "POST", "url": post["url"], "fields": post["fields"], "token": token}
+
+
+def _load_token(token: str, user_id: int, subdir: Optional[str] = None) -> str:
+    """Staging key of a token issued to ``user_id`` (for ``subdir``) by create_upload()."""
+    max_age = current_app.config.get("DIRECT_UPLOAD_EXPIRES", 900) * 2
+    try:
+        data = _serializer(_UPLOAD_SALT).loads(token or "", max_age=max_age)
+    except BadSignature:
+        raise DirectUploadError("Ссылка для загрузки недействительна или устарела")
+    if data.get("u") != user_id or (subdir and not data["k"].startswith(f"{subdir}/")):
+        raise DirectUploadError("Ссылка для загрузки недействительна или устарела")
+    return data["k"]
+
+
+def staging_path(token: str, user_id: int) -> str:
+    """Absolute path in static/ the local stand-in writes the upload for ``token`` to."""
+    return os.path.join(current_app.static_folder, _load_token(token, user_id))
+
+
+def finalize_upload(token: str, user_id: int, subdir: str) -> str:
+    """Validate an uploaded staging object and store it like save_image() would.
+
+    Returns the stored path/URL (possibly an existing one with the same
+    content); no reference is taken. The staging object is always removed.
+    Raises DirectUploadError if the object is missing or not an acceptable image.
+    """
+    from app.utils.helpers import _get_s3_client
+
+    key = _load_token(token, user_id, subdir)
+    if _use_s3():
+        s3 = _get_s3_client()
+        bucket = current_app.config["S3_BUCKET"]
+        try:
+            return _finalize_s3(s3, bucket, key)
+        finally:
+            try:
+                s3.delete_object(Bucket=bucket, Key=key)
+            except Exception as e:
+                current_app.logger.warning("Could not delete staging object %s: %s", key, e)
+    path = os.path.join(current_app.static_folder, key)
+    try:
+        return _finalize_local(path, key)
+    finally:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _check_size(size: int) -> None:
+    max_bytes = current_app.config.get("MEDIA_MAX_FILE_SIZE") or 0
+    if not size:
+        raise DirectUploadError("Файл не загружен")
+    if max_bytes and size > max_bytes:
+        raise DirectUploadError("Файл слишком большой")
+
+
+def _check_format(head: bytes, key: str) -> str:
+    from app.utils.helpers import _IMAGE_FORMATS
+
+    fmt = sniff_image_format(head)
+    # the declared type is baked into the key; the bytes have to agree with it
+    if not fmt or _IMAGE_FORMATS[fmt][0] != os.path.splitext(key)[1]:
+        raise DirectUploadError("Файл не является изображением JPEG, PNG или WebP")
+    return fmt
+
+
+def _finalize_s3(s3, bucket: str, key: str) -> str:
+    from app.utils.helpers import (
+        _IMAGE_FORMATS, _describe_stored, _file_sha256, _inspect_image, _s3_public_url, _store_derivatives,
+    )
+
+    try:
+        head = s3.head_object(Bucket=bucket, Key=key)
+    except Exception:
+        raise DirectUploadError("Файл не загружен")
+    _check_size(head["ContentLength"])
+    first = s3.get_object(Bucket=bucket, Key=key, Range="bytes=0-15")["Body"].read()
+    fmt = _check_format(first, key)
+
+    # the object has to be read once anyway (hash, renditions); bucket -> app is
+    # the fast leg, the slow client upload never reached a worker
+    subdir = key.split("/", 1)[0]
+    with tempfile.SpooledTemporaryFile(max_size=current_app.config.get("MEDIA_SPOOL_MAX_MEMORY", 1024 * 1024)) as spool:
+        s3.download_fileobj(bucket, key, spool)
+        spool.seek(0)
+        if _inspect_image(spool) != fmt:
+            raise DirectUploadError("Повреждённое изображение")
+        digest = _file_sha256(spool)
+        existing = find_stored(digest, subdir)
+        if existing:
+            return existing
+        ext, content_type = _IMAGE_FORMATS[fmt]
+        final_key = f"{subdir}/{digest}{ext}"
+        extra_args = {"ContentType": content_type, "MetadataDirective": "REPLACE"}
+        cache_control = current_app.config.get("MEDIA_CACHE_CONTROL")
+        if cache_control:
+            extra_args["CacheControl"] = cache_control
+        if current_app.config.get("S3_SET_PUBLIC_ACL", True):
+            extra_args["ACL"] = "public-read"
+        # server-side copy: the original's bytes are not uploaded again
+        s3.copy_object(Bucket=bucket, Key=final_key, CopySource={"Bucket": bucket, "Key": key}, **extra_args)
+        has_renditions = _store_derivatives(spool, final_key, subdir, use_s3=True)
+        return _describe_stored(_s3_public_url(final_key), spool, has_renditions=has_renditions)
+
+
+def _finalize_local(path: str, key: str) -> str:
+    from app.utils.helpers import _IMAGE_FORMATS, _describe_stored, _file_sha256, _inspect_image, _store_derivatives
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        raise DirectUploadError("Файл не загружен")
+    _check_size(size)
+    subdir = key.split("/", 1)[0]
+    with open(path, "rb") as f:
+        fmt = _check_format(f.read(16), key)
+        f.seek(0)
+        if _inspect_image(f) != fmt:
+            raise DirectUploadError("Повреждённое изображение")
+        digest = _file_sha256(f)
+        existing = find_stored(digest, subdir)
+        if existing:
+            return existing
+        final_key = f"{subdir}/{digest}{_IMAGE_FORMATS[fmt][0]}"
+        has_renditions = _store_derivatives(f, final_key, subdir, use_s3=False)
+        stored = _describe_stored(final_key, f, has_renditions=has_renditions)
+    os.replace(path, os.path.join(current_app.static_folder, final_key))
+    return stored
+
+
+def sign_photo(path: str, user_id: int) -> str:
+    """Token a form can carry to attach a finalized upload on submit (with its StoredImage metadata)."""
+    data = {"p": str(path), "u": user_id}
+    if isinstance(path, StoredImage):
+        data["m"] = {"width": path.width, "height": path.height, "placeholder": path.placeholder,
+                     "phash": path.phash, "has_renditions": path.has_renditions}
+    return _serializer(_PHOTO_SALT).dumps(data)
+
+
+def claim_photos(tokens, subdir: str, user_id: int) -> list:
+    """Stored paths behind the ``sign_photo`` tokens submitted with a form.
+
+    Tokens of other users, foreign upload directories or older than a day are
+    ignored. No reference is taken, the caller acquires them with the row.
+    """
+    paths = []
+    allowed = _SHARED_SUBDIRS.get(subdir, (subdir,))
+    serializer = _serializer(_PHOTO_SALT)
+    for token in tokens or ():
+        try:
+            data = serializer.loads(token, max_age=24 * 3600)
+        except BadSignature:
+            continue
+        path = data.get("p") or ""
+        if data.get("u") == user_id and media_subdir(path) in allowed and path not in paths:
+            paths.append(StoredImage(path, **data.get("m", {})))
+    return paths
@@ -0,0 +1,203 @@
+"""Near-duplicate photo and listing detection on top of MediaObject.phash.
+
+Identical files are already one object (uploads are content-addressed); this
+catches the same apartment photo re-encoded, resized or lightly edited, i.e.
+64-bit difference hashes (see images.dhash) within a small Hamming distance.
+
+``HashIndex`` answers "which hashes are within d bits of this one" without
+comparing against the whole catalogue: the hash is split into 4 bands of 16
+bits, and two hashes within d bits agree on at least one band up to d // 4
+bits, so only the buckets for those few band values are looked at.
+"""
+import threading
+import time
+from collections import defaultdict
+from itertools import combinations
+from typing import Iterable, Optional
+
+from flask import current_app
+from sqlalchemy import Text, or_, select
+
+from app.utils.images import hamming
+
+
+_BANDS = 4
+_BAND_BITS = 64 // _BANDS
+_BAND_MASK = (1 << _BAND_BITS) - 1
+# the per-app catalogue index is rebuilt from committed rows this often; there
+# is no incremental step (ids commit out of order, backfills change old rows),
+# so an upload is matched by similarity at most this long after it committed
+# (identical content always matches, it is the same path)
+_INDEX_REBUILD_SECONDS = 60
+_INDEX_KEY = "phash_index"
+_index_lock = threading.Lock()
+# at most this many matched photos are looked up in listings per create
+_MAX_MATCHED_PATHS = 50
+
+
+class HashIndex:
+    """Multi-index hashing over 64-bit hashes for range queries by Hamming distance."""
+
+    def __init__(self, max_distance: int):
+        self.max_distance = max_distance
+        radius = max_distance // _BANDS
+        self._flips = [0] + [
+            sum(1 << bit for bit in bits)
+            for r in range(1, radius + 1)
+            for bits in combinations(range(_BAND_BITS), r)
+        ]
+        self._tables = [defaultdict(list) for _ in range(_BANDS)]
+        self._hashes = []
+        self._items = []
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def add(self, value: int, item) -> None:
+        value &= 0xFFFFFFFFFFFFFFFF
+        pos = len(self._items)
+        self._hashes.append(value)
+        self._items.append(item)
+        for band, table in enumerate(self._tables):
+            table[value >> (band * _BAND_BITS) & _BAND_MASK].append(pos)
+
+    def query(self, value: int) -> list:
+        """``[(item, distance)]`` of every indexed hash within max_distance of ``value``."""
+        value &= 0xFFFFFFFFFFFFFFFF
+        seen = set()
+        found = []
+        for band, table in enumerate(self._tables):
+            key = value >> (band * _BAND_BITS) & _BAND_MASK
+            for flip in self._flips:
+                for pos in table.get(key ^ flip, ()):
+                    if pos in seen:
+                        continue
+                    seen.add(pos)
+                    distance = hamming(value, self._hashes[pos])
+                    if distance <= self.max_distance:
+                        found.append((self._items[pos], distance))
+        return found
+
+
+def _catalogue_index() -> HashIndex:
+    """Index of every committed hashed upload (item = path), kept per app and rebuilt periodically."""
+    from app import db
+    from app.models import MediaObject
+
+    app = current_app._get_current_object()
+    with _index_lock:
+        state = app.extensions.get(_INDEX_KEY)
+        now = time.monotonic()
+        if state is None or now - state["built"] > _INDEX_REBUILD_SECONDS:
+            index = HashIndex(app.config.get("PHASH_MAX_DISTANCE", 6))
+            # own connection to the primary: committed rows only, never the uploads of a
+            # request that may still roll back (the caller's session has flushed its own)
+            with db.engine.connect() as conn:
+                rows = conn.execute(
+                    select(MediaObject.path, MediaObject.phash).where(MediaObject.phash.is_not(None))
+                    .execution_options(yield_per=1000)
+                )
+                for path, phash in rows:
+                    index.add(phash, path)
+            state = app.extensions[_INDEX_KEY] = {"index": index, "built": now}
+        return state["index"]
+
+
+def find_duplicate_listing(photos: Iterable[str], exclude_id: Optional[int] = None):
+    """Earliest listing whose photos match enough of ``photos`` (None if there is none).
+
+    A photo matches when the listing has the same upload or one within
+    PHASH_MAX_DISTANCE bits; DUPLICATE_MIN_PHOTOS of them have to match
+    (all of them when either side has fewer photos).
+    """
+    from app import db
+    from app.models import HousingExchange, MediaObject
+
+    photos = [str(p) for p in photos or ()]
+    if not photos:
+        return None
+    hashes = dict(db.session.execute(
+        select(MediaObject.path, MediaObject.phash).where(MediaObject.path.in_(photos), MediaObject.phash.is_not(None))
+    ).all())
+    if not hashes:
+        return None
+    index = _catalogue_index()
+    # new photo -> stored paths that look the same
+    similar = {path: {p for p, _ in index.query(phash)} | {path} for path, phash in hashes.items()}
+    candidates = sorted(set().union(*similar.values()))[:_MAX_MATCHED_PATHS]
+
+    # photos is a JSON list; a text match narrows the scan, the exact check is below
+    stmt = select(HousingExchange).where(
+        or_(*(HousingExchange.photos.cast(Text).like(f'%"{p}"%') for p in candidates))
+    )
+    if exclude_id is not None:
+        stmt = stmt.where(HousingExchange.id != exclude_id)
+    needed = min(current_app.config.get("DUPLICATE_MIN_PHOTOS", 2), len(hashes))
+    for listing in db.session.execute(stmt.order_by(HousingExchange.id)).scalars():
+        theirs = set(listing.photos or ())
+        if sum(1 for paths in similar.values() if paths & theirs) >= min(needed, len(theirs)):
+            return listing
+    return None
+
+
+def cluster_listings(max_distance: int, min_photos: int, yield_per: int = 1000) -> list:
+    """Groups of listing ids (ascending) whose photos match, for the whole catalogue.
+
+    Photos within ``max_distance`` bits are merged into photo groups first;
+    two listings are linked when they share at least ``min_photos`` groups
+    (or all photos of the smaller listing).
+    """
+    from app import db
+    from app.models import HousingExchange, MediaObject
+
+    parent = {}
+
+    def find(x):
+        root = x
+        while parent.get(root, root) != root:
+            root = parent[root]
+        while x != root:
+            parent[x], x = root, parent.get(x, x)
+        return root
+
+    def union(a, b):
+        ra, rb = find(a), find(b)
+        if ra != rb:
+            parent[max(ra, rb)] = min(ra, rb)
+
+    # photo groups: path -> representative path
+    index = HashIndex(max_distance)
+    rows = db.session.execute(
+        select(MediaObject.path, MediaObject.phash)
+        .where(MediaObject.phash.is_not(None), MediaObject.ref_count > 0)
+        .execution_options(yield_per=yield_per)
+    )
+    for path, phash in rows:
+        for other, _ in index.query(phash):
+            union(("p", path), ("p", other))
+        index.add(phash, path)
+
+    # listings per photo group
+    groups_of = {}
+    members = defaultdict(list)
+    rows = db.session.execute(
+        select(HousingExchange.id, HousingExchange.photos).execution_options(yield_per=yield_per)
+    )
+    for listing_id, listing_photos in rows:
+        groups = {find(("p", p)) for p in listing_photos or ()}
+        groups_of[listing_id] = groups
+        for group in groups:
+            members[group].append(listing_id)
+
+    shared = defaultdict(int)
+    for ids in members.values():
+        for pair in combinations(sorted(ids), 2):
+            shared[pair] += 1
+    for (a, b), n in shared.items():
+        if n >= min(min_photos, len(groups_of[a]), len(groups_of[b])):
+            union(("l", a), ("l", b))
+
+    clusters = defaultdict(list)
+    for listing_id in groups_of:
+        clusters[find(("l", listing_id))].append(listing_id)
+    return sorted((sorted(ids) for ids in clusters.values() if len(ids) > 1), key=lambda ids: ids[0])
@@ -0,0 +1,153 @@
+"""Cache of rendered listing/tour cards.
+
+A card depends on its row and on the MediaObject row of its cover photo
+(renditions, dimensions, placeholder), so its markup is stored under
+(card template, table, id, updated_at, cover media state, locale): an edit
+bumps ``updated_at`` and a media backfill changes the cover's state, and the
+next render misses, nothing has to be purged. The cover's state comes from
+the media metadata the list views preload anyway. The key also carries a
+digest of the card template and the partials it imports (_cards.html,
+_media.html), so a deploy that changes the markup starts from a clean slate
+even with a shared Redis backend.
+
+Templates render cards with ``{{ cached_card('exchange/_search_card.html', item) }}``;
+the card template sees the row as ``item``.
+"""
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from flask import current_app, g
+from markupsafe import Markup
+
+from app.utils.conditional import template_digest
+from app.utils.media_refs import media_version
+
+
+logger = logging.getLogger(__name__)
+
+_EXTENSION_KEY = "fragment_cache"
+_DEFAULT_LOCALE = "ru"
+
+
+class LRUBackend:
+    """In-process store holding the ``max_entries`` most recently used fragments."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max(1, max_entries)
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class RedisBackend:
+    """Fragments shared by all workers; entries expire after ``ttl`` s (Redis evicts by LRU policy)."""
+
+    def __init__(self, url: str, ttl: int, prefix: str = "frag:"):
+        import redis
+
+        self._client = redis.Redis.from_url(url, socket_timeout=0.2, socket_connect_timeout=0.2)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[str]:
+        try:
+            value = self._client.get(self.prefix + key)
+        except Exception as e:
+            # a cache outage only costs renders
+            logger.warning("Fragment cache read failed: %s", e)
+            return None
+        return value.decode("utf-8") if value is not None else None
+
+    def set(self, key: str, value: str) -> None:
+        try:
+            self._client.set(self.prefix + key, value.encode("utf-8"), ex=self.ttl or None)
+        except Exception as e:
+            logger.warning("Fragment cache write failed: %s", e)
+
+    def clear(self) -> None:
+        try:
+            for key in self._client.scan_iter(match=self.prefix + "*", count=1000):
+                self._client.delete(key)
+        except Exception as e:
+            logger.warning("Fragment cache clear failed: %s", e)
+
+
+class FragmentCache:
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, template: str, obj) -> Markup:
+        stamp = getattr(obj, "updated_at", None)
+        if stamp is None:
+            return Markup(current_app.jinja_env.get_template(template).render(item=obj))
+        photos = getattr(obj, "photos", None)
+        key = ":".join((
+            template, template_digest(template), obj.__tablename__, str(obj.id),
+            stamp.isoformat(), media_version(photos[0]) if photos else "", g.get("locale") or _DEFAULT_LOCALE,
+        ))
+        html = self.backend.get(key)
+        if html is None:
+            self.misses += 1
+            # rendered without context processors: a card must not depend on the viewer
+            html = current_app.jinja_env.get_template(template).render(item=obj)
+            self.backend.set(key, html)
+        else:
+            self.hits += 1
+        return Markup(html)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_ratio": self.hits / total if total else 0.0}
+
+
+def _create_backend(app):
+    cfg = app.config
+    backend = (cfg.get("FRAGMENT_CACHE_BACKEND") or "memory").lower()
+    if backend == "redis":
+        try:
+            return RedisBackend(cfg["FRAGMENT_CACHE_REDIS_URL"], cfg.get("FRAGMENT_CACHE_TTL", 86400))
+        except Exception as e:
+            app.logger.warning("Redis fragment cache unavailable (%s), using in-process cache", e)
+    elif backend == "none":
+        return None
+    return LRUBackend(cfg.get("FRAGMENT_CACHE_SIZE", 2000))
+
+
+def init_fragment_cache(app) -> None:
+    backend = _create_backend(app)
+    cache = app.extensions[_EXTENSION_KEY] = FragmentCache(backend) if backend is not None else None
+
+    def cached_card(template: str, obj) -> Markup:
+        if cache is None:
+            return Markup(current_app.jinja_env.get_template(template).render(item=obj))
+        return cache.render(template, obj)
+
+    app.jinja_env.globals["cached_card"] = cached_card
+
+
+def fragment_cache() -> Optional[FragmentCache]:
+    return current_app.extensions.get(_EXTENSION_KEY)
@@ -1,22 +1,70 @@
-import os, uuid, io
+import os, io, re, base64, binascii, bisect, hashlib, shutil, tempfile, threading, time
+from concurrent.futures import ThreadPoolExecutor
 from flask import current_app
-from werkzeug.utils import secure_filename
 from typing import Optional
 
+from app.utils.images import (
+    DERIVATIVE_FORMATS,
+    MEDIA_SUBDIRS,
+    StoredImage,
+    derivative_path,
+    derivative_paths,
+    derivative_widths,
+    describe_image,
+    load_pillow,
+    render_derivatives,
+)
+from app.utils.media_refs import acquire_media, find_stored
+
+# boto3 module once imported, False when it is not installed (see _boto3())
+_BOTO3 = None
 _S3_CLIENT = None
+_S3_CLIENT_LOCK = threading.Lock()
+# trips when storage keeps failing so uploads fall back to disk without waiting out timeouts
+_S3_BREAKER = None
+# upper bounds (s) of the S3 call latency histogram, see s3_stats()
+_S3_LATENCY_BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+_s3_latency = {"count": 0, "sum": 0.0, "max": 0.0, "errors": 0, "buckets": [0] * (len(_S3_LATENCY_BUCKETS) + 1)}
+_s3_latency_lock = threading.Lock()
+# process-wide pool for media work (decode, resize, upload); see save_images()
+_MEDIA_POOL = None
+_MEDIA_POOL_LOCK = threading.Lock()
+
+def _boto3():
+    """boto3, imported on first S3 use rather than at startup; None when not installed."""
+    global _BOTO3
+    if _BOTO3 is None:
+        try:
+            import boto3  # type: ignore
+
+            _BOTO3 = boto3
+        except ImportError:
+            current_app.logger.warning("S3_BUCKET is set but boto3 is not installed, storing media locally")
+            _BOTO3 = False
+    return _BOTO3 or None
+
 
 def _get_s3_client():
     """Create and cache boto3 client if S3 is configured."""
-    global _S3_CLIENT
     cfg = current_app.config
     bucket = cfg.get("S3_BUCKET")
     if not bucket:
         return None
     if _S3_CLIENT is not None:
         return _S3_CLIENT
-    try:
-        import boto3  # type: ignore
+    # media pool threads may race here on the first upload
+    with _S3_CLIENT_LOCK:
+        return _create_s3_client(cfg)
 
+
+def _create_s3_client(cfg):
+    global _S3_CLIENT
+    if _S3_CLIENT is not None:
+        return _S3_CLIENT
+    boto3 = _boto3()
+    if boto3 is None:
+        return None
+    try:
         kwargs = {}
         if cfg.get("S3_ENDPOINT_URL"):
             kwargs["endpoint_url"] = cfg["S3_ENDPOINT_URL"]
@@ -27,13 +75,104 @@ def _get_s3_client():
             kwargs["aws_secret_access_key"] = cfg["S3_SECRET_ACCESS_KEY"]
         # forcing addressing style if provided (useful for Vercel + custom endpoint)
         addressing = cfg.get("S3_ADDRESSING_STYLE")
-        if addressing:
-            kwargs.setdefault("config", boto3.session.Config(s3={"addressing_style": addressing}))
-        _S3_CLIENT = boto3.client("s3", **kwargs)
+        # every media worker may run S3_MAX_CONCURRENCY transfer threads on the shared client
+        pool_size = cfg.get("S3_MAX_POOL_CONNECTIONS") or max(
+            10, cfg.get("MEDIA_WORKERS", 4) * cfg.get("S3_MAX_CONCURRENCY", 4)
+        )
+        kwargs["config"] = boto3.session.Config(
+            s3={"addressing_style": addressing} if addressing else None,
+            connect_timeout=cfg.get("S3_CONNECT_TIMEOUT", 3),
+            read_timeout=cfg.get("S3_READ_TIMEOUT", 10),
+            retries={"mode": "standard", "total_max_attempts": cfg.get("S3_MAX_ATTEMPTS", 2)},
+            max_pool_connections=pool_size,
+        )
+        client = boto3.client("s3", **kwargs)
+        _instrument_s3_client(client, cfg)
+        _S3_CLIENT = client
         return _S3_CLIENT
     except Exception:
         return None
 
+
+def _instrument_s3_client(client, cfg) -> None:
+    """Route every S3 operation (incl. s3transfer and paginators) through the breaker and latency stats."""
+    from app.utils.circuit_breaker import CircuitBreaker
+
+    global _S3_BREAKER
+    breaker = _S3_BREAKER = CircuitBreaker(
+        "s3",
+        failure_threshold=cfg.get("S3_BREAKER_FAILURES", 5),
+        reset_timeout=cfg.get("S3_BREAKER_RESET_SECONDS", 30),
+    )
+
+    def before_call(context, **kwargs):
+        # raising here skips the request entirely; callers treat it like any S3 error
+        breaker.check()
+        context["s3_started"] = time.perf_counter()
+
+    def after_call(http_response, context, **kwargs):
+        # 4xx (missing key, denied) means storage is up; only 5xx counts against it
+        failed = http_response.status_code >= 500
+        _record_s3_call(context, failed)
+        if failed:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+
+    def after_call_error(context, **kwargs):
+        # connect/read timeouts and connection errors, after botocore's own retries
+        _record_s3_call(context, True)
+        breaker.record_failure()
+
+    client.meta.events.register("before-call.s3", before_call)
+    client.meta.events.register("after-call.s3", after_call)
+    client.meta.events.register("after-call-error.s3", after_call_error)
+
+
+def _record_s3_call(context, failed: bool) -> None:
+    started = context.pop("s3_started", None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    bucket = bisect.bisect_left(_S3_LATENCY_BUCKETS, elapsed)
+    with _s3_latency_lock:
+        _s3_latency["count"] += 1
+        _s3_latency["sum"] += elapsed
+        _s3_latency["max"] = max(_s3_latency["max"], elapsed)
+        _s3_latency["errors"] += failed
+        _s3_latency["buckets"][bucket] += 1
+
+
+def s3_available() -> bool:
+    """False while the S3 breaker is open (half-open counts as available)."""
+    from app.utils.circuit_breaker import CircuitBreaker
+
+    return _S3_BREAKER is None or _S3_BREAKER.state != CircuitBreaker.OPEN
+
+
+def s3_stats() -> dict:
+    """Breaker state and call latency since process start.
+
+    ``latency_buckets`` maps each upper bound in seconds (and "+Inf") to the
+    number of calls at or below it, cumulative like a Prometheus histogram.
+    """
+    with _s3_latency_lock:
+        latency = dict(_s3_latency, buckets=list(_s3_latency["buckets"]))
+    cumulative, total = {}, 0
+    for bound, n in zip((*_S3_LATENCY_BUCKETS, "+Inf"), latency["buckets"]):
+        total += n
+        cumulative[bound] = total
+    stats = _S3_BREAKER.stats() if _S3_BREAKER else {"state": "closed", "consecutive_failures": 0, "trips": 0, "rejected": 0}
+    stats.update(
+        calls=latency["count"],
+        errors=latency["errors"],
+        latency_sum=latency["sum"],
+        latency_max=latency["max"],
+        latency_buckets=cumulative,
+    )
+    return stats
+
+
 def _s3_public_url(key: str) -> str:
     cfg = current_app.config
     public_base = (cfg.get("S3_PUBLIC_URL") or "").rstrip("/")
@@ -74,85 +213,146 @@ def get_or_create_platform_user(db, User):
     db.session.commit()
     return user
 
-def save_image(file_storage, subdir: str = "uploads") -> str:
-    """Store uploaded image in object storage if configured, otherwise on local disk.
+# Pillow format -> (extension, Content-Type) for the formats we accept
+_IMAGE_FORMATS = {
+    "JPEG": (".jpg", "image/jpeg"),
+    "PNG": (".png", "image/png"),
+    "WEBP": (".webp", "image/webp"),
+}
+_SPOOL_CHUNK = 64 * 1024
 
-    Returns either a public URL (when S3 is enabled) or a relative path under static/ for url_for('static').
-    Uses an in-memory buffer to avoid issues with consumed/closed streams on fallback.
-    """
-    if not file_storage or not getattr(file_storage, 'filename', ''):
-        return ""
-    filename = secure_filename(file_storage.filename)
-    ext = os.path.splitext(filename)[1].lower()
-    new_name = f"{uuid.uuid4().hex}{ext}"
-    key = f"{subdir}/{new_name}"
 
-    # Read content once into memory to support both S3 and local paths reliably
+def _spool_upload(file_storage, max_bytes: int):
+    """Copy an upload stream into a SpooledTemporaryFile, chunk by chunk.
+
+    Small files stay in memory, larger ones roll over to a temp file, so a 20 MB
+    phone photo never sits in the worker heap as one ``bytes`` object.
+    Returns the spool rewound to 0, or None if the upload is empty or exceeds ``max_bytes``.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=current_app.config.get("MEDIA_SPOOL_MAX_MEMORY", 1024 * 1024))
+    stream = file_storage.stream
     try:
-        try:
-            file_storage.stream.seek(0)
-        except Exception:
-            pass
-        content: bytes = file_storage.read()
-    finally:
-        try:
-            # avoid leaving stream in inconsistent state
-            file_storage.close()
-        except Exception:
-            pass
+        stream.seek(0)
+    except Exception:
+        pass
+    total = 0
+    while True:
+        chunk = stream.read(_SPOOL_CHUNK)
+        if not chunk:
+            break
+        total += len(chunk)
+        if max_bytes and total > max_bytes:
+            spool.close()
+            current_app.logger.warning("Upload %r rejected: larger than %d bytes", file_storage.filename, max_bytes)
+            return None
+        spool.write(chunk)
+    if not total:
+        spool.close()
+        return None
+    spool.seek(0)
+    return spool
 
-    if not content:
-        return ""
 
-    # MIME validation + optional HEIC->JPEG conversion
+def _inspect_image(spool) -> Optional[str]:
+    """Return the Pillow format of the spooled image, validating it without a full decode.
+
+    ``Image.open`` only parses the header, so dimensions are checked against
+    MEDIA_MAX_PIXELS before any pixel data is touched (decompression bombs),
+    then ``verify()`` checks the file structure.
+    """
+    Image = load_pillow()
+    max_pixels = current_app.config.get("MEDIA_MAX_PIXELS") or 0
     try:
-        from PIL import Image
-        try:
-            import pillow_heif
-            pillow_heif.register_heif_opener()
-        except Exception:
-            pass
-        img = Image.open(io.BytesIO(content))
-        # If HEIC/HEIF, convert to JPEG
-        fmt = (img.format or "").upper()
-        if fmt in {"HEIC", "HEIF"}:
-            buf = io.BytesIO()
-            rgb = img.convert("RGB")
-            rgb.save(buf, format="JPEG", quality=90)
-            content = buf.getvalue()
-            ext = ".jpg"
-            key = f"{subdir}/{uuid.uuid4().hex}{ext}"
-        else:
-            # ensure it's an image format we support
-            if fmt not in {"JPEG", "JPG", "PNG", "WEBP"}:
-                return ""
+        with Image.open(spool) as img:
+            fmt = (img.format or "").upper()
+            width, height = img.size
+            if max_pixels and width * height > max_pixels:
+                current_app.logger.warning("Upload rejected: %dx%d exceeds MEDIA_MAX_PIXELS", width, height)
+                return None
+            img.verify()
     except Exception:
-        # Not an image or cannot be parsed
-        return ""
+        # Not an image, truncated, or over Pillow's own bomb threshold
+        return None
+    finally:
+        spool.seek(0)
+    return fmt
+
+
+def _heic_to_jpeg(spool):
+    """Decode a HEIC/HEIF spool and re-encode it as JPEG into a new spool."""
+    Image = load_pillow()
+
+    out = tempfile.SpooledTemporaryFile(max_size=current_app.config.get("MEDIA_SPOOL_MAX_MEMORY", 1024 * 1024))
+    with Image.open(spool) as img:
+        img.convert("RGB").save(out, format="JPEG", quality=90)
+    out.seek(0)
+    return out
+
+
+def _file_sha256(fileobj) -> str:
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: fileobj.read(_SPOOL_CHUNK), b""):
+        digest.update(chunk)
+    fileobj.seek(0)
+    return digest.hexdigest()
+
+
+def _s3_transfer_config():
+    from boto3.s3.transfer import TransferConfig  # type: ignore
+
+    cfg = current_app.config
+    return TransferConfig(
+        multipart_threshold=cfg.get("S3_MULTIPART_THRESHOLD", 8 * 1024 * 1024),
+        multipart_chunksize=cfg.get("S3_MULTIPART_CHUNKSIZE", 8 * 1024 * 1024),
+        max_concurrency=cfg.get("S3_MAX_CONCURRENCY", 4),
+    )
 
-    # Try S3-compatible storage
-    s3 = _get_s3_client()
+
+class _KeepOpen:
+    """File proxy whose close() is a no-op: s3transfer closes what it uploads,
+    but the spool is still needed afterwards (renditions, local fallback)."""
+
+    def __init__(self, fileobj):
+        self._fileobj = fileobj
+
+    def __getattr__(self, name):
+        return getattr(self._fileobj, name)
+
+    def close(self) -> None:
+        pass
+
+
+def _store_object(fileobj, key: str, content_type: str, use_s3: bool = True, use_local: bool = True) -> str:
+    """Write ``fileobj`` under ``key`` to object storage, falling back to static/ on disk.
+
+    Returns the public URL (S3), the static-relative path (local) or "" on failure.
+    """
+    s3 = _get_s3_client() if use_s3 else None
     bucket = current_app.config.get("S3_BUCKET")
     if s3 and bucket:
         try:
-            # Re-detect mimetype after possible conversion
-            extra_args = {"ContentType": (getattr(file_storage, 'mimetype', None) or "image/jpeg")}
+            extra_args = {"ContentType": content_type}
+            cache_control = current_app.config.get("MEDIA_CACHE_CONTROL")
+            if cache_control:
+                extra_args["CacheControl"] = cache_control
             if current_app.config.get("S3_SET_PUBLIC_ACL", True):
                 extra_args["ACL"] = "public-read"
-            s3.upload_fileobj(io.BytesIO(content), bucket, key, ExtraArgs=extra_args)
+            # upload_fileobj switches to multipart above S3_MULTIPART_THRESHOLD
+            s3.upload_fileobj(_KeepOpen(fileobj), bucket, key, ExtraArgs=extra_args, Config=_s3_transfer_config())
             return _s3_public_url(key)
         except Exception:
             # Fall back to local save if S3 fails
-            pass
+            fileobj.seek(0)
+    if not use_local:
+        return ""
 
     # Local filesystem fallback (best-effort; may be read-only in serverless)
     try:
-        folder = os.path.join(current_app.static_folder, subdir)
-        os.makedirs(folder, exist_ok=True)
-        save_path = os.path.join(folder, new_name)
+        save_path = os.path.join(current_app.static_folder, key)
+        os.makedirs(os.path.dirname(save_path), exist_ok=True)
         with open(save_path, 'wb') as f:
-            f.write(content)
-        return f"{subdir}/{new_name}"
+            shutil.copyfileobj(fileobj, f, _SPOOL_CHUNK)
+        return key
     except Exception as e:
         try:
             current_app.logger.error("Local media save failed: %s", e)
@@ -160,50 +360,197 @@ def save_image(file_storage, subdir: str = "uploads") -> str:
             pass
         return ""
 
-def delete_media_file(path_or_url: str) -> None:
-    """Delete media from storage.
 
-    If S3 is configured and the given value looks like a URL to the bucket (or a key),
-    delete from S3. Otherwise attempt to delete a local static file.
+def _store_derivatives(fileobj, key: str, subdir: str, use_s3: bool) -> bool:
+    """Render and store the resized WebP/JPEG renditions of the original at ``key``.
+
+    Failures are logged and never fail the upload: the MediaObject row is left
+    without ``has_renditions`` and the templates keep linking the original.
     """
-    if not path_or_url:
-        return
-    # Try S3
-    s3 = _get_s3_client()
-    bucket = current_app.config.get("S3_BUCKET")
-    if s3 and bucket:
+    widths = derivative_widths(subdir)
+    if not widths or not current_app.config.get("MEDIA_DERIVATIVES_ENABLED", True):
+        return False
+    try:
+        for width, ext, data in render_derivatives(fileobj, widths):
+            content_type = DERIVATIVE_FORMATS[ext][1]
+            if not _store_object(io.BytesIO(data), derivative_path(key, width, ext), content_type,
+                                 use_s3=use_s3, use_local=not use_s3):
+                return False
+        return True
+    except Exception as e:
+        current_app.logger.warning("Could not render derivatives for %s: %s", key, e)
+        return False
+
+
+_DATA_URL_RE = re.compile(r"^data:(image/(?:png|jpeg|webp));base64,", re.IGNORECASE)
+
+
+def data_url_upload(value: str, filename: str = "upload"):
+    """Wrap a base64 ``data:image/...`` URL (e.g. from a client-side cropper) as an upload for save_image().
+
+    Returns a FileStorage, or None if ``value`` is not such a URL, is not valid
+    base64 or decodes to more than MEDIA_MAX_FILE_SIZE.
+    """
+    from werkzeug.datastructures import FileStorage
+
+    match = _DATA_URL_RE.match(value or "")
+    if not match:
+        return None
+    payload = "".join(value[match.end():].split())
+    max_bytes = current_app.config.get("MEDIA_MAX_FILE_SIZE") or 0
+    if max_bytes and len(payload) * 3 // 4 > max_bytes:
+        return None
+    try:
+        data = base64.b64decode(payload, validate=True)
+    except (binascii.Error, ValueError):
+        return None
+    content_type = match.group(1).lower()
+    ext = {"image/png": ".png", "image/jpeg": ".jpg", "image/webp": ".webp"}[content_type]
+    return FileStorage(io.BytesIO(data), filename=f"{filename}{ext}", content_type=content_type)
+
+
+def _describe_stored(stored: str, fileobj, has_renditions: bool = False) -> str:
+    """Attach dimensions, placeholder and whether renditions were stored to a freshly stored path (StoredImage)."""
+    try:
+        fileobj.seek(0)
+        return StoredImage(stored, has_renditions=has_renditions, **describe_image(fileobj))
+    except Exception as e:
+        current_app.logger.warning("Could not compute placeholder for %s: %s", stored, e)
+        return StoredImage(stored, has_renditions=has_renditions)
+
+
+def save_image(file_storage, subdir: str = "uploads", dedup: bool = True) -> str:
+    """Store uploaded image in object storage if configured, otherwise on local disk.
+
+    Returns either a public URL (when S3 is enabled) or a relative path under static/ for url_for('static').
+    Resized WebP/JPEG renditions are stored next to the original (see app.utils.images), and new
+    uploads come back as a StoredImage carrying dimensions and a tiny placeholder for MediaObject.
+    Objects are named by the SHA-256 of their bytes; content that is already stored is not uploaded again.
+    No reference is taken here, use save_images() from routes. ``dedup=False`` skips the lookup of
+    already stored content (which goes through db.session) and simply writes the same content-addressed key.
+    The upload is spooled (memory up to MEDIA_SPOOL_MAX_MEMORY, then a temp file), validated from its
+    header and streamed to storage; files over MEDIA_MAX_FILE_SIZE are rejected.
+    """
+    if not file_storage or not getattr(file_storage, 'filename', ''):
+        return ""
+
+    try:
+        spool = _spool_upload(file_storage, current_app.config.get("MEDIA_MAX_FILE_SIZE") or 0)
+    finally:
         try:
-            key = path_or_url
-            public = (current_app.config.get("S3_PUBLIC_URL") or "").rstrip("/")
-            endpoint = (current_app.config.get("S3_ENDPOINT_URL") or "").rstrip("/")
-            if path_or_url.startswith("http"):
-                # Strip host part
-                if public and path_or_url.startswith(public + "/"):
-                    key = path_or_url[len(public) + 1 :]
-                elif endpoint and bucket in path_or_url:
-                    # endpoint/bucket/key
-                    key = path_or_url.split(bucket + "/", 1)[-1]
-                else:
-                    # https://bucket.s3.region.amazonaws.com/key
-                    marker = f"{bucket}."  # after bucket.
-                    if marker in path_or_url:
-                        key = path_or_url.split('.amazonaws.com/', 1)[-1]
-            if key and not key.startswith("http"):
-                s3.delete_object(Bucket=bucket, Key=key)
-                return
+            # avoid leaving stream in inconsistent state
+            file_storage.close()
         except Exception:
             pass
-    # Local delete fallback
+    if spool is None:
+        return ""
+
     try:
-        base = current_app.static_folder
-        # If we received a URL path like "/static/..." convert to relative
-        rel = path_or_url
-        if rel.startswith("/static/"):
-            rel = rel[len("/static/") :]
-        abs_path = os.path.join(base, rel)
-        if os.path.isfile(abs_path):
-            os.remove(abs_path)
-    except Exception:
-        pass
+        # MIME validation + optional HEIC->JPEG conversion
+        fmt = _inspect_image(spool)
+        if fmt in {"HEIC", "HEIF"}:
+            try:
+                converted = _heic_to_jpeg(spool)
+            except Exception:
+                return ""
+            spool.close()
+            spool, fmt = converted, "JPEG"
+        # ensure it's an image format we support
+        if fmt not in _IMAGE_FORMATS:
+            return ""
+        ext, content_type = _IMAGE_FORMATS[fmt]
+        # content-addressed: identical bytes map to one object (see app.utils.media_refs)
+        digest = _file_sha256(spool)
+        existing = find_stored(digest, subdir) if dedup else None
+        if existing:
+            return existing
+        key = f"{subdir}/{digest}{ext}"
+
+        stored = _store_object(spool, key, content_type)
+        if stored and subdir in MEDIA_SUBDIRS:
+            spool.seek(0)
+            # renditions live in the same backend as the original
+            renditions = _store_derivatives(spool, key, subdir, use_s3=stored.startswith("http"))
+            stored = _describe_stored(stored, spool, has_renditions=renditions)
+        return stored
+    finally:
+        spool.close()
+
+def _get_media_pool() -> ThreadPoolExecutor:
+    global _MEDIA_POOL
+    if _MEDIA_POOL is None:
+        with _MEDIA_POOL_LOCK:
+            if _MEDIA_POOL is None:
+                _MEDIA_POOL = ThreadPoolExecutor(
+                    max_workers=current_app.config.get("MEDIA_WORKERS", 4), thread_name_prefix="media"
+                )
+    return _MEDIA_POOL
+
+
+def _save_image_in_app(app, file_storage, subdir: str) -> str:
+    with app.app_context():
+        return save_image(file_storage, subdir=subdir)
+
+
+def save_images(files, subdir: str = "uploads") -> tuple[list[str], list[str]]:
+    """Save several uploads concurrently on the shared media pool.
+
+    Pillow and boto3 release the GIL while decoding/encoding and on the network,
+    so a batch of photos costs roughly the slowest one instead of the sum.
+    Returns ``(stored paths in upload order, filenames that were rejected)``;
+    empty file inputs are ignored. A reference is taken on every stored path in
+    the current session, so the caller must commit the rows that use them.
+    """
+    files = [f for f in (files or []) if f and getattr(f, "filename", "")]
+    if len(files) <= 1:
+        results = [save_image(f, subdir=subdir) for f in files]
+    else:
+        app = current_app._get_current_object()
+        pool = _get_media_pool()
+        futures = [pool.submit(_save_image_in_app, app, f, subdir) for f in files]
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                current_app.logger.error("Media worker failed: %s", e)
+                results.append("")
+    stored = [r for r in results if r]
+    rejected = [f.filename for f, r in zip(files, results) if not r]
+    acquire_media(stored)
+    return stored, rejected
+
 
+def _s3_key_from_url(path_or_url: str) -> str:
+    """Map a stored public URL (or a bare key) back to its object key; "" if it is not ours."""
+    bucket = current_app.config.get("S3_BUCKET")
+    key = path_or_url
+    public = (current_app.config.get("S3_PUBLIC_URL") or "").rstrip("/")
+    endpoint = (current_app.config.get("S3_ENDPOINT_URL") or "").rstrip("/")
+    if path_or_url.startswith("http"):
+        # Strip host part
+        if public and path_or_url.startswith(public + "/"):
+            key = path_or_url[len(public) + 1 :]
+        elif endpoint and bucket in path_or_url:
+            # endpoint/bucket/key
+            key = path_or_url.split(bucket + "/", 1)[-1]
+        else:
+            # https://bucket.s3.region.amazonaws.com/key
+            marker = f"{bucket}."  # after bucket.
+            if marker in path_or_url:
+                key = path_or_url.split('.amazonaws.com/', 1)[-1]
+    return key if key and not key.startswith("http") else ""
+
+
+def delete_media_file(path_or_url: str) -> None:
+    """Delete media from storage right away.
+
+    Bucket URLs are deleted from S3, other paths are treated as files under static/.
+    Resized renditions of an upload are deleted along with it, in the same batch.
+    Routes should prefer app.utils.media_deletion.schedule_media_deletion, which waits for the commit.
+    """
+    if not path_or_url:
+        return
+    from app.utils.media_deletion import flush_media_deletions
 
+    flush_media_deletions([path_or_url, *derivative_paths(path_or_url)])
@@ -0,0 +1,239 @@
+import io
+import logging
+import os
+import re
+import threading
+from typing import Iterator, Optional
+
+from flask import current_app
+
+
+# Directories under static/ (or key prefixes in the bucket) that hold user uploads
+MEDIA_SUBDIRS = ("listing_photos", "tour_photos", "avatars")
+
+# derivative extension -> (Pillow format, Content-Type)
+DERIVATIVE_FORMATS = {
+    "webp": ("WEBP", "image/webp"),
+    "jpg": ("JPEG", "image/jpeg"),
+}
+_SAVE_OPTIONS = {
+    "WEBP": {"quality": 80, "method": 4},
+    "JPEG": {"quality": 82, "optimize": True, "progressive": True},
+}
+# <name>.w320.webp next to <name>.jpg
+_DERIVATIVE_RE = re.compile(r"\.w(\d+)\.(webp|jpg)$")
+# longest side (px) of the inline blurred placeholder painted before a photo loads
+PLACEHOLDER_SIZE = 16
+# EXIF orientations that rotate by 90/270 degrees (width and height swap)
+_ROTATED_ORIENTATIONS = {5, 6, 7, 8}
+# side of the grayscale grid the 64-bit difference hash is computed on (9x8 -> 8x8 bits)
+_DHASH_SIZE = 8
+
+logger = logging.getLogger(__name__)
+_PILLOW_READY = False
+_PILLOW_LOCK = threading.Lock()
+
+
+def load_pillow():
+    """Return ``PIL.Image``, importing Pillow and registering the HEIF opener once per process.
+
+    Neither is imported at startup (only uploads need them), and a missing
+    pillow_heif is looked up once instead of on every upload.
+    """
+    global _PILLOW_READY
+    from PIL import Image
+
+    if not _PILLOW_READY:
+        with _PILLOW_LOCK:
+            if not _PILLOW_READY:
+                try:
+                    import pillow_heif
+
+                    pillow_heif.register_heif_opener()
+                except Exception as e:
+                    logger.info("HEIC/HEIF uploads are not supported (pillow_heif: %s)", e)
+                _PILLOW_READY = True
+    return Image
+
+
+class StoredImage(str):
+    """A stored path/URL that also carries what was learned while processing the upload.
+
+    It is the path string in every respect; acquire_media() copies the
+    attributes (``width``, ``height``, ``placeholder``, ``phash``,
+    ``has_renditions``) onto the MediaObject row.
+    """
+
+    width = None
+    height = None
+    placeholder = None
+    phash = None
+    has_renditions = False
+
+    def __new__(cls, path: str, **meta):
+        obj = super().__new__(cls, path)
+        for name, value in meta.items():
+            setattr(obj, name, value)
+        return obj
+
+
+def media_subdir(path: str) -> Optional[str]:
+    """Return the upload directory a stored path or public URL belongs to, if any."""
+    if not path or path.startswith("data:"):
+        return None
+    for subdir in MEDIA_SUBDIRS:
+        if path.startswith(subdir + "/") or f"/{subdir}/" in path:
+            return subdir
+    return None
+
+
+def is_derivative(path: str) -> bool:
+    return bool(_DERIVATIVE_RE.search(path or ""))
+
+
+def derivative_widths(subdir: Optional[str]) -> tuple:
+    """Widths rendered for uploads in ``subdir`` (avatars get their own, smaller set)."""
+    if not subdir:
+        return ()
+    cfg = current_app.config
+    widths = cfg.get("MEDIA_AVATAR_WIDTHS") if subdir == "avatars" else cfg.get("MEDIA_DERIVATIVE_WIDTHS")
+    return tuple(sorted(widths or ()))
+
+
+def derivative_path(path: str, width: int, ext: str) -> str:
+    """Key/URL of the ``width``-px ``ext`` rendition of an original.
+
+    Originals are stored under unique names and never overwritten, so the
+    derived name is as immutable as the original and can be cached forever.
+    """
+    base, _ = os.path.splitext(path)
+    return f"{base}.w{width}.{ext}"
+
+
+def derivative_paths(path: str) -> list:
+    """Every rendition path of an original upload (empty for non-uploads and renditions)."""
+    if is_derivative(path):
+        return []
+    return [
+        derivative_path(path, width, ext)
+        for width in derivative_widths(media_subdir(path))
+        for ext in DERIVATIVE_FORMATS
+    ]
+
+
+def has_derivatives(path: str) -> bool:
+    """Whether templates may link the renditions of ``path``: only once they were actually stored.
+
+    Legacy uploads and uploads whose rendering failed keep their original
+    until ``flask media derivatives`` has rendered them.
+    """
+    if not current_app.config.get("MEDIA_DERIVATIVES_ENABLED", True):
+        return False
+    if not derivative_widths(media_subdir(path)) or is_derivative(path):
+        return False
+    from app.utils.media_refs import has_renditions
+
+    return has_renditions(path)
+
+
+def pick_width(widths: tuple, size: int) -> int:
+    """Smallest rendered width that still covers ``size`` px (largest one otherwise)."""
+    for width in widths:
+        if width >= size:
+            return width
+    return widths[-1]
+
+
+def _flatten(img):
+    """RGB copy of ``img`` with transparency composited onto white (for JPEG)."""
+    from PIL import Image
+
+    if img.mode == "RGB":
+        return img
+    background = Image.new("RGB", img.size, (255, 255, 255))
+    background.paste(img, mask=img.getchannel("A") if "A" in img.getbands() else None)
+    return background
+
+
+def render_derivatives(fileobj, widths) -> Iterator[tuple]:
+    """Yield ``(width, ext, bytes)`` for every width/format pair, largest first.
+
+    The source is decoded once (JPEG via ``draft`` at a reduced scale) and each
+    smaller size is resampled from the previous one.
+    """
+    from PIL import Image, ImageOps
+
+    widths = sorted(widths, reverse=True)
+    with Image.open(fileobj) as src:
+        # JPEG only: let libjpeg decode at 1/2, 1/4 or 1/8 scale when that still covers the largest width
+        src.draft("RGB", (widths[0], 1))
+        img = ImageOps.exif_transpose(src)
+        if img.mode not in ("RGB", "RGBA"):
+            has_alpha = "transparency" in img.info or img.mode in ("LA", "PA")
+            img = img.convert("RGBA" if has_alpha else "RGB")
+        for width in widths:
+            if img.width > width:
+                img = img.resize((width, max(1, round(img.height * width / img.width))), Image.LANCZOS)
+            for ext, (fmt, _content_type) in DERIVATIVE_FORMATS.items():
+                frame = _flatten(img) if fmt == "JPEG" else img
+                buf = io.BytesIO()
+                frame.save(buf, format=fmt, **_SAVE_OPTIONS[fmt])
+                yield width, ext, buf.getvalue()
+
+
+def dhash(img) -> int:
+    """64-bit difference hash of a decoded image, as a signed integer (fits BIGINT).
+
+    Each bit says whether a pixel of the 9x8 grayscale thumbnail is brighter
+    than its right neighbour, so re-encoding, resizing and small edits flip
+    only a few bits; compare hashes with ``hamming``.
+    """
+    from PIL import Image
+
+    small = img.convert("L").resize((_DHASH_SIZE + 1, _DHASH_SIZE), Image.LANCZOS)
+    px = small.tobytes()
+    value = 0
+    for row in range(_DHASH_SIZE):
+        offset = row * (_DHASH_SIZE + 1)
+        for col in range(_DHASH_SIZE):
+            value = value << 1 | (px[offset + col] > px[offset + col + 1])
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def hamming(a: int, b: int) -> int:
+    """Number of differing bits between two 64-bit hashes (signed or not)."""
+    return ((a ^ b) & 0xFFFFFFFFFFFFFFFF).bit_count()
+
+
+def describe_image(fileobj) -> dict:
+    """Displayed dimensions, a tiny WebP ``data:`` URI placeholder and the dHash of an image.
+
+    JPEGs are decoded via ``draft`` at 1/8 scale, so this costs far less than
+    the renditions. The file position is restored to 0.
+    """
+    import base64
+
+    from PIL import Image, ImageOps
+
+    try:
+        with Image.open(fileobj) as src:
+            width, height = src.size
+            if src.getexif().get(0x0112, 1) in _ROTATED_ORIENTATIONS:
+                width, height = height, width
+            src.draft("RGB", (PLACEHOLDER_SIZE * 4, PLACEHOLDER_SIZE * 4))
+            img = ImageOps.exif_transpose(src)
+            if img.mode not in ("RGB", "RGBA"):
+                img = img.convert("RGBA" if "transparency" in img.info or img.mode in ("LA", "PA") else "RGB")
+            img = _flatten(img)
+            phash = dhash(img)
+            img.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE), Image.LANCZOS)
+            buf = io.BytesIO()
+            img.save(buf, format="WEBP", quality=40)
+    finally:
+        fileobj.seek(0)
+    return {
+        "width": width,
+        "height": height,
+        "placeholder": "data:image/webp;base64," + base64.b64encode(buf.getvalue()).decode("ascii"),
+        "phash": phash,
+    }
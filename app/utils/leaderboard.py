@@ -0,0 +1,257 @@
+"""Popular tours: ``booking_count`` upkeep and a per-city top-N leaderboard.
+
+Booking routes call ``adjust_booking_count(tour, ±1)`` inside their
+transaction; it is a single ``UPDATE ... SET booking_count = booking_count + n``
+so concurrent bookings never lose an increment. The new value rides on the
+session and, once the transaction commits (a rollback forgets it), moves the
+tour on the leaderboards of its city and of the whole site ("*").
+
+A leaderboard is the LEADERBOARD_SIZE best tours of a city: a bounded board
+per process ("memory") or a sorted set shared by all workers ("redis"). A
+board is loaded with one indexed ``ORDER BY booking_count DESC LIMIT`` query
+and kept up to date incrementally; a drop in score (a cancellation may let a
+tour that is not on the board overtake it) discards the board instead, and
+every board is reloaded after LEADERBOARD_TTL s, which also picks up other
+workers' changes to in-process boards.
+"""
+import logging
+import threading
+import time
+from typing import Optional
+
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+
+logger = logging.getLogger(__name__)
+
+_EXTENSION_KEY = "tour_leaderboard"
+_PENDING_KEY = "pending_tour_scores"
+ALL_CITIES = "*"
+
+
+def _board_keys(city) -> tuple:
+    city = (city or "").strip()
+    return (ALL_CITIES, city) if city else (ALL_CITIES,)
+
+
+def _load_board(key: str, size: int) -> list:
+    """``[(tour_id, booking_count)]`` of the ``size`` most booked active tours of ``key``."""
+    from app import db
+    from app.models import RemoteTourism
+
+    query = (
+        db.select(RemoteTourism.id, RemoteTourism.booking_count)
+        .where(RemoteTourism.is_active.is_(True), RemoteTourism.booking_count > 0)
+        .order_by(RemoteTourism.booking_count.desc(), RemoteTourism.id)
+        .limit(size)
+    )
+    if key != ALL_CITIES:
+        query = query.where(RemoteTourism.city == key)
+    return [tuple(row) for row in db.session.execute(query)]
+
+
+class MemoryLeaderboard:
+    """Per-process boards: ``{key: (loaded_at, {tour_id: score})}`` holding at most ``size`` tours."""
+
+    def __init__(self, size: int, ttl: int):
+        self.size = max(1, size)
+        self.ttl = ttl
+        self._boards = {}
+        self._lock = threading.Lock()
+
+    def top(self, key: str, n: int) -> list:
+        with self._lock:
+            entry = self._boards.get(key)
+            if entry is not None and time.monotonic() - entry[0] <= self.ttl:
+                scores = dict(entry[1])
+            else:
+                scores = None
+        if scores is None:
+            scores = dict(_load_board(key, self.size))
+            with self._lock:
+                self._boards[key] = (time.monotonic(), dict(scores))
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return [tour_id for tour_id, _ in ranked[:n]]
+
+    def set(self, key: str, tour_id: int, score: int) -> None:
+        with self._lock:
+            entry = self._boards.get(key)
+            if entry is None:
+                return
+            scores = entry[1]
+            previous = scores.get(tour_id)
+            if previous is not None and score < previous:
+                # a tour that is not on the board may now rank above this one
+                del self._boards[key]
+            elif previous is not None:
+                scores[tour_id] = score
+            elif len(scores) < self.size:
+                # the board is not full, so it holds every tour with a booking
+                if score > 0:
+                    scores[tour_id] = score
+            else:
+                weakest = min(scores, key=lambda t: (scores[t], -t))
+                if (score, -tour_id) > (scores[weakest], -weakest):
+                    del scores[weakest]
+                    scores[tour_id] = score
+
+    def discard(self, key: str, tour_id: int) -> None:
+        with self._lock:
+            entry = self._boards.get(key)
+            if entry is not None and tour_id in entry[1]:
+                # the next tour in line is not known here
+                del self._boards[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._boards.clear()
+
+
+class RedisLeaderboard:
+    """Boards shared by all workers: one ``toptours:<key>`` sorted set per city, expiring after ``ttl``."""
+
+    def __init__(self, url: str, size: int, ttl: int):
+        import redis
+
+        self._client = redis.Redis.from_url(url, socket_timeout=0.2, socket_connect_timeout=0.2)
+        self.size = max(1, size)
+        self.ttl = ttl
+
+    def top(self, key: str, n: int) -> list:
+        name = "toptours:" + key
+        try:
+            ids = self._client.zrevrange(name, 0, n - 1)
+            if ids:
+                return [int(i) for i in ids]
+        except Exception as e:
+            logger.warning("Tour leaderboard read failed: %s", e)
+            return [tour_id for tour_id, _ in _load_board(key, n)]
+        board = _load_board(key, self.size)
+        if board:
+            try:
+                pipe = self._client.pipeline(transaction=False)
+                pipe.zadd(name, {str(tour_id): score for tour_id, score in board})
+                pipe.expire(name, self.ttl)
+                pipe.execute()
+            except Exception as e:
+                logger.warning("Tour leaderboard write failed: %s", e)
+        return [tour_id for tour_id, _ in board[:n]]
+
+    def set(self, key: str, tour_id: int, score: int) -> None:
+        name = "toptours:" + key
+        try:
+            previous = self._client.zscore(name, tour_id)
+            if previous is not None and score < previous:
+                self._client.delete(name)
+            elif score > 0 and self._client.exists(name):
+                pipe = self._client.pipeline(transaction=False)
+                pipe.zadd(name, {str(tour_id): score})
+                # keep the ``size`` best
+                pipe.zremrangebyrank(name, 0, -self.size - 1)
+                pipe.execute()
+        except Exception as e:
+            # the board is rebuilt after the TTL
+            logger.warning("Tour leaderboard update failed: %s", e)
+
+    def discard(self, key: str, tour_id: int) -> None:
+        name = "toptours:" + key
+        try:
+            if self._client.zscore(name, tour_id) is not None:
+                self._client.delete(name)
+        except Exception as e:
+            logger.warning("Tour leaderboard update failed: %s", e)
+
+    def clear(self) -> None:
+        try:
+            for name in self._client.scan_iter(match="toptours:*", count=1000):
+                self._client.delete(name)
+        except Exception as e:
+            logger.warning("Tour leaderboard clear failed: %s", e)
+
+
+def adjust_booking_count(tour, delta: int) -> int:
+    """Add ``delta`` to ``tour.booking_count`` in the current transaction; returns the new count."""
+    from app import db
+    from app.models import RemoteTourism
+
+    count = db.session.execute(
+        db.update(RemoteTourism)
+        .where(RemoteTourism.id == tour.id)
+        # a booking is not an edit of the tour: ETags and cached cards stay valid
+        .values(booking_count=RemoteTourism.booking_count + delta, updated_at=RemoteTourism.updated_at)
+        .returning(RemoteTourism.booking_count)
+        .execution_options(synchronize_session=False)
+    ).scalar_one()
+    db.session.expire(tour, ["booking_count"])
+    db.session.info.setdefault(_PENDING_KEY, []).append((tour.id, _board_keys(tour.city), count))
+    return count
+
+
+def unrank_tour(tour, old_city=None) -> None:
+    """After the commit, take a deleted tour off its boards, or move a tour that left ``old_city``."""
+    from app import db
+
+    pending = db.session.info.setdefault(_PENDING_KEY, [])
+    if old_city is None:
+        pending.append((tour.id, _board_keys(tour.city), None))
+        return
+    pending.append((tour.id, _board_keys(old_city)[1:], None))
+    pending.append((tour.id, _board_keys(tour.city)[1:], tour.booking_count))
+
+
+@event.listens_for(Session, "after_commit")
+def _rank_after_commit(session) -> None:
+    scores = session.info.pop(_PENDING_KEY, None)
+    if not scores or not has_app_context():
+        return
+    board = current_app.extensions.get(_EXTENSION_KEY)
+    if board is None:
+        return
+    for tour_id, keys, score in scores:
+        for key in keys:
+            if score is None:
+                board.discard(key, tour_id)
+            else:
+                board.set(key, tour_id, score)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_on_rollback(session) -> None:
+    session.info.pop(_PENDING_KEY, None)
+
+
+def top_tours(n: int, city: Optional[str] = None) -> list:
+    """The ``n`` most booked active tours of ``city`` (of the whole site by default), best first."""
+    from app import db
+    from app.models import RemoteTourism
+
+    board = current_app.extensions.get(_EXTENSION_KEY)
+    key = (city or "").strip() or ALL_CITIES
+    ids = board.top(key, n) if board is not None else [t for t, _ in _load_board(key, n)]
+    if not ids:
+        return []
+    tours = db.session.execute(
+        db.select(RemoteTourism).where(RemoteTourism.id.in_(ids), RemoteTourism.is_active.is_(True))
+    ).scalars().all()
+    by_id = {t.id: t for t in tours}
+    return [by_id[i] for i in ids if i in by_id]
+
+
+def init_leaderboard(app) -> None:
+    cfg = app.config
+    size, ttl = cfg.get("LEADERBOARD_SIZE", 50), cfg.get("LEADERBOARD_TTL", 300)
+    board = None
+    if (cfg.get("LEADERBOARD_BACKEND") or "memory").lower() == "redis":
+        try:
+            board = RedisLeaderboard(cfg["LEADERBOARD_REDIS_URL"], size, ttl)
+        except Exception as e:
+            app.logger.warning("Redis tour leaderboard unavailable (%s), using in-process boards", e)
+    if board is None:
+        board = MemoryLeaderboard(size, ttl)
+    app.extensions[_EXTENSION_KEY] = board
+
+
+def tour_leaderboard():
+    return current_app.extensions.get(_EXTENSION_KEY)
@@ -0,0 +1,193 @@
+"""Deferred, batched deletion of uploaded media.
+
+Routes call ``schedule_media_deletion()`` while changing rows. The paths are
+parked on the SQLAlchemy session and only removed from storage once the
+transaction commits (a rollback forgets them), on the media pool so the
+request does not wait. Right before deleting, the references are read again:
+an upload that is referenced by then (the same photo removed and added back
+in one request, or attached elsewhere meanwhile) is kept with its renditions.
+Bucket objects go out in one DeleteObjects call per 1000 keys; local files
+are unlinked in the same pass.
+"""
+import os
+import threading
+import time
+from collections import Counter
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from app.utils.images import derivative_paths
+from app.utils.media_refs import release_media
+
+
+_PENDING_KEY = "pending_media_deletes"
+# S3 DeleteObjects accepts at most 1000 keys per request
+_S3_BATCH_SIZE = 1000
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def _count(**increments) -> None:
+    with _stats_lock:
+        _stats.update(increments)
+
+
+def media_deletion_stats() -> dict:
+    """Totals since process start: batches, deleted, retries, failed."""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def schedule_media_deletion(paths) -> None:
+    """Release one reference per path and queue the ones no longer referenced
+    (with their renditions) for deletion after the current transaction commits."""
+    from app import db
+
+    db.session.info.setdefault(_PENDING_KEY, []).extend(release_media(paths))
+
+
+def _unreferenced(paths) -> list:
+    """``paths`` minus the uploads that have a live MediaObject row now, plus their renditions."""
+    from app import db
+    from app.models import MediaObject
+
+    referenced = set()
+    paths = list(dict.fromkeys(paths))
+    # own connection to the primary: this runs from after_commit, where the session can't emit SQL
+    with db.engine.connect() as conn:
+        for i in range(0, len(paths), _S3_BATCH_SIZE):
+            referenced.update(conn.execute(
+                select(MediaObject.path)
+                .where(MediaObject.path.in_(paths[i:i + _S3_BATCH_SIZE]), MediaObject.ref_count > 0)
+            ).scalars())
+    if referenced:
+        current_app.logger.info("Media deletion: kept %d uploads referenced again", len(referenced))
+    doomed = []
+    for path in paths:
+        if path not in referenced:
+            doomed.append(path)
+            doomed.extend(derivative_paths(path))
+    return doomed
+
+
+def _flush_released(paths) -> None:
+    """Delete released uploads and their renditions unless they are referenced again."""
+    flush_media_deletions(_unreferenced(paths))
+
+
+@event.listens_for(Session, "after_commit")
+def _flush_after_commit(session) -> None:
+    paths = session.info.pop(_PENDING_KEY, None)
+    if not paths or not has_app_context():
+        return
+    app = current_app._get_current_object()
+    if app.config.get("MEDIA_DELETE_ASYNC", True):
+        from app.utils.helpers import _get_media_pool
+
+        _get_media_pool().submit(_flush_in_app, app, paths)
+    else:
+        _flush_released(paths)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_on_rollback(session) -> None:
+    session.info.pop(_PENDING_KEY, None)
+
+
+def _flush_in_app(app, paths) -> None:
+    with app.app_context():
+        try:
+            _flush_released(paths)
+        except Exception as e:
+            app.logger.error("Deferred media deletion failed: %s", e)
+
+
+def flush_media_deletions(paths) -> dict:
+    """Delete the given stored paths/URLs right away, batching bucket deletes.
+
+    Public URLs of the bucket are deleted from S3 (when S3_DELETE_ENABLED),
+    everything else is treated as a file under static/. Failed S3 batches and
+    per-key errors are retried with exponential backoff.
+    Returns counts for this call: deleted, failed, batches.
+    """
+    from app.utils.helpers import _get_s3_client, _s3_key_from_url
+
+    cfg = current_app.config
+    s3 = _get_s3_client()
+    bucket = cfg.get("S3_BUCKET")
+    keys, local = [], []
+    for path in dict.fromkeys(paths):
+        if path.startswith("http"):
+            key = _s3_key_from_url(path) if s3 and bucket else ""
+            if key:
+                keys.append(key)
+        else:
+            local.append(path)
+
+    return delete_stored(keys, local)
+
+
+def delete_stored(s3_keys, local_paths) -> dict:
+    """Delete bucket keys (batched) and static-relative files; returns counts for this call."""
+    from app.utils.helpers import _get_s3_client
+
+    cfg = current_app.config
+    s3 = _get_s3_client()
+    bucket = cfg.get("S3_BUCKET")
+    result = Counter()
+    if s3_keys and s3 and bucket and cfg.get("S3_DELETE_ENABLED", True):
+        for i in range(0, len(s3_keys), _S3_BATCH_SIZE):
+            _delete_s3_batch(s3, bucket, s3_keys[i:i + _S3_BATCH_SIZE], result)
+    for path in local_paths:
+        _delete_local(path, result)
+
+    _count(**result)
+    if result:
+        current_app.logger.info(
+            "Media deletion: %d deleted, %d failed, %d S3 batches",
+            result["deleted"], result["failed"], result["batches"],
+        )
+    return dict(result)
+
+
+def _delete_s3_batch(s3, bucket: str, batch: list, result: Counter) -> None:
+    cfg = current_app.config
+    attempts = max(1, cfg.get("MEDIA_DELETE_MAX_ATTEMPTS", 3))
+    backoff = cfg.get("MEDIA_DELETE_RETRY_BACKOFF", 0.5)
+    remaining = batch
+    for attempt in range(1, attempts + 1):
+        result["batches"] += 1
+        try:
+            resp = s3.delete_objects(
+                Bucket=bucket, Delete={"Objects": [{"Key": k} for k in remaining], "Quiet": True}
+            )
+            # quiet mode only reports the keys that failed
+            failed = {e.get("Key") for e in resp.get("Errors", [])}
+        except Exception as e:
+            current_app.logger.warning("DeleteObjects failed (attempt %d/%d): %s", attempt, attempts, e)
+            failed = set(remaining)
+        result["deleted"] += len(remaining) - len(failed)
+        remaining = [k for k in remaining if k in failed]
+        if not remaining:
+            return
+        if attempt < attempts:
+            result["retries"] += 1
+            time.sleep(backoff * 2 ** (attempt - 1))
+    result["failed"] += len(remaining)
+    current_app.logger.error("Could not delete %d media objects: %s", len(remaining), remaining[:10])
+
+
+def _delete_local(path: str, result: Counter) -> None:
+    # If we received a URL path like "/static/..." convert to relative
+    rel = path[len("/static/"):] if path.startswith("/static/") else path
+    try:
+        os.remove(os.path.join(current_app.static_folder, rel))
+        result["deleted"] += 1
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        result["failed"] += 1
+        current_app.logger.warning("Could not delete %s: %s", rel, e)
@@ -0,0 +1,199 @@
+"""Reference counting for content-addressed uploads (see MediaObject).
+
+References are taken and released in the caller's session, so they commit or
+roll back together with the rows that store the paths.
+"""
+import os
+import re
+import zlib
+from collections import Counter
+from typing import Optional
+
+from sqlalchemy import func, or_, select
+
+from app.utils.images import media_subdir
+
+
+_SHA256_RE = re.compile(r"^[0-9a-f]{64}$")
+# listing and tour photos share renditions, so identical content is stored once for both
+_SHARED_SUBDIRS = {"listing_photos": ("listing_photos", "tour_photos"), "tour_photos": ("listing_photos", "tour_photos")}
+
+
+def content_hash(path: str) -> Optional[str]:
+    """SHA-256 encoded in a content-addressed upload name, None for legacy uuid names."""
+    stem = os.path.splitext(os.path.basename(path or ""))[0]
+    return stem if _SHA256_RE.match(stem) else None
+
+
+def find_stored(digest: str, subdir: str) -> Optional[str]:
+    """Path of an already stored upload with this content that ``subdir`` may reuse."""
+    from app import db
+    from app.models import MediaObject
+
+    allowed = _SHARED_SUBDIRS.get(subdir, (subdir,))
+    paths = db.session.execute(
+        select(MediaObject.path).where(MediaObject.sha256 == digest, MediaObject.ref_count > 0)
+    ).scalars()
+    return next((p for p in paths if media_subdir(p) in allowed), None)
+
+
+def _insert_media(path, n: int) -> None:
+    """INSERT the row of a new upload with ``n`` references; if a concurrent request
+    inserted the same content first, add the references to its row instead."""
+    from app import db
+    from app.models import MediaObject
+
+    if db.engine.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+
+    stmt = insert(MediaObject).values(
+        path=str(path), sha256=content_hash(path), ref_count=n,
+        width=getattr(path, "width", None), height=getattr(path, "height", None),
+        placeholder=getattr(path, "placeholder", None), phash=getattr(path, "phash", None),
+        has_renditions=bool(getattr(path, "has_renditions", False)),
+    )
+    table = MediaObject.__table__
+    db.session.execute(stmt.on_conflict_do_update(index_elements=[table.c.path], set_={
+        "ref_count": table.c.ref_count + n,
+        # keep what the first writer recorded, fill in what it lacked
+        "width": func.coalesce(table.c.width, stmt.excluded.width),
+        "height": func.coalesce(table.c.height, stmt.excluded.height),
+        "placeholder": func.coalesce(table.c.placeholder, stmt.excluded.placeholder),
+        "phash": func.coalesce(table.c.phash, stmt.excluded.phash),
+        "has_renditions": or_(table.c.has_renditions, stmt.excluded.has_renditions),
+    }))
+
+
+def acquire_media(paths) -> None:
+    """Take one reference per occurrence of each upload path."""
+    from app import db
+    from app.models import MediaObject
+
+    counts = Counter(p for p in paths or () if media_subdir(p))
+    if not counts:
+        return
+    rows = {
+        m.path: m
+        for m in db.session.execute(select(MediaObject).where(MediaObject.path.in_([str(p) for p in counts]))).scalars()
+    }
+    for path, n in counts.items():
+        row = rows.get(path)
+        if row is None:
+            # two requests uploading the same content both get here: an upsert, not a plain INSERT
+            _insert_media(path, n)
+            continue
+        # evaluated in SQL, so concurrent requests don't lose increments
+        row.ref_count = MediaObject.ref_count + n
+        # StoredImage (fresh uploads) carries dimensions and placeholder
+        if getattr(path, "placeholder", None) and not row.placeholder:
+            row.width, row.height, row.placeholder = path.width, path.height, path.placeholder
+        if getattr(path, "phash", None) is not None and row.phash is None:
+            row.phash = path.phash
+        if getattr(path, "has_renditions", False):
+            row.has_renditions = True
+
+
+def release_media(paths) -> list:
+    """Drop one reference per occurrence; return the paths nobody references any more.
+
+    Uploads without a MediaObject row (stored before reference counting) are
+    treated as unshared and returned as released. Non-upload paths (static
+    assets, data: URLs) are never returned. A released path can be acquired
+    again in the same transaction (a photo removed and uploaded again), so
+    deleting the files must check the references once more (see
+    app.utils.media_deletion).
+    """
+    from app import db
+    from app.models import MediaObject
+
+    counts = Counter(p for p in paths or () if media_subdir(p))
+    if not counts:
+        return []
+    rows = {
+        m.path: m
+        for m in db.session.execute(select(MediaObject).where(MediaObject.path.in_(counts))).scalars()
+    }
+    released = [p for p in counts if p not in rows]
+    for path, row in rows.items():
+        row.ref_count = MediaObject.ref_count - counts[path]
+    if rows:
+        db.session.flush()
+        unreferenced = db.session.execute(
+            select(MediaObject).where(MediaObject.path.in_(rows), MediaObject.ref_count <= 0)
+        ).scalars().all()
+        for row in unreferenced:
+            released.append(row.path)
+            db.session.delete(row)
+    return released
+
+
+_META_CACHE = "_media_meta"
+
+
+def preload_media_meta(paths) -> None:
+    """Load dimensions, placeholders and rendition flags of ``paths`` in one query for this request's templates."""
+    from flask import g
+
+    from app import db
+    from app.models import MediaObject
+
+    cache = g.setdefault(_META_CACHE, {})
+    missing = {p for p in paths or () if p and p not in cache and media_subdir(p)}
+    if not missing:
+        return
+    cache.update(dict.fromkeys(missing))
+    rows = db.session.execute(
+        select(MediaObject.path, MediaObject.width, MediaObject.height, MediaObject.placeholder,
+               MediaObject.has_renditions)
+        .where(MediaObject.path.in_(missing))
+    )
+    for path, width, height, placeholder, renditions in rows:
+        cache[path] = {"width": width, "height": height, "placeholder": placeholder, "renditions": renditions}
+
+
+def _cached_meta(path: str) -> Optional[dict]:
+    from flask import g
+
+    if path not in g.get(_META_CACHE, {}):
+        preload_media_meta([path])
+    return g.get(_META_CACHE)[path]
+
+
+def media_meta(path: str) -> Optional[dict]:
+    """``{"width", "height", "placeholder"}`` of an upload, None if unknown (see preload_media_meta)."""
+    if not media_subdir(path):
+        return None
+    meta = _cached_meta(path)
+    return meta if meta and meta["width"] and meta["height"] else None
+
+
+def media_version(path: str) -> str:
+    """Short token of what an upload's row adds to its markup (renditions, dimensions, placeholder).
+
+    Part of the fragment cache key: ``flask media derivatives``/``placeholders``
+    change these without touching the rows that show the photo. Empty for
+    paths that are not uploads.
+    """
+    if not media_subdir(path):
+        return ""
+    meta = _cached_meta(path)
+    if not meta:
+        return "-"
+    placeholder = zlib.crc32((meta["placeholder"] or "").encode("utf-8"))
+    return f"{int(bool(meta['renditions']))}.{meta['width']}x{meta['height']}.{placeholder:08x}"
+
+
+def has_renditions(path: str) -> bool:
+    """Whether the resized renditions of an upload were stored (MediaObject.has_renditions).
+
+    False for uploads without a row and outside an app context, so callers
+    fall back to the original rather than link renditions that may not exist.
+    """
+    from flask import has_app_context
+
+    if not media_subdir(path) or not has_app_context():
+        return False
+    meta = _cached_meta(path)
+    return bool(meta and meta["renditions"])
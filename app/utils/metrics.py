@@ -0,0 +1,219 @@
+"""Prometheus metrics at ``/metrics``.
+
+Per request: a latency histogram and a status counter per endpoint, and the
+number of requests in flight. The hooks add in the order of 10 us to a
+request (benchmarks/metrics_overhead.py).
+
+The subsystems keep their own counters per process (``pool_stats()``,
+``s3_stats()``, ``media_deletion_stats()``, the fragment/page cache and view
+counter stats). They are exported at most every METRICS_SNAPSHOT_INTERVAL s
+after a request, and right before a scrape: running totals (calls, checkouts,
+hits, views flushed, ...) as counters ending in ``_total``, advanced by what
+the process added since the last snapshot, and current values (pool
+occupancy, breaker state) as gauges.
+
+Under gunicorn set PROMETHEUS_MULTIPROC_DIR to an empty directory shared by
+the workers (before the app is imported): every metric then lives in mmap'ed
+files there and a scrape served by any worker adds up all workers. Counters
+keep a dead worker's share, so they never go backwards when a worker is
+replaced; gauges are summed over live workers only (maxima take the
+largest). The gunicorn ``child_exit`` hook must call
+``mark_worker_dead(worker.pid)``.
+
+Scrapes must carry ``Authorization: Bearer <METRICS_TOKEN>``. Without a
+token configured only direct requests from the loopback interface (a
+Prometheus agent on the same host, no proxy in between) are answered.
+"""
+import hmac
+import ipaddress
+import os
+import threading
+import time
+
+from flask import Response, abort, current_app, g, request
+
+
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_METRICS = None
+_METRICS_LOCK = threading.Lock()
+_EXPORTED = {}
+# last running total exported per (counter, labels), guarded by _SNAPSHOT_LOCK
+_exported_totals = {}
+_SNAPSHOT_LOCK = threading.Lock()
+_snapshot_at = 0.0
+
+
+def _request_metrics():
+    global _METRICS
+    if _METRICS is None:
+        with _METRICS_LOCK:
+            if _METRICS is None:
+                from prometheus_client import Counter, Gauge, Histogram
+
+                _METRICS = (
+                    Histogram("http_request_duration_seconds", "Request latency by endpoint.",
+                              ("endpoint", "method"), buckets=_LATENCY_BUCKETS),
+                    Counter("http_requests_total", "Responses by endpoint and status.",
+                            ("endpoint", "method", "status")),
+                    Gauge("http_requests_in_progress", "Requests being handled.", multiprocess_mode="livesum"),
+                )
+    return _METRICS
+
+
+def _metric(kind, name: str, doc: str, labels=(), **kwargs):
+    metric = _EXPORTED.get(name)
+    if metric is None:
+        import prometheus_client
+
+        with _METRICS_LOCK:
+            metric = _EXPORTED.get(name)
+            if metric is None:
+                metric = _EXPORTED[name] = getattr(prometheus_client, kind)(name, doc, labels, **kwargs)
+    return metric
+
+
+def _set(name: str, doc: str, value, mode: str = "livesum", **labels) -> None:
+    gauge = _metric("Gauge", name, doc, tuple(labels), multiprocess_mode=mode)
+    (gauge.labels(**labels) if labels else gauge).set(value or 0)
+
+
+def _advance(name: str, doc: str, total, **labels) -> None:
+    """Move counter ``name`` (exported as ``<name>_total``) up to this process's running ``total``."""
+    counter = _metric("Counter", name, doc, tuple(labels))
+    key = (name, tuple(labels.items()))
+    total = total or 0
+    last = _exported_totals.get(key, 0)
+    if total < last:
+        # the subsystem's counter was reset: everything it holds now is new
+        last = 0
+    if total > last:
+        (counter.labels(**labels) if labels else counter).inc(total - last)
+    _exported_totals[key] = total
+
+
+def snapshot_stats(app) -> None:
+    """Export this process's subsystem counters and gauges."""
+    global _snapshot_at
+    from app import db
+    from app.utils.db_pool import pool_stats
+    from app.utils.helpers import s3_stats
+    from app.utils.media_deletion import media_deletion_stats
+    from app.utils.view_counter import view_counter_stats
+
+    # counters advance by the difference to the last snapshot: two threads must not both add it
+    with _SNAPSHOT_LOCK:
+        _snapshot_at = time.monotonic()
+        pool = pool_stats(db.engine)
+        for state in ("checked_out", "checked_in", "overflow"):
+            _set("db_pool_connections", "Pooled connections by state.", pool.get(state), state=state)
+        _set("db_pool_size", "Configured pool size.", pool.get("size"))
+        _advance("db_pool_checkouts", "Connection checkouts.", pool.get("checkouts"))
+        _advance("db_pool_checkout_timeouts", "Checkouts that gave up waiting.", pool.get("timeouts"))
+        _advance("db_pool_checkout_wait_seconds", "Time spent waiting for connections.",
+                 pool.get("checkout_wait_ms", 0) / 1000)
+        _set("db_pool_checkout_wait_seconds_max", "Longest checkout wait.",
+             pool.get("checkout_wait_ms_max", 0) / 1000, mode="livemax")
+
+        s3 = s3_stats()
+        _advance("s3_calls", "Storage calls.", s3["calls"])
+        _advance("s3_errors", "Failed storage calls.", s3["errors"])
+        _advance("s3_call_seconds", "Time spent in storage calls.", s3["latency_sum"])
+        for bound, n in s3["latency_buckets"].items():
+            _advance("s3_calls_by_latency", "Storage calls at or below each latency in seconds (cumulative).",
+                     n, le=str(bound))
+        _set("s3_breaker_open", "1 while the storage circuit breaker is open.",
+             int(s3["state"] == "open"), mode="livemax")
+        _advance("s3_breaker_trips", "Times the storage breaker opened.", s3["trips"])
+        _advance("s3_breaker_rejected", "Calls rejected by the open breaker.", s3["rejected"])
+
+        for result, n in media_deletion_stats().items():
+            _advance("media_deletions", "Deferred media deletion results.", n, result=result)
+        for event_name, n in view_counter_stats().items():
+            _advance("listing_views", "Listing view counter events.", n, event=event_name)
+
+        caches = app.extensions
+        for cache_name, key in (("fragment", "fragment_cache"), ("page", "page_cache")):
+            cache = caches.get(key)
+            if cache is not None:
+                stats = cache.stats()
+                _advance("cache_hits", "Cache hits (hit ratio: hits / (hits + misses)).", stats["hits"],
+                         cache=cache_name)
+                _advance("cache_misses", "Cache misses.", stats["misses"], cache=cache_name)
+
+
+def mark_worker_dead(pid: int) -> None:
+    """Drop a dead worker's live gauges (gunicorn child_exit hook)."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(pid)
+
+
+def _direct_local_request() -> bool:
+    # a reverse proxy on the same host connects from loopback too, but says whom it forwards
+    if request.headers.get("X-Forwarded-For") or request.headers.get("Forwarded"):
+        return False
+    try:
+        return ipaddress.ip_address(request.remote_addr or "").is_loopback
+    except ValueError:
+        return False
+
+
+def _render_metrics():
+    from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, generate_latest, multiprocess
+
+    token = current_app.config.get("METRICS_TOKEN")
+    if token:
+        if not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+            return Response("Unauthorized\n", status=401, mimetype="text/plain")
+    elif not _direct_local_request():
+        abort(404)
+    snapshot_stats(current_app)
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), headers={"Content-Type": CONTENT_TYPE_LATEST})
+
+
+def init_metrics(app) -> None:
+    """Register the request hooks and ``/metrics``; call before the other before_request hooks."""
+    if not app.config.get("METRICS_ENABLED", True):
+        return
+    try:
+        latency, responses, in_progress = _request_metrics()
+    except ImportError:
+        app.logger.warning("prometheus_client is not installed, /metrics is disabled")
+        return
+    interval = app.config.get("METRICS_SNAPSHOT_INTERVAL", 5)
+    # labelled children by (endpoint, method, status); labels() validates and locks on every call
+    children = {}
+
+    @app.before_request
+    def _start_timer():
+        g._metrics_started = g._metrics_in_flight = time.perf_counter()
+        in_progress.inc()
+
+    @app.after_request
+    def _observe(response):
+        started = g.pop("_metrics_started", None)
+        if started is not None:
+            key = (request.endpoint or "unmatched", request.method, response.status_code)
+            series = children.get(key)
+            if series is None:
+                series = children[key] = (latency.labels(*key[:2]), responses.labels(*key))
+            series[0].observe(time.perf_counter() - started)
+            series[1].inc()
+        if time.monotonic() - _snapshot_at > interval:
+            snapshot_stats(app)
+        return response
+
+    @app.teardown_request
+    def _finish(exc):
+        # also runs when a view raised and after_request was skipped
+        if g.pop("_metrics_in_flight", None) is not None:
+            in_progress.dec()
+
+    app.add_url_rule("/metrics", "metrics", _render_metrics)
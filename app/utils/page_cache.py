@@ -0,0 +1,282 @@
+"""Whole-response cache for anonymous GETs of public pages.
+
+Views opt in with ``@cached_page`` and name what the page shows with
+``page_keys("listing-5", "user-3")`` (surrogate keys). Write routes call
+``purge_pages(...)`` with the same keys after their commit, so an edited
+listing drops exactly the pages that render it; every entry also expires
+after PAGE_CACHE_TTL.
+
+A request counts as anonymous when its session holds no user and no flashed
+messages and there is no remember-me cookie; the check runs before any other
+hook, so a hit skips the user loader and the unread-count query. A response
+is only stored when rendering it left the session untouched (no CSRF token,
+no flash). ``Cache-Control: s-maxage`` and ``Surrogate-Key`` let a CDN in
+front keep the same pages; they go out with ``Vary: Cookie``, and the
+signed-in responses of the same views are marked ``private``, so a shared
+cache never hands one visitor's page to another. The in-process backend is
+per worker, use Redis to share purges.
+"""
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+from urllib.parse import urlencode
+
+from flask import current_app, g, request, session
+
+
+logger = logging.getLogger(__name__)
+
+_EXTENSION_KEY = "page_cache"
+# query parameters that never change the page
+_IGNORED_PARAMS = ("utm_", "fbclid", "gclid", "yclid")
+# kept with a stored page so hits still answer conditional requests with 304
+_VALIDATOR_HEADERS = ("ETag", "Last-Modified")
+
+
+def cached_page(view):
+    """Mark a view whose anonymous responses may be cached (see module docstring)."""
+    view._page_cache = True
+    return view
+
+
+def page_keys(*keys) -> None:
+    """Surrogate keys of the page being rendered (entities it shows)."""
+    g.setdefault("_page_keys", []).extend(str(k) for k in keys if k)
+
+
+def purge_pages(*keys) -> None:
+    """Drop every cached page tagged with one of ``keys``; call after the commit."""
+    cache = current_app.extensions.get(_EXTENSION_KEY)
+    keys = [str(k) for k in keys if k]
+    if cache is not None and keys:
+        cache.store.purge(keys)
+
+
+def clear_pages() -> None:
+    """Drop every cached page (after changes no surrogate key covers, e.g. a media backfill)."""
+    cache = current_app.extensions.get(_EXTENSION_KEY)
+    if cache is not None:
+        cache.store.clear()
+
+
+class MemoryPageStore:
+    """Per-process LRU of ``max_entries`` pages with a surrogate key -> page index."""
+
+    def __init__(self, max_entries: int, ttl: int):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self._pages = OrderedDict()
+        self._tags = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._pages.get(key)
+            if entry is None:
+                return None
+            if time.time() - entry["stored_at"] > self.ttl:
+                self._drop(key)
+                return None
+            self._pages.move_to_end(key)
+            return entry
+
+    def set(self, key: str, entry: dict) -> None:
+        with self._lock:
+            self._drop(key)
+            self._pages[key] = entry
+            for tag in entry["keys"]:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._pages) > self.max_entries:
+                self._drop(next(iter(self._pages)))
+
+    def purge(self, tags) -> None:
+        with self._lock:
+            for tag in tags:
+                for key in self._tags.pop(tag, ()):
+                    self._drop(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._pages.clear()
+            self._tags.clear()
+
+    def _drop(self, key: str) -> None:
+        entry = self._pages.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry["keys"]:
+            pages = self._tags.get(tag)
+            if pages is not None:
+                pages.discard(key)
+                if not pages:
+                    del self._tags[tag]
+
+
+class RedisPageStore:
+    """Pages shared by all workers: ``page:<key>`` hashes plus one ``sk:<tag>`` set per surrogate key."""
+
+    def __init__(self, url: str, ttl: int):
+        import redis
+
+        self._client = redis.Redis.from_url(url, socket_timeout=0.2, socket_connect_timeout=0.2)
+        self.ttl = ttl
+
+    def get(self, key: str) -> Optional[dict]:
+        try:
+            raw = self._client.hgetall("page:" + key)
+        except Exception as e:
+            logger.warning("Page cache read failed: %s", e)
+            return None
+        if not raw:
+            return None
+        meta = json.loads(raw[b"meta"])
+        return dict(meta, body=raw[b"body"])
+
+    def set(self, key: str, entry: dict) -> None:
+        meta = {name: value for name, value in entry.items() if name != "body"}
+        try:
+            pipe = self._client.pipeline(transaction=False)
+            pipe.hset("page:" + key, mapping={"body": entry["body"], "meta": json.dumps(meta)})
+            pipe.expire("page:" + key, self.ttl)
+            for tag in entry["keys"]:
+                pipe.sadd("sk:" + tag, key)
+                pipe.expire("sk:" + tag, self.ttl)
+            pipe.execute()
+        except Exception as e:
+            logger.warning("Page cache write failed: %s", e)
+
+    def purge(self, tags) -> None:
+        try:
+            for tag in tags:
+                keys = self._client.smembers("sk:" + tag)
+                self._client.delete("sk:" + tag, *(b"page:" + k for k in keys))
+        except Exception as e:
+            # entries still expire after the TTL
+            logger.warning("Page cache purge failed: %s", e)
+
+    def clear(self) -> None:
+        try:
+            for pattern in ("page:*", "sk:*"):
+                for key in self._client.scan_iter(match=pattern, count=1000):
+                    self._client.delete(key)
+        except Exception as e:
+            logger.warning("Page cache clear failed: %s", e)
+
+
+class PageCache:
+    def __init__(self, store, ttl: int, browser_max_age: int):
+        self.store = store
+        self.ttl = ttl
+        self.browser_max_age = browser_max_age
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_ratio": self.hits / total if total else 0.0}
+
+    def cache_control(self) -> str:
+        return f"public, max-age={self.browser_max_age}, s-maxage={self.ttl}"
+
+    def mark_shared(self, response, keys) -> None:
+        response.headers["Cache-Control"] = self.cache_control()
+        response.headers["Surrogate-Key"] = " ".join(keys)
+        # the page differs for signed-in visitors, who are told apart by the session cookie
+        response.vary.add("Cookie")
+
+
+def _request_key() -> str:
+    """Path plus the non-empty query parameters in a stable order."""
+    params = sorted(
+        (name, value.strip())
+        for name, value in request.args.items(multi=True)
+        if value.strip() and not name.startswith(_IGNORED_PARAMS)
+    )
+    return request.path + ("?" + urlencode(params) if params else "")
+
+
+def _is_anonymous(app) -> bool:
+    if request.cookies.get(app.config.get("REMEMBER_COOKIE_NAME", "remember_token")):
+        return False
+    return "_user_id" not in session and "_flashes" not in session
+
+
+def init_page_cache(app) -> None:
+    """Register the hooks; call before any other before_request hook is added."""
+    from flask import Response
+
+    cfg = app.config
+    if not cfg.get("PAGE_CACHE_ENABLED", True):
+        app.extensions[_EXTENSION_KEY] = None
+        return
+    ttl = cfg.get("PAGE_CACHE_TTL", 60)
+    store = None
+    if (cfg.get("PAGE_CACHE_BACKEND") or "memory").lower() == "redis":
+        try:
+            store = RedisPageStore(cfg["PAGE_CACHE_REDIS_URL"], ttl)
+        except Exception as e:
+            app.logger.warning("Redis page cache unavailable (%s), using in-process cache", e)
+    if store is None:
+        store = MemoryPageStore(cfg.get("PAGE_CACHE_SIZE", 500), ttl)
+    cache = app.extensions[_EXTENSION_KEY] = PageCache(store, ttl, cfg.get("PAGE_CACHE_BROWSER_MAX_AGE", 0))
+
+    @app.before_request
+    def _serve_cached_page():
+        if request.method != "GET" or not getattr(app.view_functions.get(request.endpoint), "_page_cache", False):
+            return None
+        if not _is_anonymous(app):
+            g._page_cache_private = True
+            return None
+        key = _request_key()
+        entry = cache.store.get(key)
+        if entry is None:
+            cache.misses += 1
+            g._page_cache_key = key
+            return None
+        cache.hits += 1
+        response = Response(entry["body"], status=200, content_type=entry["content_type"])
+        for name in _VALIDATOR_HEADERS:
+            if entry.get(name):
+                response.headers[name] = entry[name]
+        cache.mark_shared(response, entry["keys"])
+        response.headers["Age"] = str(max(0, int(time.time() - entry["stored_at"])))
+        response.headers["X-Cache"] = "HIT"
+        return response.make_conditional(request)
+
+    @app.after_request
+    def _store_page(response):
+        if g.pop("_page_cache_private", False):
+            response.cache_control.private = True
+            response.cache_control.public = False
+            response.vary.add("Cookie")
+            return response
+        key = g.pop("_page_cache_key", None)
+        if key is None:
+            return response
+        cacheable = (
+            response.status_code == 200
+            and response.mimetype == "text/html"
+            and not response.direct_passthrough
+            and "Set-Cookie" not in response.headers
+            and not session.modified
+        )
+        if not cacheable:
+            return response
+        keys = list(dict.fromkeys(g.get("_page_keys", ())))
+        cache.store.set(key, {
+            "body": response.get_data(),
+            "content_type": response.content_type,
+            "keys": keys,
+            "stored_at": time.time(),
+            **{name: response.headers.get(name) for name in _VALIDATOR_HEADERS},
+        })
+        cache.mark_shared(response, keys)
+        response.headers["X-Cache"] = "MISS"
+        return response
+
+
+def page_cache() -> Optional[PageCache]:
+    return current_app.extensions.get(_EXTENSION_KEY)
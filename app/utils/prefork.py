@@ -0,0 +1,116 @@
+"""Fork safety, so the app can be created once in a preloading master.
+
+With ``gunicorn --preload`` (gunicorn.conf.py) the master imports the app and
+calls create_app() once, then forks the workers: they share the imported
+modules, compiled templates and the rest of the heap copy-on-write instead of
+each building its own, and a worker starts in milliseconds. What must not be
+shared is per-process state, so after every fork the child:
+
+* disposes the engine pools (``close=False``: sockets opened by the parent
+  stay the parent's), so no worker talks over another process's connection;
+* drops the boto3 client and its circuit breaker, and the media thread pool
+  (threads do not survive a fork, a pool would wait on dead workers);
+* drops the buffered listing views (the parent flushes its own) and lets
+  the view flusher thread start again;
+* empties the in-process page cache and leaderboards, which only the parent
+  could keep current, and resets the per-process counters behind /metrics.
+
+The reset runs from ``os.register_at_fork``, so it covers any forking server
+(gunicorn, uWSGI, multiprocessing), not only gunicorn's post_fork hook.
+``prepare_for_fork(app)`` is for the master right before the first fork.
+"""
+import gc
+import logging
+import os
+import threading
+import weakref
+
+
+logger = logging.getLogger(__name__)
+
+_APPS = weakref.WeakSet()
+
+
+def _reset_modules() -> None:
+    from app.utils import db_pool, helpers, images, media_deletion, metrics, profiler, view_counter
+
+    helpers._S3_CLIENT = None
+    helpers._S3_BREAKER = None
+    helpers._S3_CLIENT_LOCK = threading.Lock()
+    helpers._MEDIA_POOL = None
+    helpers._MEDIA_POOL_LOCK = threading.Lock()
+    helpers._s3_latency_lock = threading.Lock()
+    helpers._s3_latency.update(count=0, sum=0.0, max=0.0, errors=0, buckets=[0] * len(helpers._s3_latency["buckets"]))
+
+    view_counter._BUFFER = None
+    view_counter._BUFFER_LOCK = threading.Lock()
+    view_counter._FLUSHER_PID = None
+
+    # per-process counters: /metrics sums them over live workers, a child must start from zero
+    for module in (db_pool, media_deletion, view_counter):
+        module._stats_lock = threading.Lock()
+        module._stats.clear()
+    db_pool._max_wait = 0.0
+    metrics._METRICS_LOCK = threading.Lock()
+    metrics._SNAPSHOT_LOCK = threading.Lock()
+    metrics._exported_totals.clear()
+    metrics._snapshot_at = 0.0
+
+    images._PILLOW_LOCK = threading.Lock()
+    profiler._busy = threading.Lock()
+
+
+def _reset_app(app) -> None:
+    from app import db
+    from app.utils.leaderboard import MemoryLeaderboard
+    from app.utils.page_cache import MemoryPageStore
+
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+    page_cache = app.extensions.get("page_cache")
+    if page_cache is not None:
+        page_cache.hits = page_cache.misses = 0
+        if isinstance(page_cache.store, MemoryPageStore):
+            page_cache.store.clear()
+    board = app.extensions.get("tour_leaderboard")
+    if isinstance(board, MemoryLeaderboard):
+        board.clear()
+
+
+def after_fork_in_child() -> None:
+    """Drop the state a forked process must not share with its parent."""
+    try:
+        _reset_modules()
+        for app in list(_APPS):
+            _reset_app(app)
+    except Exception:
+        logger.exception("Resetting per-process state after fork failed")
+
+
+def init_fork_safety(app) -> None:
+    _APPS.add(app)
+
+
+def prepare_for_fork(app) -> None:
+    """Warm what the workers will share, and close the master's connections, before forking.
+
+    Templates are compiled once here instead of in every worker, and the
+    surviving objects are moved out of the garbage collector's reach
+    (``gc.freeze``) so collections in the workers do not touch, and thereby
+    copy, the pages they share with the master.
+    """
+    from app import db
+    from app.utils.template_cache import precompile_templates
+
+    compiled, failed = precompile_templates(app)
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
+    gc.collect()
+    gc.freeze()
+    logger.info("Preloaded for fork: %d templates compiled, %d objects frozen", compiled, gc.get_freeze_count())
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=after_fork_in_child)
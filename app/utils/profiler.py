@@ -0,0 +1,286 @@
+"""Opt-in request profiling (PROFILER_ENABLED).
+
+A request is profiled when it carries ``X-Profile: <PROFILER_TOKEN>`` or,
+otherwise, with probability PROFILER_SAMPLE_RATE. PROFILER_MODE picks the
+profiler:
+
+* ``cprofile``: deterministic, every call counted (the request runs
+  noticeably slower while profiled); written as a pstats file (``.prof``)
+  for ``python -m pstats`` or snakeviz.
+* ``sampler``: a background thread records the request thread's stack every
+  PROFILER_INTERVAL_MS, cheap enough for a production sample rate; written
+  as a speedscope file (``.speedscope.json``, open it on speedscope.app).
+
+Files go to PROFILER_DIR/<endpoint>/, the newest PROFILER_KEEP per endpoint
+are kept. At most one request per process is profiled at a time, so a burst
+of sampled requests does not stack profilers. Header-triggered responses
+name their file in ``X-Profile-File``.
+
+``/_profiles`` lists the top functions by cumulative time per endpoint over
+the kept files, and serves the files for download. It requires
+``Authorization: Bearer <PROFILER_TOKEN>`` or a logged-in user whose e-mail
+is in PROFILER_ADMINS.
+"""
+import hmac
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+
+from flask import abort, current_app, g, render_template, request, send_from_directory
+from flask_login import current_user
+
+
+logger = logging.getLogger(__name__)
+
+PSTATS_SUFFIX = ".prof"
+SPEEDSCOPE_SUFFIX = ".speedscope.json"
+_SPEEDSCOPE_SCHEMA = "https://www.speedscope.app/file-format-schema.json"
+_busy = threading.Lock()
+
+
+class StackSampler:
+    """Samples one thread's Python stack from a helper thread (speedscope "sampled" profile)."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.frames = []
+        self.samples = []
+        self.weights = []
+        self._index = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _frame_id(self, code) -> int:
+        index = self._index.get(code)
+        if index is None:
+            index = self._index[code] = len(self.frames)
+            name = getattr(code, "co_qualname", code.co_name)
+            self.frames.append({"name": name, "file": code.co_filename, "line": code.co_firstlineno})
+        return index
+
+    def _run(self, target: int) -> None:
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(target)
+            now = time.perf_counter()
+            if frame is None:
+                return
+            stack = []
+            while frame is not None:
+                stack.append(self._frame_id(frame.f_code))
+                frame = frame.f_back
+            stack.reverse()
+            self.samples.append(stack)
+            self.weights.append((now - last) * 1000)
+            last = now
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, args=(threading.get_ident(),),
+                                        name="request-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def speedscope(self, name: str) -> dict:
+        return {
+            "$schema": _SPEEDSCOPE_SCHEMA,
+            "shared": {"frames": self.frames},
+            "profiles": [{
+                "type": "sampled", "name": name, "unit": "milliseconds",
+                "startValue": 0, "endValue": sum(self.weights),
+                "samples": self.samples, "weights": self.weights,
+            }],
+            "name": name,
+            "exporter": "room2room profiler",
+        }
+
+
+def _endpoint_dir(endpoint) -> str:
+    return re.sub(r"[^\w.-]", "_", endpoint or "unmatched")
+
+
+def _prune(folder: str, keep: int) -> None:
+    try:
+        names = sorted(os.listdir(folder))
+    except OSError:
+        return
+    for name in names[:-keep] if keep > 0 else ():
+        try:
+            os.remove(os.path.join(folder, name))
+        except OSError:
+            pass
+
+
+def _label(filename: str, line: int, func: str) -> str:
+    for marker in ("site-packages" + os.sep, current_app.root_path + os.sep):
+        if marker in filename:
+            filename = filename.split(marker, 1)[1]
+            break
+    return f"{func} ({filename}:{line})" if line else func
+
+
+def _top_pstats(paths, limit: int) -> tuple:
+    import pstats
+
+    stats = pstats.Stats(*paths)
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:limit]
+    return stats.total_tt * 1000, [
+        {"function": _label(*key), "calls": nc, "cumulative_ms": ct * 1000, "own_ms": tt * 1000}
+        for key, (cc, nc, tt, ct, callers) in rows
+    ]
+
+
+def _top_speedscope(paths, limit: int) -> tuple:
+    cumulative, own, total = Counter(), Counter(), 0.0
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        frames = data["shared"]["frames"]
+        for profile in data["profiles"]:
+            for stack, weight in zip(profile["samples"], profile["weights"]):
+                total += weight
+                for index in set(stack):
+                    frame = frames[index]
+                    cumulative[(frame.get("file", ""), frame.get("line", 0), frame["name"])] += weight
+                if stack:
+                    frame = frames[stack[-1]]
+                    own[(frame.get("file", ""), frame.get("line", 0), frame["name"])] += weight
+    return total, [
+        {"function": _label(*key), "calls": None, "cumulative_ms": ms, "own_ms": own[key]}
+        for key, ms in cumulative.most_common(limit)
+    ]
+
+
+def profile_summary(folder: str, limit: int = 25) -> list:
+    """Per endpoint: number of profiles, mean profiled time and the top functions by cumulative time."""
+    summary = []
+    if not os.path.isdir(folder):
+        return summary
+    for endpoint in sorted(os.listdir(folder)):
+        files = defaultdict(list)
+        for name in sorted(os.listdir(os.path.join(folder, endpoint))):
+            path = os.path.join(folder, endpoint, name)
+            files[SPEEDSCOPE_SUFFIX if name.endswith(SPEEDSCOPE_SUFFIX) else PSTATS_SUFFIX].append(path)
+        for suffix, paths in files.items():
+            try:
+                total_ms, rows = (_top_speedscope if suffix == SPEEDSCOPE_SUFFIX else _top_pstats)(paths, limit)
+            except (OSError, ValueError, KeyError, TypeError, EOFError) as e:
+                logger.warning("Unreadable profiles for %s: %s", endpoint, e)
+                continue
+            summary.append({
+                "endpoint": endpoint, "mode": "sampler" if suffix == SPEEDSCOPE_SUFFIX else "cprofile",
+                "profiles": len(paths), "mean_ms": total_ms / len(paths), "top": rows,
+                "files": [os.path.basename(p) for p in reversed(paths)],
+            })
+    return summary
+
+
+def _authorized_admin() -> bool:
+    token = current_app.config.get("PROFILER_TOKEN")
+    if token and hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        return True
+    admins = {e.strip().lower() for e in current_app.config.get("PROFILER_ADMINS", "").split(",") if e.strip()}
+    return current_user.is_authenticated and (current_user.email or "").lower() in admins
+
+
+def _profiles_view():
+    if not _authorized_admin():
+        abort(404)
+    folder = current_app.extensions["profiler_dir"]
+    return render_template("profiles/index.html", summary=profile_summary(folder),
+                           mode=current_app.config.get("PROFILER_MODE", "sampler"),
+                           rate=current_app.config.get("PROFILER_SAMPLE_RATE", 0.0))
+
+
+def _profile_file(view: str, name: str):
+    if not _authorized_admin():
+        abort(404)
+    folder = os.path.join(current_app.extensions["profiler_dir"], _endpoint_dir(view))
+    return send_from_directory(folder, name, as_attachment=True)
+
+
+def init_profiler(app) -> None:
+    """Register the profiling hooks (early, so other before_request hooks are included) and /_profiles."""
+    if not app.config.get("PROFILER_ENABLED", False):
+        return
+    folder = app.config.get("PROFILER_DIR") or os.path.join(app.instance_path, "profiles")
+    app.extensions["profiler_dir"] = folder
+    mode = app.config.get("PROFILER_MODE", "sampler")
+    if mode not in ("cprofile", "sampler"):
+        raise ValueError(f"PROFILER_MODE must be 'cprofile' or 'sampler', not {mode!r}")
+    rate = app.config.get("PROFILER_SAMPLE_RATE", 0.0)
+    token = app.config.get("PROFILER_TOKEN")
+    interval = app.config.get("PROFILER_INTERVAL_MS", 5) / 1000
+    keep = app.config.get("PROFILER_KEEP", 50)
+
+    @app.before_request
+    def _start_profile():
+        if request.endpoint in ("profiles", "profile_file"):
+            return
+        requested = bool(token) and hmac.compare_digest(request.headers.get("X-Profile", ""), token)
+        if not requested and (rate <= 0 or random.random() >= rate):
+            return
+        if not _busy.acquire(blocking=False):
+            return
+        try:
+            if mode == "sampler":
+                profiler = StackSampler(interval)
+            else:
+                import cProfile
+
+                profiler = cProfile.Profile()
+            if mode == "sampler":
+                profiler.start()
+            else:
+                profiler.enable()
+        except Exception:
+            _busy.release()
+            raise
+        suffix = SPEEDSCOPE_SUFFIX if mode == "sampler" else PSTATS_SUFFIX
+        now = time.time()
+        # names sort by start time, which _prune relies on
+        stamp = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}.{int(now % 1 * 1e6):06d}"
+        g._profile = (profiler, f"{stamp}-{os.getpid()}{suffix}")
+        g._profile_requested = requested
+
+    @app.after_request
+    def _name_profile(response):
+        if g.get("_profile_requested"):
+            response.headers["X-Profile-File"] = f"{_endpoint_dir(request.endpoint)}/{g._profile[1]}"
+        return response
+
+    @app.teardown_request
+    def _write_profile(exc):
+        started = g.pop("_profile", None)
+        if started is None:
+            return
+        profiler, name = started
+        try:
+            if mode == "sampler":
+                profiler.stop()
+            else:
+                profiler.disable()
+            endpoint_folder = os.path.join(folder, _endpoint_dir(request.endpoint))
+            os.makedirs(endpoint_folder, exist_ok=True)
+            path = os.path.join(endpoint_folder, name)
+            if mode == "sampler":
+                with open(path, "w", encoding="utf-8") as f:
+                    json.dump(profiler.speedscope(f"{request.method} {request.path}"), f)
+            else:
+                profiler.dump_stats(path)
+            _prune(endpoint_folder, keep)
+        except OSError as e:
+            logger.warning("Could not write profile for %s: %s", request.endpoint, e)
+        finally:
+            _busy.release()
+
+    app.add_url_rule("/_profiles", "profiles", _profiles_view)
+    app.add_url_rule("/_profiles/<view>/<name>", "profile_file", _profile_file)
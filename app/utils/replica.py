@@ -0,0 +1,169 @@
+"""Read-replica routing for read-only views.
+
+With DATABASE_REPLICA_URL set the replica is registered as the "replica"
+bind, and views marked with ``@replica_reads`` (search and detail pages) run
+their SELECTs there. Everything else, and any write, flush or
+``SELECT ... FOR UPDATE`` inside such a view, goes to the primary.
+
+Read-your-writes: a request that flushed changes pins its user to the
+primary for REPLICA_STICKY_SECONDS (a timestamp in the signed session), so an
+edit is never followed by a page rendered from a replica that has not
+replayed it yet. The replica is also skipped while it lags more than
+REPLICA_MAX_LAG s behind (PostgreSQL replay lag, checked at most every
+REPLICA_CHECK_INTERVAL s) or after an error on it; a view that failed on the
+replica is retried on the primary, and requests use the primary until the
+next check finds the replica healthy again.
+"""
+import functools
+import logging
+import threading
+import time
+
+from flask import current_app, g, has_request_context, request, session
+from flask_sqlalchemy.session import Session as _FlaskSession
+from sqlalchemy import event, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+
+
+logger = logging.getLogger(__name__)
+
+REPLICA_BIND = "replica"
+_STICKY_KEY = "_primary_until"
+# 0 while the replica has replayed everything it received, else seconds behind the last replayed commit
+_LAG_SQL = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+
+def replica_reads(view):
+    """Mark a read-only view whose queries may be served by the replica.
+
+    If the view fails on the replica it is run once more on the primary; when
+    that succeeds the replica is taken out of rotation until the next check.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not g.get("_use_replica"):
+            return view(*args, **kwargs)
+        try:
+            return view(*args, **kwargs)
+        except DBAPIError as e:
+            from app import db
+
+            db.session.rollback()
+            g._use_replica = False
+            response = view(*args, **kwargs)
+            replica_health().mark_down(e)
+            return response
+
+    wrapper._replica_reads = True
+    return wrapper
+
+
+class RoutingSession(_FlaskSession):
+    """``db.session`` class: reads of replica-routed requests go to the replica engine."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (
+            bind is None
+            and has_request_context()
+            and g.get("_use_replica")
+            # read-your-writes within the request too: the replica has not seen this request's flushes
+            and not g.get("_db_wrote")
+            and not self._flushing
+            and not getattr(clause, "is_dml", False)
+            and getattr(clause, "_for_update_arg", None) is None
+        ):
+            engine = self._db.engines.get(REPLICA_BIND)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+class ReplicaHealth:
+    """Cached verdict on whether the replica may serve reads."""
+
+    def __init__(self, engine, max_lag: float, interval: float):
+        self.engine = engine
+        self.max_lag = max_lag
+        self.interval = interval
+        self.lag = 0.0
+        self._healthy = True
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def mark_down(self, reason) -> None:
+        with self._lock:
+            if self._healthy:
+                logger.warning("Read replica unavailable, using the primary: %s", reason)
+            self._healthy = False
+            self._checked_at = time.monotonic()
+
+    def healthy(self) -> bool:
+        if time.monotonic() - self._checked_at < self.interval:
+            return self._healthy
+        with self._lock:
+            if time.monotonic() - self._checked_at < self.interval:
+                return self._healthy
+            self._checked_at = time.monotonic()
+        try:
+            with self.engine.connect() as conn:
+                if self.engine.dialect.name == "postgresql":
+                    lag = float(conn.execute(_LAG_SQL).scalar() or 0)
+                else:
+                    conn.execute(text("SELECT 1"))
+                    lag = 0.0
+        except Exception as e:
+            self.mark_down(e)
+            return False
+        self.lag = lag
+        healthy = lag <= self.max_lag
+        if healthy != self._healthy:
+            logger.warning("Read replica %s (lag %.1f s)", "back in use" if healthy else "lagging, using the primary", lag)
+        self._healthy = healthy
+        return healthy
+
+
+@event.listens_for(Session, "after_flush")
+def _remember_write(db_session, flush_context) -> None:
+    if has_request_context():
+        g._db_wrote = True
+
+
+def replica_health():
+    return current_app.extensions.get("replica_health")
+
+
+def init_replica_routing(app, db) -> None:
+    """Route replica_reads views once the engines exist (after db.init_app)."""
+    with app.app_context():
+        engine = db.engines.get(REPLICA_BIND)
+    if engine is None:
+        app.extensions["replica_health"] = None
+        return
+    health = app.extensions["replica_health"] = ReplicaHealth(
+        engine, app.config.get("REPLICA_MAX_LAG", 5), app.config.get("REPLICA_CHECK_INTERVAL", 5),
+    )
+    sticky = app.config.get("REPLICA_STICKY_SECONDS", 10)
+
+    @event.listens_for(engine, "handle_error")
+    def _replica_failed(context):
+        if context.is_disconnect or context.connection is None:
+            health.mark_down(context.original_exception)
+
+    @app.before_request
+    def _route_reads():
+        if request.method != "GET" or not getattr(app.view_functions.get(request.endpoint), "_replica_reads", False):
+            return
+        # only look at the session when it exists, anonymous pages stay cacheable
+        if request.cookies.get(app.config.get("SESSION_COOKIE_NAME", "session")) and session.get(_STICKY_KEY, 0) > time.time():
+            return
+        g._use_replica = health.healthy()
+
+    @app.after_request
+    def _stick_to_primary(response):
+        if g.get("_db_wrote"):
+            session[_STICKY_KEY] = time.time() + sticky
+        return response
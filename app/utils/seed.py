@@ -0,0 +1,176 @@
+"""Synthetic data at scale for load tests and benchmarks (``flask seed``).
+
+Rows are built in Python and written as Core executemany INSERTs of
+``batch_size`` rows, committing per batch, so a million messages cost a few
+hundred round trips instead of a million ORM flushes.
+
+Dates are generated relative to ``--date`` (default: today, at midnight), so
+a run is reproducible for a given ``--seed`` and ``--date`` on an empty
+database (except the salted password hash).
+
+Photos point at the bundled attraction images, so pages render real
+``<img>`` tags without any uploads. Every user has the password
+``password`` and usernames are ``seed<id>``; the first user of a run
+takes part in far more conversations than the others (a heavy inbox).
+Tours get their ``booking_count`` from the generated bookings.
+"""
+import random
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from werkzeug.security import generate_password_hash
+
+
+SCALES = {
+    "small": {"users": 200, "listings": 500, "tours": 200, "bookings": 1_000, "messages": 10_000},
+    "medium": {"users": 2_000, "listings": 5_000, "tours": 2_000, "bookings": 10_000, "messages": 100_000},
+    "large": {"users": 20_000, "listings": 50_000, "tours": 20_000, "bookings": 100_000, "messages": 1_000_000},
+}
+
+CITIES = (
+    "Москва", "Санкт-Петербург", "Казань", "Сочи", "Калининград", "Екатеринбург", "Новосибирск",
+    "Иркутск", "Мурманск", "Волгоград", "Севастополь", "Нижний Новгород", "Ярославль", "Владивосток",
+)
+HOUSING_TYPES = ("apartment", "house", "room", "studio")
+AMENITIES = ("Wi-Fi", "Стиральная машина", "Кондиционер", "Парковка", "Балкон", "Посудомоечная машина", "Лифт")
+FIRST_NAMES = ("Анна", "Иван", "Мария", "Дмитрий", "Елена", "Алексей", "Ольга", "Сергей", "Наталья", "Павел")
+LAST_NAMES = ("Иванов", "Смирнов", "Кузнецов", "Попов", "Соколов", "Лебедев", "Козлов", "Новиков", "Морозов")
+PHRASES = (
+    "Здравствуйте! Квартира свободна на эти даты?", "Да, свободна, приезжайте.",
+    "Подскажите, есть ли парковка рядом?", "Спасибо, всё понравилось!",
+    "Во сколько удобно встретиться?", "Можно ли с собакой?", "Отправил вам адрес.",
+    "Экскурсия начнётся у главного входа.", "Договорились, до встречи.",
+)
+BOOKING_STATUSES = ("pending", "pending", "confirmed", "confirmed", "confirmed", "cancelled")
+
+
+def _photos(rng: random.Random) -> list:
+    from app.routes.main import ATTRACTIONS
+
+    return [a["filename"] for a in rng.sample(ATTRACTIONS, rng.randint(1, 4))]
+
+
+def _insert(table, rows, batch_size: int, progress=None) -> None:
+    from app import db
+
+    for start in range(0, len(rows), batch_size):
+        db.session.execute(table.insert(), rows[start:start + batch_size])
+        db.session.commit()
+        if progress:
+            progress(table.name, min(start + batch_size, len(rows)), len(rows))
+
+
+def _new_ids(model, after: int) -> list:
+    from app import db
+
+    return db.session.execute(db.select(model.id).where(model.id > after).order_by(model.id)).scalars().all()
+
+
+def seed(counts: dict, rng_seed: int = 1, batch_size: int = 5_000, progress=None,
+         today: Optional[date] = None) -> dict:
+    """Insert ``counts`` users, listings, tours, bookings and messages dated around ``today``;
+    returns the counts written."""
+    from app import db
+    from app.models import Booking, HousingExchange, Message, RemoteTourism, User
+
+    rng = random.Random(rng_seed)
+    today = today or date.today()
+    now = datetime.combine(today, datetime.min.time())
+    max_id = lambda model: db.session.execute(db.select(db.func.max(model.id))).scalar() or 0  # noqa: E731
+
+    # users; hashing once keeps a 20k-user seed fast
+    password_hash = generate_password_hash("password")
+    first_user = max_id(User)
+    users = []
+    for i in range(counts["users"]):
+        joined = now - timedelta(days=rng.randint(0, 3 * 365), seconds=rng.randint(0, 86_400))
+        users.append({
+            "username": f"seed{first_user + i + 1}", "email": f"seed{first_user + i + 1}@example.com",
+            "password_hash": password_hash,
+            "first_name": rng.choice(FIRST_NAMES), "last_name": rng.choice(LAST_NAMES),
+            "city": rng.choice(CITIES), "description": None,
+            "registration_date": joined, "updated_at": joined,
+            "is_verified": rng.random() < 0.3, "is_active": True,
+            "rating": round(rng.uniform(3.5, 5.0), 1) if rng.random() < 0.6 else 0.0, "review_count": 0,
+        })
+    _insert(User.__table__, users, batch_size, progress)
+    user_ids = _new_ids(User, first_user)
+
+    first_listing = max_id(HousingExchange)
+    listings = []
+    for i in range(counts["listings"]):
+        created = now - timedelta(days=rng.randint(0, 365), seconds=rng.randint(0, 86_400))
+        city = rng.choice(CITIES)
+        start = today + timedelta(days=rng.randint(-30, 180))
+        listings.append({
+            "owner_id": rng.choice(user_ids), "title": f"{rng.choice(('Уютная', 'Светлая', 'Просторная'))} "
+            f"{rng.choice(('квартира', 'студия', 'комната'))} в городе {city}",
+            "description": " ".join(rng.sample(PHRASES, 3)) * 2, "city": city,
+            "address": f"ул. Тестовая, {rng.randint(1, 200)}", "housing_type": rng.choice(HOUSING_TYPES),
+            "room_count": rng.randint(1, 5), "amenities": rng.sample(AMENITIES, rng.randint(0, 5)),
+            "photos": _photos(rng), "available_from": start, "available_to": start + timedelta(days=rng.randint(7, 90)),
+            "is_active": rng.random() < 0.95, "created_date": created, "updated_at": created,
+            "views_count": rng.randint(0, 500),
+        })
+    _insert(HousingExchange.__table__, listings, batch_size, progress)
+
+    # bookings are drawn first so every tour is inserted with its booking_count
+    tour_bookings = [[] for _ in range(counts["tours"])]
+    for _ in range(counts["bookings"] if counts["tours"] else 0):
+        tour_bookings[rng.randrange(counts["tours"])].append(rng.choice(BOOKING_STATUSES))
+    first_tour = max_id(RemoteTourism)
+    tours = []
+    for i in range(counts["tours"]):
+        created = now - timedelta(days=rng.randint(0, 365), seconds=rng.randint(0, 86_400))
+        city = rng.choice(CITIES)
+        tours.append({
+            "guide_id": rng.choice(user_ids), "city": city, "title": f"Онлайн-прогулка: {city} №{i + 1}",
+            "description": " ".join(rng.sample(PHRASES, 3)), "price_per_hour": rng.choice((500, 800, 1000, 1500, 2000)),
+            "duration_hours": rng.randint(1, 4), "photos": _photos(rng),
+            "available_from": None, "available_to": None, "is_active": True,
+            "created_date": created, "updated_at": created,
+            "booking_count": sum(status != "cancelled" for status in tour_bookings[i]),
+        })
+    _insert(RemoteTourism.__table__, tours, batch_size, progress)
+    tour_ids = _new_ids(RemoteTourism, first_tour)
+
+    bookings = []
+    for tour_id, statuses, tour in zip(tour_ids, tour_bookings, tours):
+        day = today - timedelta(days=60)
+        for status in statuses:
+            day += timedelta(days=rng.randint(1, 5))
+            hours = rng.randint(1, 4)
+            bookings.append({
+                "user_id": rng.choice(user_ids), "exchange_id": None, "tourism_id": tour_id,
+                "start_date": day, "end_date": day, "hours": hours, "status": status,
+                "total_price": hours * tour["price_per_hour"], "created_date": now - timedelta(days=rng.randint(0, 90)),
+            })
+    _insert(Booking.__table__, bookings, batch_size, progress)
+
+    # message history: conversations of 2-40 messages, the first user takes part in many
+    messages, remaining = [], counts["messages"]
+    listing_ids = _new_ids(HousingExchange, first_listing) or [None]
+    while remaining > 0:
+        a = user_ids[0] if rng.random() < 0.05 else rng.choice(user_ids)
+        b = rng.choice(user_ids)
+        if a == b:
+            continue
+        length = min(remaining, rng.randint(2, 40))
+        moment = now - timedelta(days=rng.randint(0, 365))
+        exchange_id = rng.choice(listing_ids) if rng.random() < 0.5 else None
+        for k in range(length):
+            moment += timedelta(minutes=rng.randint(1, 600))
+            sender, receiver = (a, b) if k % 2 == 0 else (b, a)
+            messages.append({
+                "sender_id": sender, "receiver_id": receiver, "exchange_id": exchange_id, "tourism_id": None,
+                "content": rng.choice(PHRASES), "timestamp": moment, "is_read": moment < now - timedelta(days=1),
+            })
+        remaining -= length
+        if len(messages) >= batch_size or remaining <= 0:
+            _insert(Message.__table__, messages, batch_size)
+            if progress:
+                progress(Message.__table__.name, counts["messages"] - remaining, counts["messages"])
+            messages = []
+
+    return {"users": len(users), "listings": len(listings), "tours": len(tours),
+            "bookings": len(bookings), "messages": counts["messages"]}
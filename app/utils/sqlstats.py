@@ -0,0 +1,190 @@
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from flask import current_app, g, has_app_context, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+logger = logging.getLogger(__name__)
+
+_START_KEY = "sqlstats_started"
+# IN lists expand to one placeholder per value; literals vary per call
+_PLACEHOLDER_LIST_RE = re.compile(r"\((?:\s*(?:\?|%\(\w+\)s|%s|:\w+)\s*,)+\s*(?:\?|%\(\w+\)s|%s|:\w+)\s*\)")
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+_SPACE_RE = re.compile(r"\s+")
+
+
+class QueryCounter:
+    """Collects SQL statements emitted on an engine while attached."""
+
+    def __init__(self) -> None:
+        self.statements: list[str] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        self.statements.append(statement)
+
+
+@contextmanager
+def count_queries(engine=None) -> Iterator[QueryCounter]:
+    """Count statements executed on ``engine`` (defaults to the app engine) inside the block."""
+    if engine is None:
+        from app import db
+
+        engine = db.engine
+    counter = QueryCounter()
+    event.listen(engine, "before_cursor_execute", counter._on_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, "before_cursor_execute", counter._on_execute)
+
+
+@contextmanager
+def assert_num_queries(expected: int, engine=None, label: Optional[str] = None) -> Iterator[QueryCounter]:
+    """Fail if the block does not emit exactly ``expected`` statements.
+
+    Meant for pinning the query budget of a route, so that a lazy load sneaking
+    into a template (N+1) shows up as a hard failure instead of a slow page.
+    """
+    with count_queries(engine) as counter:
+        yield counter
+    if counter.count != expected:
+        listing = "\n".join(f"  {i + 1}. {s}" for i, s in enumerate(counter.statements))
+        raise AssertionError(
+            f"{label or 'block'} emitted {counter.count} SQL statements, expected {expected}:\n{listing}"
+        )
+
+
+class RequestSQLStats:
+    """Statements of one request: count, total time, the slowest one and repeated shapes."""
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total_ms = 0.0
+        self.slowest_ms = 0.0
+        self.slowest = ""
+        self.shapes: Counter = Counter()
+        self.reported_shapes: set = set()
+
+    def add(self, statement: str, elapsed_ms: float) -> int:
+        """Record one statement; returns how often its shape ran in this request."""
+        self.count += 1
+        self.total_ms += elapsed_ms
+        if elapsed_ms > self.slowest_ms:
+            self.slowest_ms, self.slowest = elapsed_ms, statement
+        shape = statement_shape(statement)
+        self.shapes[shape] += 1
+        return self.shapes[shape]
+
+    def server_timing(self) -> str:
+        return f'db;dur={self.total_ms:.1f};desc="{self.count} queries", db-slowest;dur={self.slowest_ms:.1f}'
+
+
+def statement_shape(statement: str) -> str:
+    """``statement`` with IN lists, literals and whitespace normalised, to spot repeats."""
+    shape = _PLACEHOLDER_LIST_RE.sub("(?)", statement)
+    shape = _LITERAL_RE.sub("?", shape)
+    return _SPACE_RE.sub(" ", shape).strip()
+
+
+def redact_parameters(parameters, executemany: bool = False):
+    """Parameter types only: values may hold emails, password hashes or message text."""
+    if executemany:
+        return f"<{len(parameters)} rows>"
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [type(value).__name__ for value in parameters]
+    return type(parameters).__name__
+
+
+def request_sql_stats() -> Optional[RequestSQLStats]:
+    """Statements recorded so far for the current request (None outside one or when disabled)."""
+    return g.get("_sql_stats") if has_request_context() else None
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    conn.info.setdefault(_START_KEY, []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    started = conn.info.get(_START_KEY)
+    if not started:
+        return
+    elapsed_ms = (time.perf_counter() - started.pop()) * 1000
+    config = current_app.config if has_app_context() else {}
+
+    if elapsed_ms >= config.get("SQL_SLOW_MS", 200):
+        logger.warning(
+            "slow_sql duration_ms=%.1f endpoint=%s statement=%r parameters=%s",
+            elapsed_ms, request.endpoint if has_request_context() else "-",
+            _SPACE_RE.sub(" ", statement), redact_parameters(parameters, executemany),
+        )
+
+    stats = request_sql_stats()
+    if stats is None:
+        return
+    repeats = stats.add(statement, elapsed_ms)
+    threshold = config.get("SQL_N_PLUS_ONE_THRESHOLD", 5)
+    if not executemany and repeats >= threshold:
+        shape = statement_shape(statement)
+        if shape not in stats.reported_shapes:
+            stats.reported_shapes.add(shape)
+            logger.warning(
+                "n_plus_one endpoint=%s repeats>=%d statement=%r",
+                request.endpoint, threshold, shape,
+            )
+
+
+def _handle_error(context) -> None:
+    # the statement failed: drop its start time so timings stay paired
+    started = context.connection.info.get(_START_KEY) if context.connection is not None else None
+    if started:
+        started.pop()
+
+
+def init_sql_instrumentation(app) -> None:
+    """Per-request SQL stats on every engine, as a DEBUG log line and (SQL_SERVER_TIMING or debug) a Server-Timing header."""
+    if not app.config.get("SQL_INSTRUMENTATION", True):
+        return
+    # records propagate to the app logger, which Flask gives a stderr handler
+    app.logger  # noqa: B018
+    logger.setLevel(app.config.get("SQL_LOG_LEVEL", "INFO"))
+    # engine class listeners cover the primary, the replica and engines created later
+    for name, listener in (
+        ("before_cursor_execute", _before_cursor_execute),
+        ("after_cursor_execute", _after_cursor_execute),
+        ("handle_error", _handle_error),
+    ):
+        if not event.contains(Engine, name, listener):
+            event.listen(Engine, name, listener)
+
+    @app.before_request
+    def _start_sql_stats():
+        if request.endpoint != "static":
+            g._sql_stats = RequestSQLStats()
+
+    @app.after_request
+    def _report_sql_stats(response):
+        stats = g.get("_sql_stats")
+        if stats is None:
+            return response
+        # query counts and timings tell outsiders about the schema and load: opt-in outside debug
+        if app.config.get("SQL_SERVER_TIMING", False) or app.debug:
+            timing = response.headers.get("Server-Timing")
+            response.headers["Server-Timing"] = f"{timing}, {stats.server_timing()}" if timing else stats.server_timing()
+        logger.debug(
+            "sql_stats method=%s endpoint=%s status=%s queries=%d db_ms=%.1f slowest_ms=%.1f",
+            request.method, request.endpoint, response.status_code, stats.count, stats.total_ms, stats.slowest_ms,
+            extra={"sql_queries": stats.count, "sql_ms": round(stats.total_ms, 1), "sql_slowest": stats.slowest},
+        )
+        return response
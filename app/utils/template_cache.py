@@ -0,0 +1,60 @@
+"""Persistent Jinja bytecode cache.
+
+Compiling a template to Python code is the bulk of a cold worker's first
+render of each page. With JINJA_BYTECODE_CACHE on, compiled templates are
+kept as marshalled code in JINJA_BYTECODE_CACHE_DIR (default
+instance/jinja_cache), so later processes load them instead of recompiling.
+Entries are keyed by template name and source checksum, so an edited
+template is simply compiled again. ``flask templates compile`` fills the
+cache ahead of time (in a build step, before the first request).
+
+An unwritable directory (read-only serverless filesystems) only costs the
+cache: rendering goes on and a warning is logged once.
+"""
+import logging
+import os
+
+from jinja2 import FileSystemBytecodeCache, TemplateSyntaxError
+
+
+logger = logging.getLogger(__name__)
+
+
+class SafeBytecodeCache(FileSystemBytecodeCache):
+    """FileSystemBytecodeCache that treats a failed write as a cache miss."""
+
+    _warned = False
+
+    def dump_bytecode(self, bucket) -> None:
+        try:
+            super().dump_bytecode(bucket)
+        except OSError as e:
+            if not self._warned:
+                SafeBytecodeCache._warned = True
+                logger.warning("Jinja bytecode cache is not writable, templates compile in memory: %s", e)
+
+
+def init_template_cache(app) -> None:
+    if not app.config.get("JINJA_BYTECODE_CACHE", True):
+        return
+    folder = app.config.get("JINJA_BYTECODE_CACHE_DIR") or os.path.join(app.instance_path, "jinja_cache")
+    try:
+        os.makedirs(folder, exist_ok=True)
+    except OSError as e:
+        logger.warning("Jinja bytecode cache disabled, cannot create %s: %s", folder, e)
+        return
+    app.jinja_env.bytecode_cache = SafeBytecodeCache(folder)
+
+
+def precompile_templates(app) -> tuple:
+    """Load every template, writing its bytecode; returns (compiled, failed template names)."""
+    compiled, failed = 0, []
+    for name in app.jinja_env.list_templates(extensions=("html", "txt", "xml")):
+        try:
+            app.jinja_env.get_template(name)
+        except TemplateSyntaxError as e:
+            logger.error("Template %s does not compile: %s", name, e)
+            failed.append(name)
+        else:
+            compiled += 1
+    return compiled, failed
@@ -0,0 +1,323 @@
+"""Buffered listing view counts with unique-visitor estimates.
+
+``listing_detail`` hits are counted by a before_request hook (registered
+ahead of the page cache, so cached pages and 304s count too) into a
+per-process buffer. A background thread flushes it every VIEW_FLUSH_INTERVAL
+seconds: one ``UPDATE ... FROM (VALUES ...)`` adds all pending counts to
+``housing_exchange.views_count`` instead of a hot-row write per page view.
+
+Distinct visitors (the signed-in user, otherwise a hash of address and user
+agent, so anonymous pages stay cookie-free and cacheable) go into a
+HyperLogLog per listing: 1 KiB of registers, about 3 % error, no row per
+view. The in-process backend merges the sketches into
+``housing_exchange.views_hll`` on flush; with the Redis backend counts are
+buffered in a shared hash and sketches live in Redis (PFADD/PFCOUNT).
+"""
+import atexit
+import hashlib
+import logging
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter
+from typing import Optional
+
+from flask import current_app, request, session
+from sqlalchemy import Integer, bindparam, column, select, update, values
+
+
+logger = logging.getLogger(__name__)
+
+_BOT_RE = re.compile(r"bot|crawl|spider|slurp|preview", re.IGNORECASE)
+_REDIS_PENDING = "views:pending"
+_REDIS_HLL = "views:hll:"
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+class HyperLogLog:
+    """HyperLogLog with 2**10 one-byte registers (standard error ~3.2 %)."""
+
+    P = 10
+    M = 1 << P
+
+    def __init__(self, registers: Optional[bytes] = None):
+        self.registers = bytearray(registers) if registers and len(registers) == self.M else bytearray(self.M)
+
+    def add(self, value: str) -> None:
+        h = int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+        index = h >> (64 - self.P)
+        rest = h & ((1 << (64 - self.P)) - 1)
+        rank = (64 - self.P) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog") -> None:
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self) -> int:
+        m = self.M
+        estimate = 0.7213 / (1 + 1.079 / m) * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # small range: linear counting is more accurate
+            estimate = m * math.log(m / zeros)
+        return round(estimate)
+
+    def to_bytes(self) -> bytes:
+        return bytes(self.registers)
+
+
+class MemoryViewBuffer:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = Counter()
+        self._sketches = {}
+
+    def record(self, listing_id: int, visitor: str) -> None:
+        with self._lock:
+            self._counts[listing_id] += 1
+            self._sketches.setdefault(listing_id, HyperLogLog()).add(visitor)
+
+    def drain(self):
+        with self._lock:
+            counts, sketches = self._counts, self._sketches
+            self._counts, self._sketches = Counter(), {}
+        return counts, sketches
+
+    def restore(self, counts, sketches) -> None:
+        """Put back what a failed flush drained."""
+        with self._lock:
+            self._counts.update(counts)
+            for listing_id, sketch in sketches.items():
+                self._sketches.setdefault(listing_id, HyperLogLog()).merge(sketch)
+
+    def pending(self, listing_id: int):
+        with self._lock:
+            sketch = self._sketches.get(listing_id)
+            return self._counts.get(listing_id, 0), HyperLogLog(sketch.to_bytes()) if sketch else None
+
+
+class RedisViewBuffer:
+    def __init__(self, url: str):
+        import redis
+
+        self._client = redis.Redis.from_url(url, socket_timeout=0.2, socket_connect_timeout=0.2)
+        # drained hashes this process renamed but could not read yet
+        self._unread = []
+
+    def record(self, listing_id: int, visitor: str) -> None:
+        try:
+            pipe = self._client.pipeline(transaction=False)
+            pipe.hincrby(_REDIS_PENDING, listing_id, 1)
+            pipe.pfadd(f"{_REDIS_HLL}{listing_id}", visitor)
+            pipe.execute()
+        except Exception as e:
+            # a lost view is not worth failing the page for
+            logger.warning("View counter write failed: %s", e)
+
+    def drain(self):
+        # RENAME is atomic: each pending increment is flushed by exactly one worker
+        key = f"{_REDIS_PENDING}:{os.getpid()}:{time.monotonic_ns()}"
+        try:
+            self._client.rename(_REDIS_PENDING, key)
+            self._unread.append(key)
+        except Exception:
+            # no pending views (RENAME of a missing key) or Redis unreachable
+            pass
+        counts = Counter()
+        for key in list(self._unread):
+            try:
+                drained = self._client.hgetall(key)
+                self._client.delete(key)
+            except Exception as e:
+                # the renamed hash stays in Redis and this worker tries it again on the next flush
+                logger.warning("View counter read failed, kept in %s: %s", key, e)
+                continue
+            self._unread.remove(key)
+            counts.update({int(k): int(v) for k, v in drained.items()})
+        return counts, {}
+
+    def restore(self, counts, sketches) -> None:
+        pipe = self._client.pipeline(transaction=False)
+        for listing_id, n in counts.items():
+            pipe.hincrby(_REDIS_PENDING, listing_id, n)
+        pipe.execute()
+
+    def pending(self, listing_id: int):
+        try:
+            return int(self._client.hget(_REDIS_PENDING, listing_id) or 0), None
+        except Exception:
+            return 0, None
+
+    def unique(self, listing_id: int) -> Optional[int]:
+        try:
+            return self._client.pfcount(f"{_REDIS_HLL}{listing_id}")
+        except Exception:
+            return None
+
+
+_BUFFER = None
+_BUFFER_LOCK = threading.Lock()
+_FLUSHER_PID = None
+
+
+def _get_buffer():
+    global _BUFFER
+    if _BUFFER is None:
+        with _BUFFER_LOCK:
+            if _BUFFER is None:
+                cfg = current_app.config
+                if (cfg.get("VIEW_COUNTER_BACKEND") or "memory").lower() == "redis":
+                    try:
+                        _BUFFER = RedisViewBuffer(cfg["VIEW_COUNTER_REDIS_URL"])
+                    except Exception as e:
+                        current_app.logger.warning("Redis view counter unavailable (%s), counting in-process", e)
+                if _BUFFER is None:
+                    _BUFFER = MemoryViewBuffer()
+    return _BUFFER
+
+
+def _ensure_flusher(app) -> None:
+    """Start this process's flush thread (again after a fork, threads do not survive it)."""
+    global _FLUSHER_PID
+    if _FLUSHER_PID == os.getpid():
+        return
+    with _BUFFER_LOCK:
+        if _FLUSHER_PID == os.getpid():
+            return
+        _FLUSHER_PID = os.getpid()
+        interval = app.config.get("VIEW_FLUSH_INTERVAL", 5)
+        threading.Thread(target=_flush_loop, args=(app, interval), name="view-flush", daemon=True).start()
+        atexit.register(flush_views, app)
+
+
+def _flush_loop(app, interval: float) -> None:
+    while True:
+        time.sleep(interval)
+        try:
+            flush_views(app)
+        except Exception:
+            # the thread must outlive a Redis or database outage
+            logger.exception("View count flush failed")
+
+
+def view_counter_stats() -> dict:
+    """Totals since process start: recorded, flushes, flushed, failed."""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def record_view(listing_id: int) -> None:
+    if _BOT_RE.search(request.user_agent.string or ""):
+        return
+    user_id = session.get("_user_id")
+    if user_id:
+        visitor = f"u{user_id}"
+    else:
+        visitor = "a" + hashlib.sha1(f"{request.remote_addr}|{request.user_agent.string}".encode("utf-8")).hexdigest()
+    _get_buffer().record(listing_id, visitor)
+    _ensure_flusher(current_app._get_current_object())
+    with _stats_lock:
+        _stats["recorded"] += 1
+
+
+def _add_counts(counts) -> None:
+    from app import db
+    from app.models import HousingExchange
+
+    table = HousingExchange.__table__
+    if db.engine.dialect.name == "postgresql":
+        pending = values(column("id", Integer), column("n", Integer), name="pending").data(list(counts.items()))
+        stmt = update(table).where(table.c.id == pending.c.id).values(views_count=table.c.views_count + pending.c.n)
+        params = None
+    else:
+        # SQLite cannot name the columns of a VALUES list; one executemany instead
+        stmt = update(table).where(table.c.id == bindparam("b_id")).values(
+            views_count=table.c.views_count + bindparam("b_n")
+        )
+        params = [{"b_id": listing_id, "b_n": n} for listing_id, n in counts.items()]
+    # counting a view is not an edit: keep updated_at (ETags, cached cards) as is
+    stmt = stmt.values(updated_at=table.c.updated_at)
+    db.session.execute(stmt, params)
+
+
+def _merge_sketches(sketches) -> None:
+    from app import db
+    from app.models import HousingExchange
+
+    table = HousingExchange.__table__
+    rows = db.session.execute(
+        select(table.c.id, table.c.views_hll).where(table.c.id.in_(sketches)).with_for_update()
+    ).all()
+    params = []
+    for listing_id, stored in rows:
+        sketch = HyperLogLog(stored)
+        sketch.merge(sketches[listing_id])
+        params.append({"b_id": listing_id, "b_hll": sketch.to_bytes()})
+    if params:
+        db.session.execute(
+            update(table).where(table.c.id == bindparam("b_id")).values(
+                views_hll=bindparam("b_hll"), updated_at=table.c.updated_at
+            ),
+            params,
+        )
+
+
+def flush_views(app=None) -> int:
+    """Write the buffered counts (and sketches) to the database; returns the views flushed."""
+    app = app or current_app._get_current_object()
+    if _BUFFER is None:
+        return 0
+    counts, sketches = _BUFFER.drain()
+    if not counts and not sketches:
+        return 0
+    with app.app_context():
+        from app import db
+
+        try:
+            if counts:
+                _add_counts(counts)
+            if sketches:
+                _merge_sketches(sketches)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            _BUFFER.restore(counts, sketches)
+            app.logger.warning("View count flush failed, kept for the next one: %s", e)
+            with _stats_lock:
+                _stats["failed"] += 1
+            return 0
+    total = sum(counts.values())
+    with _stats_lock:
+        _stats["flushes"] += 1
+        _stats["flushed"] += total
+    return total
+
+
+def listing_views(listing) -> dict:
+    """``{"total", "unique"}`` views of a listing, including the not yet flushed ones."""
+    buffer = _get_buffer()
+    pending, sketch = buffer.pending(listing.id)
+    if isinstance(buffer, RedisViewBuffer):
+        unique = buffer.unique(listing.id)
+    else:
+        stored = HyperLogLog(listing.views_hll)
+        if sketch is not None:
+            stored.merge(sketch)
+        unique = stored.count()
+    return {"total": (listing.views_count or 0) + pending, "unique": unique}
+
+
+def init_view_counter(app) -> None:
+    """Count listing_detail hits; call before init_page_cache so cached hits count too."""
+    if (app.config.get("VIEW_COUNTER_BACKEND") or "memory").lower() == "none":
+        return
+
+    @app.before_request
+    def _count_listing_view():
+        if request.method == "GET" and request.endpoint == "exchange.listing_detail":
+            record_view(request.view_args["listing_id"])
@@ -0,0 +1,87 @@
+"""Render time of the listing search page with and without the card fragment cache.
+
+    python benchmarks/card_render.py [--cards 50 --rounds 200]
+
+Renders exchange/search.html for ``--cards`` listings (each with uploaded
+photos, so the picture macro builds srcsets and placeholders) with the cache
+disabled, then with a warm in-process cache, and reports the mean per render.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from flask import render_template  # noqa: E402
+
+from app import create_app, db  # noqa: E402
+from app.forms.exchange import FilterForm  # noqa: E402
+from app.models import HousingExchange, MediaObject, User  # noqa: E402
+from app.utils.fragment_cache import fragment_cache, init_fragment_cache  # noqa: E402
+from app.utils.media_refs import preload_media_meta  # noqa: E402
+
+
+def _seed(cards: int) -> None:
+    owner = User(username="bench", email="bench@example.com")
+    owner.set_password("x")
+    db.session.add(owner)
+    db.session.flush()
+    for i in range(cards):
+        photos = [f"listing_photos/{i:064x}.jpg", f"listing_photos/{i + 10 ** 6:064x}.jpg"]
+        db.session.add_all(
+            MediaObject(path=p, ref_count=1, width=1200, height=800, placeholder="data:image/webp;base64," + "A" * 80)
+            for p in photos
+        )
+        db.session.add(HousingExchange(
+            owner_id=owner.id, title=f"Квартира {i}", city="Москва", address=f"ул. Тестовая, {i}",
+            housing_type="apartment", room_count=2, description="Светлая квартира у метро. " * 8,
+            photos=photos, amenities=["wifi"],
+        ))
+    db.session.commit()
+
+
+def _time(app, listings, rounds: int) -> float:
+    samples = []
+    for _ in range(rounds):
+        with app.test_request_context("/exchange/"):
+            started = time.perf_counter()
+            preload_media_meta(item.photos[0] for item in listings)
+            render_template("exchange/search.html", form=FilterForm(), listings=listings)
+            samples.append(time.perf_counter() - started)
+    return statistics.mean(samples) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cards", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    app = create_app()
+    app.config["WTF_CSRF_ENABLED"] = False
+    with app.app_context():
+        db.create_all()
+        _seed(args.cards)
+        listings = db.session.execute(db.select(HousingExchange)).scalars().all()
+
+        # re-initialising swaps the cached_card global for the configured backend
+        app.config["FRAGMENT_CACHE_BACKEND"] = "none"
+        init_fragment_cache(app)
+        uncached = _time(app, listings, args.rounds)
+
+        app.config["FRAGMENT_CACHE_BACKEND"] = "memory"
+        init_fragment_cache(app)
+        _time(app, listings, 1)  # warm up
+        cached = _time(app, listings, args.rounds)
+        stats = fragment_cache().stats()
+
+    print(f"{args.cards} cards, mean of {args.rounds} renders")
+    print(f"uncached {uncached:7.2f} ms")
+    print(f"cached   {cached:7.2f} ms  ({uncached / cached:.1f}x, hit ratio {stats['hit_ratio']:.2f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Time of ``flask media duplicates`` clustering over a synthetic catalogue.
+
+    python benchmarks/duplicates.py [--listings 20000 --photos 5 --copies 0.05]
+
+Every listing gets random 64-bit photo hashes; a ``--copies`` share of them
+reuse the photos of an earlier listing with a few bits flipped (a re-encoded
+copy). Reports the clustering time and how many planted copies were found.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from app import create_app, db  # noqa: E402
+from app.models import HousingExchange, MediaObject, User  # noqa: E402
+from app.utils.duplicates import cluster_listings  # noqa: E402
+
+
+def _signed(value: int) -> int:
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--listings", type=int, default=20000)
+    parser.add_argument("--photos", type=int, default=5, help="photos per listing")
+    parser.add_argument("--copies", type=float, default=0.05, help="share of listings copied from another")
+    parser.add_argument("--distance", type=int, default=6)
+    args = parser.parse_args()
+
+    rnd = random.Random(0)
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        owner = User(username="bench", email="bench@example.com")
+        owner.set_password("x")
+        db.session.add(owner)
+        db.session.commit()
+
+        media, listings, planted = [], [], 0
+        hashes = []
+        for i in range(args.listings):
+            if i and rnd.random() < args.copies:
+                source = hashes[rnd.randrange(i)]
+                own = [h ^ (1 << rnd.randrange(64)) ^ (1 << rnd.randrange(64)) for h in source]
+                planted += 1
+            else:
+                own = [rnd.getrandbits(64) for _ in range(args.photos)]
+            hashes.append(own)
+            paths = [f"listing_photos/{i:07d}-{n}.jpg" for n in range(len(own))]
+            media += [{"path": p, "ref_count": 1, "phash": _signed(h)} for p, h in zip(paths, own)]
+            listings.append({"owner_id": owner.id, "title": f"L{i}", "photos": paths, "amenities": []})
+        db.session.execute(db.insert(MediaObject), media)
+        db.session.execute(db.insert(HousingExchange), listings)
+        db.session.commit()
+
+        started = time.perf_counter()
+        clusters = cluster_listings(args.distance, min_photos=2)
+        elapsed = time.perf_counter() - started
+        linked = sum(len(ids) - 1 for ids in clusters)
+        print(
+            f"{args.listings} listings x {args.photos} photos: {elapsed:.2f} s, "
+            f"{len(clusters)} groups, {linked} copies found of {planted} planted"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""Latency of the hot routes at several data sizes, saved as JSON for comparison.
+
+    python benchmarks/e2e.py [--scales small medium] [--requests 50] [--baseline old.json]
+
+For each scale a fresh SQLite database under a temp directory is filled by
+``app.utils.seed`` (the same data as ``flask seed --scale ...``), and the
+app is driven through the test client: listing and tour search, listing and
+tour detail, the inbox and a long chat as the seeded heavy user, and booking
+POSTs. The page cache is off so every request renders. Per route it records
+the mean, median and p95 time and the SQL statement count and time from the
+Server-Timing header.
+
+Results go to benchmarks/results/e2e-<timestamp>.json (or ``--out``) with
+the git revision. With ``--baseline`` the run is compared route by route
+against an earlier file and routes more than ``--threshold`` % slower are
+listed; the exit status is 1 if there are any.
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+# measure rendering, not the page cache; query counts and DB time come from Server-Timing
+os.environ.setdefault("PAGE_CACHE_ENABLED", "false")
+os.environ.setdefault("SQL_SERVER_TIMING", "true")
+os.environ.setdefault("SQL_LOG_LEVEL", "WARNING")
+os.environ.setdefault("METRICS_ENABLED", "false")
+
+from config import Config  # noqa: E402
+
+from app import create_app, db  # noqa: E402
+from app.models import HousingExchange, Message, RemoteTourism, User  # noqa: E402
+from app.utils.seed import SCALES, seed  # noqa: E402
+from app.utils.view_counter import flush_views  # noqa: E402
+
+_SERVER_TIMING = re.compile(r'db;dur=([\d.]+);desc="(\d+) queries"')
+
+
+def _app(path: str):
+    Config.SQLALCHEMY_DATABASE_URI = f"sqlite:///{path}"
+    app = create_app()
+    app.config["WTF_CSRF_ENABLED"] = False
+    return app
+
+
+def _targets(app) -> dict:
+    """Ids the routes are requested with: the heavy inbox user, their longest chat, busy pages."""
+    with app.app_context():
+        user_id = db.session.execute(db.select(db.func.min(User.id))).scalar()
+        partner = db.session.execute(
+            db.select(Message.sender_id, db.func.count())
+            .where(Message.receiver_id == user_id)
+            .group_by(Message.sender_id).order_by(db.func.count().desc()).limit(1)
+        ).first()
+        city = db.session.execute(
+            db.select(HousingExchange.city).group_by(HousingExchange.city)
+            .order_by(db.func.count().desc()).limit(1)
+        ).scalar()
+        listing_id = db.session.execute(
+            db.select(HousingExchange.id).where(HousingExchange.is_active.is_(True)).limit(1)
+        ).scalar()
+        tour_id = db.session.execute(
+            db.select(RemoteTourism.id).where(RemoteTourism.guide_id != user_id)
+            .order_by(RemoteTourism.booking_count.desc()).limit(1)
+        ).scalar()
+    return {"user": user_id, "partner": partner[0], "city": city, "listing": listing_id, "tour": tour_id}
+
+
+def _routes(t: dict) -> list:
+    """(name, method, url, form factory or None, logged in)."""
+    first_day = date.today() + timedelta(days=400)
+
+    def booking(i):
+        day = (first_day + timedelta(days=i)).isoformat()
+        return {"start_date": day, "end_date": day, "hours": 1}
+
+    return [
+        ("exchange_search", "GET", "/exchange/", None, False),
+        ("exchange_search_city", "GET", f"/exchange/?city={t['city']}", None, False),
+        ("exchange_detail", "GET", f"/exchange/{t['listing']}", None, False),
+        ("tourism_search", "GET", "/tourism/", None, False),
+        ("tourism_detail", "GET", f"/tourism/{t['tour']}", None, False),
+        ("inbox", "GET", "/messages/", None, True),
+        ("chat", "GET", f"/messages/chat/{t['partner']}", None, True),
+        ("tour_booking", "POST", f"/tourism/{t['tour']}/book", booking, True),
+    ]
+
+
+def _measure(client, method, url, form, requests: int) -> dict:
+    times, queries, db_ms, statuses = [], [], [], set()
+    for i in range(requests + 1):
+        started = time.perf_counter()
+        response = client.open(url, method=method, data=form(i) if form else None)
+        elapsed = (time.perf_counter() - started) * 1000
+        if i == 0:
+            continue  # warm-up: template compilation, first connection
+        times.append(elapsed)
+        statuses.add(response.status_code)
+        timing = _SERVER_TIMING.search(response.headers.get("Server-Timing", ""))
+        if timing:
+            db_ms.append(float(timing.group(1)))
+            queries.append(int(timing.group(2)))
+    times.sort()
+    return {
+        "requests": requests,
+        "status": sorted(statuses),
+        "mean_ms": round(statistics.fmean(times), 3),
+        "median_ms": round(statistics.median(times), 3),
+        "p95_ms": round(times[min(len(times) - 1, int(len(times) * 0.95))], 3),
+        "queries": round(statistics.fmean(queries), 1) if queries else None,
+        "db_ms": round(statistics.fmean(db_ms), 3) if db_ms else None,
+    }
+
+
+def run_scale(scale: str, requests: int, workdir: str) -> dict:
+    path = os.path.join(workdir, f"{scale}.db")
+    app = _app(path)
+    with app.app_context():
+        db.create_all()
+        started = time.perf_counter()
+        counts = seed(SCALES[scale])
+        seed_s = time.perf_counter() - started
+    targets = _targets(app)
+    anonymous, member = app.test_client(), app.test_client()
+    with member.session_transaction() as session:
+        session["_user_id"] = str(targets["user"])
+        session["_fresh"] = True
+
+    routes = {}
+    for name, method, url, form, logged_in in _routes(targets):
+        routes[name] = _measure(member if logged_in else anonymous, method, url, form, requests)
+        r = routes[name]
+        print(f"  {scale:<7} {name:<22} {r['median_ms']:8.2f} ms median {r['p95_ms']:8.2f} ms p95 "
+              f"{r['queries'] if r['queries'] is not None else '-':>6} queries  {r['status']}")
+    # buffered listing views belong to this database, write them before it goes away
+    flush_views(app)
+    with app.app_context():
+        db.engine.dispose()
+    return {"rows": counts, "seed_seconds": round(seed_s, 2), "routes": routes}
+
+
+def _revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list:
+    """Print per-route median changes; return the routes slower than ``threshold`` %."""
+    regressions = []
+    for scale, result in current["scales"].items():
+        before = baseline.get("scales", {}).get(scale)
+        if not before:
+            continue
+        for name, r in result["routes"].items():
+            old = before["routes"].get(name)
+            if not old:
+                continue
+            change = 100 * (r["median_ms"] - old["median_ms"]) / old["median_ms"]
+            flag = " REGRESSION" if change > threshold else ""
+            print(f"  {scale:<7} {name:<22} {old['median_ms']:8.2f} -> {r['median_ms']:8.2f} ms ({change:+.1f} %){flag}")
+            if flag:
+                regressions.append(f"{scale}/{name}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scales", nargs="+", choices=list(SCALES), default=["small", "medium"])
+    parser.add_argument("--requests", type=int, default=50, help="Timed requests per route.")
+    parser.add_argument("--out", help="Result file (default benchmarks/results/e2e-<timestamp>.json).")
+    parser.add_argument("--baseline", help="Earlier result file to compare against.")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Median slowdown in %% that counts as a regression.")
+    args = parser.parse_args()
+
+    results = {
+        "created": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "revision": _revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "requests": args.requests,
+        "scales": {},
+    }
+    with tempfile.TemporaryDirectory() as workdir:
+        for scale in args.scales:
+            print(f"{scale}: seeding {SCALES[scale]}")
+            results["scales"][scale] = run_scale(scale, args.requests, workdir)
+
+    out = args.out or os.path.join(ROOT, "benchmarks", "results", f"e2e-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"saved {out}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print(f"slower than {args.threshold:.0f} %: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+"""Minimal in-process S3-compatible server for benchmarks.
+
+Implements just enough of the S3 REST API for boto3 as used by
+``app.utils.helpers``: Put/Get (with Range)/Head/Delete/CopyObject,
+DeleteObjects, ListObjectsV2 (paginated), multipart uploads and browser
+form uploads (presigned POST; the policy is not checked). Path-style
+addressing only, buckets spring into existence on first use.
+
+``latency`` adds a fixed delay per request to imitate a remote endpoint;
+``fail_mode`` set to "error" answers 503, "hang" sleeps ``hang_seconds``
+before answering (for timeout/circuit-breaker experiments).
+
+    with FakeS3(latency=0.05) as s3:
+        app.config.update(S3_BUCKET="bench", S3_ENDPOINT_URL=s3.endpoint_url, ...)
+"""
+import hashlib
+import threading
+import time
+import uuid
+from email import policy
+from email.parser import BytesParser
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+
+def _decode_aws_chunked(body: bytes) -> bytes:
+    """Strip aws-chunked framing: ``<hex-size>[;ext]\\r\\n<data>\\r\\n ... 0\\r\\n<trailers>``."""
+    out, pos = bytearray(), 0
+    while pos < len(body):
+        line_end = body.index(b"\r\n", pos)
+        size = int(body[pos:line_end].split(b";", 1)[0], 16)
+        if size == 0:
+            break
+        start = line_end + 2
+        out += body[start:start + size]
+        pos = start + size + 2
+    return bytes(out)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "_Server"
+
+    def log_message(self, format, *args):  # noqa: A002 - keep benchmark output clean
+        pass
+
+    # -- plumbing ---------------------------------------------------------
+
+    def _parse(self):
+        parts = urlsplit(self.path)
+        segments = parts.path.lstrip("/").split("/", 1)
+        bucket = unquote(segments[0])
+        key = unquote(segments[1]) if len(segments) > 1 else ""
+        query = {k: v[0] for k, v in parse_qs(parts.query, keep_blank_values=True).items()}
+        return bucket, key, query
+
+    def _body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        if "aws-chunked" in (self.headers.get("Content-Encoding") or "") or self.headers.get("x-amz-decoded-content-length"):
+            body = _decode_aws_chunked(body)
+        return body
+
+    def _send(self, status: int, body: bytes = b"", headers=None, head_only: bool = False):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body and not head_only:
+            self.wfile.write(body)
+
+    def _xml(self, status: int, xml: str):
+        self._send(status, ('<?xml version="1.0" encoding="UTF-8"?>' + xml).encode(), {"Content-Type": "application/xml"})
+
+    def _gate(self) -> bool:
+        """Apply latency / failure injection; False if the request was already answered."""
+        srv = self.server
+        srv.requests += 1
+        if srv.latency:
+            time.sleep(srv.latency)
+        if srv.fail_mode == "hang":
+            time.sleep(srv.hang_seconds)
+        if srv.fail_mode in ("error", "hang"):
+            length = int(self.headers.get("Content-Length") or 0)
+            if length:
+                self.rfile.read(length)
+            self._xml(503, "<Error><Code>SlowDown</Code><Message>injected failure</Message></Error>")
+            return False
+        return True
+
+    # -- verbs ------------------------------------------------------------
+
+    def do_PUT(self):
+        if not self._gate():
+            return
+        bucket, key, query = self._parse()
+        body = self._body()
+        etag = '"%s"' % hashlib.md5(body).hexdigest()
+        copy_source = self.headers.get("x-amz-copy-source")
+        if copy_source:
+            src_bucket, src_key = unquote(copy_source).lstrip("/").split("/", 1)
+            data = self.server.objects[(src_bucket, src_key)][0]
+            self.server.objects[(bucket, key)] = (data, self.headers.get("Content-Type", "binary/octet-stream"))
+            return self._xml(
+                200,
+                f'<CopyObjectResult><ETag>"{hashlib.md5(data).hexdigest()}"</ETag>'
+                f"<LastModified>2000-01-01T00:00:00.000Z</LastModified></CopyObjectResult>",
+            )
+        if "uploadId" in query:
+            self.server.uploads[query["uploadId"]][int(query["partNumber"])] = body
+        else:
+            self.server.objects[(bucket, key)] = (body, self.headers.get("Content-Type", "binary/octet-stream"))
+        self._send(200, headers={"ETag": etag})
+
+    def do_GET(self):
+        if not self._gate():
+            return
+        bucket, key, query = self._parse()
+        if not key:
+            return self._list(bucket, query)
+        self._object(bucket, key)
+
+    def do_HEAD(self):
+        if not self._gate():
+            return
+        bucket, key, _ = self._parse()
+        self._object(bucket, key, head_only=True)
+
+    def do_DELETE(self):
+        if not self._gate():
+            return
+        bucket, key, query = self._parse()
+        if "uploadId" in query:
+            self.server.uploads.pop(query["uploadId"], None)
+        else:
+            self.server.objects.pop((bucket, key), None)
+        self._send(204)
+
+    def do_POST(self):
+        if not self._gate():
+            return
+        bucket, key, query = self._parse()
+        if not key and (self.headers.get("Content-Type") or "").startswith("multipart/form-data"):
+            return self._form_upload(bucket)
+        body = self._body()
+        if "delete" in query:
+            self.server.delete_batches += 1
+            keys = [el.text for el in ElementTree.fromstring(body).iter() if el.tag.endswith("Key")]
+            for k in keys:
+                self.server.objects.pop((bucket, k), None)
+            deleted = "".join(f"<Deleted><Key>{escape(k)}</Key></Deleted>" for k in keys)
+            return self._xml(200, f"<DeleteResult>{deleted}</DeleteResult>")
+        if "uploads" in query:
+            upload_id = uuid.uuid4().hex
+            self.server.uploads[upload_id] = {}
+            return self._xml(
+                200,
+                f"<InitiateMultipartUploadResult><Bucket>{escape(bucket)}</Bucket><Key>{escape(key)}</Key>"
+                f"<UploadId>{upload_id}</UploadId></InitiateMultipartUploadResult>",
+            )
+        if "uploadId" in query:
+            parts = self.server.uploads.pop(query["uploadId"])
+            data = b"".join(parts[n] for n in sorted(parts))
+            self.server.objects[(bucket, key)] = (data, "binary/octet-stream")
+            return self._xml(
+                200,
+                f"<CompleteMultipartUploadResult><Bucket>{escape(bucket)}</Bucket><Key>{escape(key)}</Key>"
+                f'<ETag>"{hashlib.md5(data).hexdigest()}-{len(parts)}"</ETag></CompleteMultipartUploadResult>',
+            )
+        self._send(400)
+
+    # -- helpers ----------------------------------------------------------
+
+    def _form_upload(self, bucket: str):
+        head = f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode()
+        message = BytesParser(policy=policy.HTTP).parsebytes(head + self._body())
+        fields = {part.get_param("name", header="content-disposition"): part.get_payload(decode=True)
+                  for part in message.iter_parts()}
+        content_type = (fields.get("Content-Type") or b"binary/octet-stream").decode()
+        self.server.objects[(bucket, fields["key"].decode())] = (fields["file"], content_type)
+        self._send(204)
+
+    def _object(self, bucket: str, key: str, head_only: bool = False):
+        entry = self.server.objects.get((bucket, key))
+        if entry is None:
+            if head_only:
+                return self._send(404, head_only=True)
+            return self._xml(404, f"<Error><Code>NoSuchKey</Code><Key>{escape(key)}</Key></Error>")
+        body, content_type = entry
+        status = 200
+        byte_range = self.headers.get("Range")
+        if byte_range and byte_range.startswith("bytes=") and not head_only:
+            first, _, last = byte_range[len("bytes="):].partition("-")
+            end = min(int(last) if last else len(body) - 1, len(body) - 1)
+            body, status = body[int(first):end + 1], 206
+        headers = {
+            "Content-Type": content_type,
+            "ETag": '"%s"' % hashlib.md5(body).hexdigest(),
+            "Last-Modified": formatdate(usegmt=True),
+        }
+        if head_only:
+            self.send_response(200)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            return
+        self._send(status, body, headers)
+
+    def _list(self, bucket: str, query: dict):
+        prefix = query.get("prefix", "")
+        max_keys = int(query.get("max-keys", 1000))
+        start_after = query.get("continuation-token") or query.get("start-after") or ""
+        keys = sorted(k for (b, k) in self.server.objects if b == bucket and k.startswith(prefix) and k > start_after)
+        page, truncated = keys[:max_keys], len(keys) > max_keys
+        contents = "".join(
+            f"<Contents><Key>{escape(k)}</Key><Size>{len(self.server.objects[(bucket, k)][0])}</Size>"
+            f"<LastModified>2000-01-01T00:00:00.000Z</LastModified></Contents>"
+            for k in page
+        )
+        token = f"<NextContinuationToken>{escape(page[-1])}</NextContinuationToken>" if truncated else ""
+        self._xml(
+            200,
+            f"<ListBucketResult><Name>{escape(bucket)}</Name><Prefix>{escape(prefix)}</Prefix>"
+            f"<KeyCount>{len(page)}</KeyCount><MaxKeys>{max_keys}</MaxKeys>"
+            f"<IsTruncated>{'true' if truncated else 'false'}</IsTruncated>{token}{contents}</ListBucketResult>",
+        )
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # clients that gave up on a hanging request (timeouts) close the socket first
+        pass
+
+
+class FakeS3:
+    def __init__(self, latency: float = 0.0, host: str = "127.0.0.1", port: int = 0):
+        self._server = _Server((host, port), _Handler)
+        self._server.objects = {}
+        self._server.uploads = {}
+        self._server.requests = 0
+        self._server.delete_batches = 0
+        self._server.latency = latency
+        self._server.fail_mode = None
+        self._server.hang_seconds = 5.0
+        self._thread = None
+
+    # shared state lives on the server so handler threads can reach it
+    def __getattr__(self, name):
+        return getattr(self._server, name)
+
+    def __setattr__(self, name, value):
+        if name in ("latency", "fail_mode", "hang_seconds"):
+            setattr(self._server, name, value)
+        else:
+            super().__setattr__(name, value)
+
+    @property
+    def endpoint_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def app_config(self, bucket: str = "bench") -> dict:
+        """Config overrides pointing the app at this server."""
+        return {
+            "S3_BUCKET": bucket,
+            "S3_ENDPOINT_URL": self.endpoint_url,
+            "S3_ACCESS_KEY_ID": "fake",
+            "S3_SECRET_ACCESS_KEY": "fake",
+            "S3_PUBLIC_URL": f"{self.endpoint_url}/{bucket}",
+            "S3_ADDRESSING_STYLE": "path",
+        }
+
+    def start(self) -> "FakeS3":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-s3", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeS3":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
@@ -0,0 +1,69 @@
+"""Per-request cost of the Prometheus hooks.
+
+    python benchmarks/metrics_overhead.py [--requests 5000]
+
+Serves the home page from the page cache (about the cheapest request the app
+handles, so the hooks are the largest share of it) through the test client
+with METRICS_ENABLED off and on, interleaving rounds to even out noise, and
+reports the mean per request and the difference.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+# the per-request SQL log line would dominate both runs
+os.environ.setdefault("SQL_LOG_LEVEL", "WARNING")
+# apps start without the hooks; the measured one gets them from init_metrics below
+os.environ["METRICS_ENABLED"] = "false"
+
+from app import create_app, db  # noqa: E402
+from app.utils.metrics import init_metrics  # noqa: E402
+
+
+def _client(metrics: bool):
+    app = create_app()
+    if metrics:
+        app.config["METRICS_ENABLED"] = True
+        init_metrics(app)
+        # create_app registers the timer first, ahead of the page cache hook
+        hooks = app.before_request_funcs[None]
+        hooks.insert(0, hooks.pop())
+    with app.app_context():
+        db.create_all()
+    client = app.test_client()
+    client.get("/")  # fills the page cache
+    return client
+
+
+def _round(client, requests: int) -> float:
+    started = time.perf_counter()
+    for _ in range(requests):
+        client.get("/")
+    return (time.perf_counter() - started) / requests * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    plain = _client(False)
+    measured = _client(True)
+
+    off, on = [], []
+    for _ in range(args.rounds):
+        off.append(_round(plain, args.requests // args.rounds))
+        on.append(_round(measured, args.requests // args.rounds))
+    off_us, on_us = statistics.median(off), statistics.median(on)
+    print(f"{args.requests} cached home page requests, median of {args.rounds} rounds")
+    print(f"metrics off {off_us:8.1f} us/request")
+    print(f"metrics on  {on_us:8.1f} us/request  (+{on_us - off_us:.1f} us, {100 * (on_us - off_us) / off_us:.1f} %)")
+
+
+if __name__ == "__main__":
+    main()
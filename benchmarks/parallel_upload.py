@@ -0,0 +1,73 @@
+"""Serial vs pooled multi-photo upload against a local fake S3 endpoint.
+
+    python benchmarks/parallel_upload.py [--photos 10 --latency 0.05 --workers 4]
+
+Each photo goes through the full save_image pipeline (validation, renditions,
+upload of the original and every rendition); ``--latency`` is added per S3
+request to stand in for a remote bucket.
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from PIL import Image  # noqa: E402
+from werkzeug.datastructures import FileStorage  # noqa: E402
+
+from app import create_app, db  # noqa: E402
+from app.utils import helpers  # noqa: E402
+from benchmarks.fake_s3 import FakeS3  # noqa: E402
+
+
+def _photo(width: int, height: int) -> bytes:
+    buf = io.BytesIO()
+    Image.effect_noise((width, height), 48).convert("RGB").save(buf, "JPEG", quality=90)
+    return buf.getvalue()
+
+
+def _files(payloads):
+    return [FileStorage(io.BytesIO(p), filename=f"photo{i}.jpg") for i, p in enumerate(payloads)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--photos", type=int, default=10)
+    parser.add_argument("--width", type=int, default=2400)
+    parser.add_argument("--height", type=int, default=1800)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    # distinct noise per photo, so content-addressed dedup never short-circuits an upload
+    payloads = [_photo(args.width, args.height) for _ in range(args.photos)]
+    warmup = [_photo(320, 240) for _ in range(2)]
+    app = create_app()
+
+    with FakeS3(latency=args.latency) as s3:
+        app.config.update(s3.app_config(), MEDIA_WORKERS=args.workers)
+        helpers._S3_CLIENT = None
+        with app.test_request_context():
+            db.create_all()
+            # warm up the client and the pool so neither run pays for setup
+            helpers.save_images(_files(warmup), subdir="listing_photos")
+
+            started = time.perf_counter()
+            serial = [helpers.save_image(f, subdir="listing_photos") for f in _files(payloads)]
+            serial_s = time.perf_counter() - started
+
+            started = time.perf_counter()
+            pooled, rejected = helpers.save_images(_files(payloads), subdir="listing_photos")
+            pooled_s = time.perf_counter() - started
+
+    assert all(serial) and len(pooled) == args.photos and not rejected
+    print(f"{args.photos} photos {args.width}x{args.height}, S3 latency {args.latency * 1000:.0f} ms, {args.workers} workers")
+    print(f"serial  {serial_s:7.2f} s")
+    print(f"pooled  {pooled_s:7.2f} s  (x{serial_s / pooled_s:.1f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Upload latency during a storage outage, with and without the S3 circuit breaker.
+
+    python benchmarks/s3_outage.py [--uploads 8 --read-timeout 0.5 --reset 2]
+
+The fake S3 server first hangs every request (longer than the read timeout),
+so each call fails only after the timeout and botocore's retries. Without the
+breaker every upload pays that; with it the first few calls trip it and the
+rest fall back to local disk immediately. Then the server recovers and, after
+the reset delay, the half-open probe closes the breaker again.
+"""
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from PIL import Image  # noqa: E402
+from werkzeug.datastructures import FileStorage  # noqa: E402
+
+from app import create_app, db  # noqa: E402
+from app.utils import helpers  # noqa: E402
+from benchmarks.fake_s3 import FakeS3  # noqa: E402
+
+
+def _photo(seed: int) -> FileStorage:
+    buf = io.BytesIO()
+    Image.new("RGB", (640, 480), (seed * 7 % 256, seed * 13 % 256, seed * 29 % 256)).save(buf, "JPEG")
+    buf.seek(0)
+    return FileStorage(buf, filename=f"photo{seed}.jpg")
+
+
+def _run(label: str, uploads: int, seed: int) -> None:
+    timings, backends = [], []
+    for i in range(uploads):
+        started = time.perf_counter()
+        stored = helpers.save_image(_photo(seed + i), subdir="listing_photos")
+        timings.append(time.perf_counter() - started)
+        backends.append("s3" if stored.startswith("http") else "disk" if stored else "-")
+    stats = helpers.s3_stats()
+    print(
+        f"{label:<18} total {sum(timings):6.2f} s  first {timings[0]:5.2f} s  last {timings[-1]:5.2f} s  "
+        f"stored: {'/'.join(backends)}  breaker={stats['state']} trips={stats['trips']} rejected={stats['rejected']}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--uploads", type=int, default=8)
+    parser.add_argument("--read-timeout", type=float, default=0.5)
+    parser.add_argument("--failures", type=int, default=3, help="S3_BREAKER_FAILURES")
+    parser.add_argument("--reset", type=float, default=2.0, help="S3_BREAKER_RESET_SECONDS")
+    args = parser.parse_args()
+
+    app = create_app()
+    app.static_folder = tempfile.mkdtemp()
+    with FakeS3() as s3:
+        s3.hang_seconds = args.read_timeout * 4
+        base = dict(s3.app_config(), S3_READ_TIMEOUT=args.read_timeout, S3_CONNECT_TIMEOUT=args.read_timeout,
+                    S3_BREAKER_RESET_SECONDS=args.reset)
+        with app.app_context():
+            db.create_all()
+            for label, failures in (("without breaker", 10 ** 6), ("with breaker", args.failures)):
+                app.config.update(base, S3_BREAKER_FAILURES=failures)
+                helpers._S3_CLIENT = None
+                s3.fail_mode = None
+                _run(f"{label}: healthy", 2, seed=1000 * failures % 997)
+                s3.fail_mode = "hang"
+                _run(f"{label}: outage", args.uploads, seed=1000 * failures % 997 + 10)
+
+            s3.fail_mode = None
+            time.sleep(args.reset)
+            _run("recovered", 2, seed=5000)
+
+            stats = helpers.s3_stats()
+            print(f"S3 calls={stats['calls']} errors={stats['errors']} max latency={stats['latency_max']:.2f} s")
+            print("latency histogram:", ", ".join(f"<={b}: {n}" for b, n in stats["latency_buckets"].items()))
+
+
+if __name__ == "__main__":
+    main()
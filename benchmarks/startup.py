@@ -0,0 +1,103 @@
+"""Cold start: import, create_app and first requests in fresh interpreters.
+
+    python benchmarks/startup.py [--runs 5] [--top 15]
+
+Each run is a new Python process (as a new worker or serverless instance
+would be) that imports the app, calls create_app() and serves the first
+request to a few pages, timing each step. Runs are repeated with the Jinja
+bytecode cache off and with a cache filled by precompile_templates(), and
+the medians are reported. One more process runs under ``-X importtime`` for
+the breakdown of import time by top-level package.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAGES = ("/", "/exchange/", "/tourism/")
+
+_CHILD = """
+import json, time
+t0 = time.perf_counter()
+from app import create_app, db
+t1 = time.perf_counter()
+app = create_app()
+t2 = time.perf_counter()
+timings = {"import_ms": (t1 - t0) * 1000, "create_app_ms": (t2 - t1) * 1000}
+if %(prepare)r:
+    from app.utils.template_cache import precompile_templates
+    with app.app_context():
+        db.create_all()
+    precompile_templates(app)
+client = app.test_client()
+for page in %(pages)r:
+    started = time.perf_counter()
+    client.get(page)
+    timings["first " + page] = (time.perf_counter() - started) * 1000
+print(json.dumps(timings))
+"""
+
+
+def _run(env: dict, prepare: bool = False, importtime: bool = False):
+    args = [sys.executable] + (["-X", "importtime"] if importtime else []) + [
+        "-c", _CHILD % {"prepare": prepare, "pages": PAGES}]
+    proc = subprocess.run(args, cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    return json.loads(proc.stdout.strip().splitlines()[-1]), proc.stderr
+
+
+def _import_breakdown(stderr: str, top: int) -> list:
+    """Import time (ms) spent in each top-level package's own modules, from ``-X importtime`` output.
+
+    Self times are summed, so sqlalchemy's modules count towards sqlalchemy
+    even when flask_sqlalchemy imported them.
+    """
+    totals = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, _, name = line[len("import time:"):].split("|")
+        package = name.strip().split(".")[0]
+        totals[package] = totals.get(package, 0) + int(own) / 1000
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)[:top]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="Packages shown in the import breakdown.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        env = dict(
+            os.environ,
+            DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'startup.db')}",
+            JINJA_BYTECODE_CACHE_DIR=os.path.join(workdir, "jinja_cache"),
+            PAGE_CACHE_ENABLED="false",
+            SQL_LOG_LEVEL="WARNING",
+        )
+        # creates the schema and fills the bytecode cache for the "cached" runs
+        _run(env, prepare=True)
+
+        variants = {"no bytecode cache": dict(env, JINJA_BYTECODE_CACHE="false"), "bytecode cache": env}
+        for label, variant_env in variants.items():
+            runs = [_run(variant_env)[0] for _ in range(args.runs)]
+            print(f"{label} (median of {args.runs} processes)")
+            total = 0.0
+            for step in runs[0]:
+                ms = statistics.median(run[step] for run in runs)
+                total += ms
+                print(f"  {step:<22} {ms:8.1f} ms")
+            print(f"  {'total':<22} {total:8.1f} ms")
+
+        _, stderr = _run(dict(env, JINJA_BYTECODE_CACHE="false"), importtime=True)
+    print(f"import time by top-level package (top {args.top})")
+    for package, ms in _import_breakdown(stderr, args.top):
+        print(f"  {package:<22} {ms:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Peak-memory benchmark for the image upload pipeline.
+
+Compares ``helpers.save_image`` (spooled, header-only validation) with the
+previous read-everything-and-decode approach on a large synthetic photo.
+
+    python benchmarks/upload_memory.py [--width 6000 --height 4000]
+
+Local storage only: S3 settings are cleared so nothing leaves the machine.
+"""
+import argparse
+import io
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ["S3_BUCKET"] = ""
+
+from PIL import Image  # noqa: E402
+from werkzeug.datastructures import FileStorage  # noqa: E402
+
+from app import create_app, db  # noqa: E402
+
+
+def _make_photo(width: int, height: int) -> str:
+    """Write a noisy JPEG (incompressible, like a real phone photo) to a temp file."""
+    img = Image.effect_noise((width, height), 64).convert("RGB")
+    fd, path = tempfile.mkstemp(suffix=".jpg")
+    with os.fdopen(fd, "wb") as f:
+        img.save(f, "JPEG", quality=95)
+    return path
+
+
+def _legacy_save(file_storage, folder: str) -> None:
+    """The pre-spooling pipeline: bytes in memory, full decode, BytesIO copy."""
+    content = file_storage.read()
+    img = Image.open(io.BytesIO(content))
+    img.load()
+    buf = io.BytesIO(content)
+    with open(os.path.join(folder, "legacy.jpg"), "wb") as f:
+        f.write(buf.getvalue())
+
+
+def _measure(label: str, fn) -> None:
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    tracemalloc.start()
+    started = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(
+        f"{label:<10} time={elapsed * 1000:8.1f} ms  "
+        f"python_peak={peak / 1024 / 1024:7.2f} MiB  "
+        f"maxrss_growth={(rss_after - rss_before) / 1024:7.2f} MiB"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--width", type=int, default=6000)
+    parser.add_argument("--height", type=int, default=4000)
+    args = parser.parse_args()
+
+    photo = _make_photo(args.width, args.height)
+    print(f"photo: {args.width}x{args.height}, {os.path.getsize(photo) / 1024 / 1024:.1f} MiB")
+
+    app = create_app()
+    static_dir = tempfile.mkdtemp()
+    app.static_folder = static_dir
+    from app.utils.helpers import save_image
+
+    # ru_maxrss is a high-water mark, so run the lean path first
+    with app.app_context(), open(photo, "rb") as f:
+        db.create_all()
+        _measure("spooled", lambda: save_image(FileStorage(f, filename="photo.jpg"), subdir="bench"))
+    with open(photo, "rb") as f:
+        _measure("legacy", lambda: _legacy_save(FileStorage(f, filename="photo.jpg"), static_dir))
+    os.remove(photo)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""Worker spawn time and memory per worker under gunicorn, with and without --preload.
+
+    python benchmarks/worker_spawn.py [--workers 4] [--requests 200]
+
+Starts gunicorn with the repo's gunicorn.conf.py (on a temp SQLite database)
+and a hook that logs when each worker was forked and when it finished loading
+the app. Reports:
+
+* spawn time: fork to ready per worker (without preload this includes
+  importing the app and create_app()), and start to all workers ready;
+* respawn time: a worker is killed and the master replaces it;
+* memory per worker after ``--requests`` requests, from
+  /proc/<pid>/smaps_rollup (Linux): RSS, PSS (shared pages split between the
+  processes sharing them) and USS (private pages only, what a worker really
+  costs), plus the PSS total of master and workers.
+"""
+import argparse
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_HOOKS = """
+exec(open(%(config)r, encoding="utf-8").read())
+import os as _os, time as _time
+
+def post_fork(server, worker):
+    with open(%(log)r, "a") as f:
+        f.write(f"fork {worker.pid} {_time.time()}\\n")
+
+def post_worker_init(worker):
+    with open(%(log)r, "a") as f:
+        f.write(f"ready {_os.getpid()} {_time.time()}\\n")
+"""
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _events(log: str) -> dict:
+    events = {}
+    if os.path.exists(log):
+        with open(log) as f:
+            for line in f:
+                kind, pid, at = line.split()
+                events.setdefault(int(pid), {})[kind] = float(at)
+    return events
+
+
+def _wait_ready(log: str, count: int, timeout: float = 60) -> dict:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        events = _events(log)
+        if sum("ready" in e for e in events.values()) >= count:
+            return events
+        time.sleep(0.02)
+    raise RuntimeError(f"gunicorn did not start {count} workers in {timeout:.0f} s")
+
+
+def _memory(pid: int) -> dict:
+    """RSS, PSS and USS (private) in MiB from smaps_rollup."""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    return {
+        "rss": fields.get("Rss", 0.0),
+        "pss": fields.get("Pss", 0.0),
+        "uss": fields.get("Private_Clean", 0.0) + fields.get("Private_Dirty", 0.0),
+    }
+
+
+def run(preload: bool, workers: int, requests: int, workdir: str) -> None:
+    log = os.path.join(workdir, f"events-{preload}.log")
+    config = os.path.join(workdir, "bench.gunicorn.conf.py")
+    with open(config, "w", encoding="utf-8") as f:
+        f.write(_HOOKS % {"config": os.path.join(ROOT, "gunicorn.conf.py"), "log": log})
+    port = _free_port()
+    env = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        JINJA_BYTECODE_CACHE_DIR=os.path.join(workdir, "jinja_cache"),
+        GUNICORN_PRELOAD="true" if preload else "false",
+        GUNICORN_BIND=f"127.0.0.1:{port}",
+        WEB_CONCURRENCY=str(workers),
+        SQL_LOG_LEVEL="WARNING",
+        PAGE_CACHE_ENABLED="false",
+    )
+    started = time.time()
+    master = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", config, "main:app"], cwd=ROOT, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        events = _wait_ready(log, workers)
+        spawn = [(e["ready"] - e["fork"]) * 1000 for e in events.values() if "fork" in e and "ready" in e]
+        all_ready = (max(e["ready"] for e in events.values()) - started) * 1000
+
+        for _ in range(requests):
+            for page in ("/", "/exchange/", "/tourism/"):
+                urllib.request.urlopen(f"http://127.0.0.1:{port}{page}", timeout=10).read()
+        memory = {pid: _memory(pid) for pid in events}
+        master_memory = _memory(master.pid)
+
+        victim = next(iter(events))
+        os.kill(victim, signal.SIGKILL)
+        killed_at = time.time()
+        respawned = _wait_ready(log, workers + 1)
+        new_pid = next(pid for pid in respawned if pid not in events)
+        respawn_ms = (respawned[new_pid]["ready"] - killed_at) * 1000
+    finally:
+        master.send_signal(signal.SIGTERM)
+        master.wait(timeout=30)
+
+    label = "preload" if preload else "no preload"
+    mean = {key: statistics.fmean(m[key] for m in memory.values()) for key in ("rss", "pss", "uss")}
+    total_pss = master_memory["pss"] + sum(m["pss"] for m in memory.values())
+    print(f"{label}: {workers} workers")
+    print(f"  spawn (fork -> ready)  {statistics.median(spawn):8.1f} ms median, {max(spawn):.1f} ms max")
+    print(f"  start -> all ready     {all_ready:8.1f} ms")
+    print(f"  respawn after kill     {respawn_ms:8.1f} ms")
+    print(f"  per worker             RSS {mean['rss']:6.1f} MiB  PSS {mean['pss']:6.1f} MiB  USS {mean['uss']:6.1f} MiB")
+    print(f"  master + workers PSS   {total_pss:8.1f} MiB")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=200, help="Requests per page before memory is measured.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        subprocess.run(
+            [sys.executable, "-c", "from app import create_app, db\napp = create_app()\nwith app.app_context(): db.create_all()"],
+            cwd=ROOT, env=dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'bench.db')}"), check=True,
+        )
+        for preload in (False, True):
+            run(preload, args.workers, args.requests, workdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -21,6 +21,32 @@ class Config:
     SQLALCHEMY_DATABASE_URI = _db_url
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Optional read replica for search and detail pages (see app.utils.replica). A user who just
+    # wrote reads from the primary for REPLICA_STICKY_SECONDS; a replica lagging more than
+    # REPLICA_MAX_LAG s (checked every REPLICA_CHECK_INTERVAL s) or down is skipped.
+    _replica_url = os.getenv("DATABASE_REPLICA_URL", "")
+    if _replica_url.startswith("postgresql+asyncpg://"):
+        _replica_url = _replica_url.replace("postgresql+asyncpg://", "postgresql+psycopg://", 1)
+    SQLALCHEMY_BINDS = {"replica": _replica_url} if _replica_url else {}
+    REPLICA_STICKY_SECONDS = int(os.getenv("REPLICA_STICKY_SECONDS", 10))
+    REPLICA_MAX_LAG = float(os.getenv("REPLICA_MAX_LAG", 5))
+    REPLICA_CHECK_INTERVAL = float(os.getenv("REPLICA_CHECK_INTERVAL", 5))
+
+    # Connection pool (PostgreSQL; see app.utils.db_pool): up to DB_POOL_SIZE + DB_MAX_OVERFLOW
+    # connections per worker, a checkout waits at most DB_POOL_TIMEOUT s, connects give up after
+    # DB_CONNECT_TIMEOUT s and statements after DB_STATEMENT_TIMEOUT ms (0 = no limit).
+    # Set DB_PGBOUNCER=true behind PgBouncer in transaction mode.
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+    DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 10))
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+    DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+    DB_CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", 5))
+    DB_STATEMENT_TIMEOUT = int(os.getenv("DB_STATEMENT_TIMEOUT", 15000))
+    DB_PGBOUNCER = os.getenv("DB_PGBOUNCER", "false").lower() == "true"
+    # checkouts slower than this are logged with the pool status
+    DB_POOL_SLOW_CHECKOUT_MS = int(os.getenv("DB_POOL_SLOW_CHECKOUT_MS", 500))
+
     # Mail (placeholder settings)
     MAIL_SERVER = os.getenv("MAIL_SERVER", "localhost")
     MAIL_PORT = int(os.getenv("MAIL_PORT", 25))
@@ -45,6 +71,120 @@ class Config:
     # Addressing style for custom endpoints: 'path' works well with Yandex/other S3-compatible services
     S3_ADDRESSING_STYLE = os.getenv("S3_ADDRESSING_STYLE", "path")
 
+    # Upload limits. MAX_CONTENT_LENGTH caps the whole request body (Flask answers 413 above it),
+    # MEDIA_MAX_FILE_SIZE caps each file and MEDIA_MAX_PIXELS guards against decompression bombs.
+    MAX_CONTENT_LENGTH = int(os.getenv("MAX_CONTENT_LENGTH", 100 * 1024 * 1024))
+    MEDIA_MAX_FILE_SIZE = int(os.getenv("MEDIA_MAX_FILE_SIZE", 20 * 1024 * 1024))
+    MEDIA_MAX_PIXELS = int(os.getenv("MEDIA_MAX_PIXELS", 50_000_000))
+    # Uploads are buffered in memory up to this size, then spooled to a temp file
+    MEDIA_SPOOL_MAX_MEMORY = int(os.getenv("MEDIA_SPOOL_MAX_MEMORY", 1024 * 1024))
+    # Threads in the process-wide pool that processes multi-photo uploads concurrently
+    MEDIA_WORKERS = int(os.getenv("MEDIA_WORKERS", 4))
+    # Multipart upload tuning for object storage
+    S3_MULTIPART_THRESHOLD = int(os.getenv("S3_MULTIPART_THRESHOLD", 8 * 1024 * 1024))
+    S3_MULTIPART_CHUNKSIZE = int(os.getenv("S3_MULTIPART_CHUNKSIZE", 8 * 1024 * 1024))
+    S3_MAX_CONCURRENCY = int(os.getenv("S3_MAX_CONCURRENCY", 4))
+    # Client timeouts (s), attempts per call incl. the first, HTTP pool size (0 = MEDIA_WORKERS * S3_MAX_CONCURRENCY)
+    S3_CONNECT_TIMEOUT = float(os.getenv("S3_CONNECT_TIMEOUT", 3))
+    S3_READ_TIMEOUT = float(os.getenv("S3_READ_TIMEOUT", 10))
+    S3_MAX_ATTEMPTS = int(os.getenv("S3_MAX_ATTEMPTS", 2))
+    S3_MAX_POOL_CONNECTIONS = int(os.getenv("S3_MAX_POOL_CONNECTIONS", 0))
+    # Circuit breaker: open after this many consecutive failed calls, probe again after the reset delay
+    S3_BREAKER_FAILURES = int(os.getenv("S3_BREAKER_FAILURES", 5))
+    S3_BREAKER_RESET_SECONDS = float(os.getenv("S3_BREAKER_RESET_SECONDS", 30))
+
+    # Responsive renditions (WebP + JPEG) generated next to every uploaded photo, widths in px
+    MEDIA_DERIVATIVES_ENABLED = os.getenv("MEDIA_DERIVATIVES_ENABLED", "true").lower() == "true"
+    MEDIA_DERIVATIVE_WIDTHS = tuple(int(w) for w in os.getenv("MEDIA_DERIVATIVE_WIDTHS", "320,800,1600").split(",") if w.strip())
+    MEDIA_AVATAR_WIDTHS = tuple(int(w) for w in os.getenv("MEDIA_AVATAR_WIDTHS", "64,160").split(",") if w.strip())
+    # Upload keys are unique and never rewritten, so they can be cached as immutable
+    MEDIA_CACHE_CONTROL = os.getenv("MEDIA_CACHE_CONTROL", "public, max-age=31536000, immutable")
+
+    # Removed photos are deleted after the DB commit, in batches, off the request thread
+    MEDIA_DELETE_ASYNC = os.getenv("MEDIA_DELETE_ASYNC", "true").lower() == "true"
+    MEDIA_DELETE_MAX_ATTEMPTS = int(os.getenv("MEDIA_DELETE_MAX_ATTEMPTS", 3))
+    MEDIA_DELETE_RETRY_BACKOFF = float(os.getenv("MEDIA_DELETE_RETRY_BACKOFF", 0.5))
+    # media gc leaves unreferenced files younger than this alone (uploads of forms still in flight)
+    MEDIA_GC_GRACE_HOURS = float(os.getenv("MEDIA_GC_GRACE_HOURS", 24))
+
+    # Photos go from the browser straight to the bucket via presigned POST (needs a CORS rule
+    # allowing POST from the site origin); without S3 a signed PUT endpoint stands in for it
+    DIRECT_UPLOADS_ENABLED = os.getenv("DIRECT_UPLOADS_ENABLED", "true").lower() == "true"
+    DIRECT_UPLOAD_EXPIRES = int(os.getenv("DIRECT_UPLOAD_EXPIRES", 900))
+
+    # Near-duplicate photos: max differing bits of the 64-bit dHash, and how many
+    # photos a new listing must share with an earlier one to be flagged
+    PHASH_MAX_DISTANCE = int(os.getenv("PHASH_MAX_DISTANCE", 6))
+    DUPLICATE_MIN_PHOTOS = int(os.getenv("DUPLICATE_MIN_PHOTOS", 2))
+
+    # Rendered listing/tour cards: "memory" (per-process LRU of FRAGMENT_CACHE_SIZE cards),
+    # "redis" (shared by all workers, entries expire after FRAGMENT_CACHE_TTL s) or "none"
+    FRAGMENT_CACHE_BACKEND = os.getenv("FRAGMENT_CACHE_BACKEND", "memory")
+    FRAGMENT_CACHE_SIZE = int(os.getenv("FRAGMENT_CACHE_SIZE", 2000))
+    FRAGMENT_CACHE_REDIS_URL = os.getenv("FRAGMENT_CACHE_REDIS_URL", "redis://localhost:6379/0")
+    FRAGMENT_CACHE_TTL = int(os.getenv("FRAGMENT_CACHE_TTL", 86400))
+
+    # Whole pages for anonymous visitors (search, detail), purged by surrogate key on writes.
+    # The "memory" backend is per worker (purges reach only that process; PAGE_CACHE_TTL bounds
+    # staleness elsewhere), "redis" is shared. A CDN gets s-maxage=PAGE_CACHE_TTL, Surrogate-Key
+    # and Vary: Cookie; signed-in responses of the same pages are private.
+    PAGE_CACHE_ENABLED = os.getenv("PAGE_CACHE_ENABLED", "true").lower() == "true"
+    PAGE_CACHE_BACKEND = os.getenv("PAGE_CACHE_BACKEND", "memory")
+    PAGE_CACHE_REDIS_URL = os.getenv("PAGE_CACHE_REDIS_URL", "redis://localhost:6379/0")
+    PAGE_CACHE_TTL = int(os.getenv("PAGE_CACHE_TTL", 60))
+    PAGE_CACHE_SIZE = int(os.getenv("PAGE_CACHE_SIZE", 500))
+    PAGE_CACHE_BROWSER_MAX_AGE = int(os.getenv("PAGE_CACHE_BROWSER_MAX_AGE", 0))
+
+    # Listing views: counted in memory ("memory", per worker) or in a shared Redis hash ("redis"),
+    # added to housing_exchange.views_count every VIEW_FLUSH_INTERVAL s; "none" stops counting
+    VIEW_COUNTER_BACKEND = os.getenv("VIEW_COUNTER_BACKEND", "memory")
+    VIEW_COUNTER_REDIS_URL = os.getenv("VIEW_COUNTER_REDIS_URL", "redis://localhost:6379/0")
+    VIEW_FLUSH_INTERVAL = float(os.getenv("VIEW_FLUSH_INTERVAL", 5))
+
+    # "Popular tours": the LEADERBOARD_SIZE most booked tours per city, kept per process ("memory")
+    # or in Redis sorted sets ("redis"), reloaded from booking_count every LEADERBOARD_TTL s
+    LEADERBOARD_BACKEND = os.getenv("LEADERBOARD_BACKEND", "memory")
+    LEADERBOARD_REDIS_URL = os.getenv("LEADERBOARD_REDIS_URL", "redis://localhost:6379/0")
+    LEADERBOARD_SIZE = int(os.getenv("LEADERBOARD_SIZE", 50))
+    LEADERBOARD_TTL = int(os.getenv("LEADERBOARD_TTL", 300))
+    HOME_TOP_TOURS = int(os.getenv("HOME_TOP_TOURS", 5))
+
+    # Per-request SQL stats (app.utils.sqlstats): a log line per request at DEBUG (static files
+    # excluded; set SQL_LOG_LEVEL=DEBUG to see it), a warning for statements slower than SQL_SLOW_MS (parameters redacted) and for a
+    # statement shape repeated SQL_N_PLUS_ONE_THRESHOLD times in one request. The Server-Timing
+    # header shows the query count and DB time to any client, so it is only sent with
+    # SQL_SERVER_TIMING=true or in debug mode.
+    SQL_INSTRUMENTATION = os.getenv("SQL_INSTRUMENTATION", "true").lower() == "true"
+    SQL_SERVER_TIMING = os.getenv("SQL_SERVER_TIMING", "false").lower() == "true"
+    SQL_LOG_LEVEL = os.getenv("SQL_LOG_LEVEL", "INFO")
+    SQL_SLOW_MS = float(os.getenv("SQL_SLOW_MS", 200))
+    SQL_N_PLUS_ONE_THRESHOLD = int(os.getenv("SQL_N_PLUS_ONE_THRESHOLD", 5))
+
+    # Prometheus /metrics (app.utils.metrics). Under gunicorn also export PROMETHEUS_MULTIPROC_DIR
+    # (an empty directory shared by the workers). Scrapes need "Authorization: Bearer <METRICS_TOKEN>";
+    # without a token /metrics only answers direct requests from loopback (404 otherwise).
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+    METRICS_SNAPSHOT_INTERVAL = float(os.getenv("METRICS_SNAPSHOT_INTERVAL", 5))
+
+    # Request profiling (app.utils.profiler), off by default. PROFILER_MODE: "cprofile" (pstats
+    # files) or "sampler" (speedscope files, low overhead). Profiles PROFILER_SAMPLE_RATE of requests
+    # and any request with "X-Profile: <PROFILER_TOKEN>"; /_profiles is open to the Bearer token and
+    # to the comma-separated PROFILER_ADMINS e-mails. Files: PROFILER_DIR (default instance/profiles)
+    PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "false").lower() == "true"
+    PROFILER_MODE = os.getenv("PROFILER_MODE", "sampler")
+    PROFILER_SAMPLE_RATE = float(os.getenv("PROFILER_SAMPLE_RATE", 0))
+    PROFILER_TOKEN = os.getenv("PROFILER_TOKEN", "")
+    PROFILER_ADMINS = os.getenv("PROFILER_ADMINS", "")
+    PROFILER_DIR = os.getenv("PROFILER_DIR", "")
+    PROFILER_INTERVAL_MS = float(os.getenv("PROFILER_INTERVAL_MS", 5))
+    PROFILER_KEEP = int(os.getenv("PROFILER_KEEP", 50))
+
+    # Jinja bytecode cache: compiled templates are stored in JINJA_BYTECODE_CACHE_DIR (default
+    # instance/jinja_cache) and reused by new workers; fill it at build time with `flask templates compile`
+    JINJA_BYTECODE_CACHE = os.getenv("JINJA_BYTECODE_CACHE", "true").lower() == "true"
+    JINJA_BYTECODE_CACHE_DIR = os.getenv("JINJA_BYTECODE_CACHE_DIR", "")
+
     # App timezone for displaying naive UTC timestamps
     APP_TZ = os.getenv("APP_TZ", "Europe/Moscow")
 
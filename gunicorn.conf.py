@@ -0,0 +1,46 @@
+"""gunicorn settings, read automatically from the working directory: ``gunicorn main:app``.
+
+The app is preloaded: the master runs create_app() once, compiles every
+template and freezes the heap (app.utils.prefork.prepare_for_fork), and the
+workers are forked from it sharing that memory copy-on-write. Each forked
+worker resets its engine pools, S3 client, media pool and in-process caches
+(an ``os.register_at_fork`` hook in app.utils.prefork). Set
+GUNICORN_PRELOAD=false to have every worker import the app itself again.
+
+With PROMETHEUS_MULTIPROC_DIR set the directory is emptied at startup and a
+dead worker's live gauges are dropped (``child_exit``).
+"""
+import glob
+import multiprocessing
+import os
+
+bind = os.getenv("GUNICORN_BIND", f"0.0.0.0:{os.getenv('PORT', '8000')}")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv("GUNICORN_THREADS", 1))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 30))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", 5))
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() == "true"
+accesslog = os.getenv("GUNICORN_ACCESS_LOG") or None
+
+
+def on_starting(server):
+    multiproc_dir = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if multiproc_dir:
+        os.makedirs(multiproc_dir, exist_ok=True)
+        for path in glob.glob(os.path.join(multiproc_dir, "*.db")):
+            os.remove(path)
+
+
+def when_ready(server):
+    # runs in the master after the preloaded app is imported and before the first worker is forked
+    if preload_app:
+        from app.utils.prefork import prepare_for_fork
+
+        prepare_for_fork(server.app.wsgi())
+
+
+def child_exit(server, worker):
+    from app.utils.metrics import mark_worker_dead
+
+    mark_worker_dead(worker.pid)
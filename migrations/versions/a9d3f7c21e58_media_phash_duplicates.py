@@ -0,0 +1,41 @@
+"""media objects: perceptual hash; housing_exchange.duplicate_of_id
+
+Revision ID: a9d3f7c21e58
+Revises: f4a8c2e6b1d3
+Create Date: 2026-10-19 18:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a9d3f7c21e58'
+down_revision = 'f4a8c2e6b1d3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Хэши существующих фото заполняются командой `flask media placeholders`
+    with op.batch_alter_table('media_objects', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('phash', sa.BigInteger(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_media_objects_phash'), ['phash'], unique=False)
+
+    with op.batch_alter_table('housing_exchange', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('duplicate_of_id', sa.Integer(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_housing_exchange_duplicate_of_id'), ['duplicate_of_id'], unique=False)
+        batch_op.create_foreign_key(
+            'fk_housing_exchange_duplicate_of_id', 'housing_exchange', ['duplicate_of_id'], ['id'], ondelete='SET NULL'
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('housing_exchange', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_housing_exchange_duplicate_of_id', type_='foreignkey')
+        batch_op.drop_index(batch_op.f('ix_housing_exchange_duplicate_of_id'))
+        batch_op.drop_column('duplicate_of_id')
+
+    with op.batch_alter_table('media_objects', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_media_objects_phash'))
+        batch_op.drop_column('phash')
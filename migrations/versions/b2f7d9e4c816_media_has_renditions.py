@@ -0,0 +1,30 @@
+"""media objects: has_renditions
+
+Revision ID: b2f7d9e4c816
+Revises: e5b8d3f1a624
+Create Date: 2026-10-19 23:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b2f7d9e4c816'
+down_revision = 'e5b8d3f1a624'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('media_objects', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('has_renditions', sa.Boolean(), nullable=True))
+    # Есть ли уменьшенные копии у старых загрузок, неизвестно: до `flask media derivatives` показываем оригинал
+    op.execute("UPDATE media_objects SET has_renditions = false")
+    with op.batch_alter_table('media_objects', schema=None) as batch_op:
+        batch_op.alter_column('has_renditions', existing_type=sa.Boolean(), nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table('media_objects', schema=None) as batch_op:
+        batch_op.drop_column('has_renditions')
@@ -0,0 +1,31 @@
+"""housing_exchange/remote_tourism: updated_at
+
+Revision ID: b6e1d4a8f270
+Revises: a9d3f7c21e58
+Create Date: 2026-10-19 19:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6e1d4a8f270'
+down_revision = 'a9d3f7c21e58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('housing_exchange', 'remote_tourism'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+        op.execute(f"UPDATE {table} SET updated_at = created_date")
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.alter_column('updated_at', existing_type=sa.DateTime(), nullable=False)
+
+
+def downgrade():
+    for table in ('remote_tourism', 'housing_exchange'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_column('updated_at')
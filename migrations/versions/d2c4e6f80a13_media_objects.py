@@ -0,0 +1,68 @@
+"""media objects (content-addressed uploads with reference counts)
+
+Revision ID: d2c4e6f80a13
+Revises: c15e753b2e64
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from collections import Counter
+from datetime import datetime
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2c4e6f80a13'
+down_revision = 'c15e753b2e64'
+branch_labels = None
+depends_on = None
+
+_UPLOAD_DIRS = ("listing_photos/", "tour_photos/", "avatars/")
+
+
+def _is_upload(path):
+    return isinstance(path, str) and not path.startswith("data:") and any(
+        path.startswith(d) or f"/{d}" in path for d in _UPLOAD_DIRS
+    )
+
+
+def upgrade():
+    media_objects = op.create_table('media_objects',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('path', sa.String(length=512), nullable=False),
+    sa.Column('sha256', sa.String(length=64), nullable=True),
+    sa.Column('ref_count', sa.Integer(), nullable=False),
+    sa.Column('created_date', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('media_objects', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_media_objects_path'), ['path'], unique=True)
+        batch_op.create_index(batch_op.f('ix_media_objects_sha256'), ['sha256'], unique=False)
+
+    # Существующие загрузки получают счётчик ссылок по текущим строкам
+    bind = op.get_bind()
+    counts = Counter()
+    for table in ("housing_exchange", "remote_tourism"):
+        for (photos,) in bind.execute(sa.text(f"SELECT photos FROM {table}")):
+            if isinstance(photos, str):
+                photos = json.loads(photos)
+            counts.update(p for p in photos or [] if _is_upload(p))
+    for (avatar,) in bind.execute(sa.text("SELECT avatar FROM users WHERE avatar IS NOT NULL")):
+        if _is_upload(avatar):
+            counts[avatar] += 1
+    now = datetime.utcnow()
+    if counts:
+        op.bulk_insert(media_objects, [
+            {"path": path, "sha256": None, "ref_count": n, "created_date": now}
+            for path, n in counts.items()
+        ])
+
+
+def downgrade():
+    with op.batch_alter_table('media_objects', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_media_objects_sha256'))
+        batch_op.drop_index(batch_op.f('ix_media_objects_path'))
+
+    op.drop_table('media_objects')
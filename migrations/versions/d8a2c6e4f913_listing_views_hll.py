@@ -0,0 +1,26 @@
+"""housing_exchange: views_hll
+
+Revision ID: d8a2c6e4f913
+Revises: c3f9a5b7d214
+Create Date: 2026-10-19 21:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd8a2c6e4f913'
+down_revision = 'c3f9a5b7d214'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('housing_exchange', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('views_hll', sa.LargeBinary(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('housing_exchange', schema=None) as batch_op:
+        batch_op.drop_column('views_hll')
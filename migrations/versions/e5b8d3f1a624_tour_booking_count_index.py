@@ -0,0 +1,34 @@
+"""remote_tourism: booking_count indexes
+
+Revision ID: e5b8d3f1a624
+Revises: d8a2c6e4f913
+Create Date: 2026-10-19 21:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5b8d3f1a624'
+down_revision = 'd8a2c6e4f913'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # booking_count раньше не обновлялся — пересчитываем по действующим броням
+    op.execute(
+        "UPDATE remote_tourism SET booking_count = ("
+        "SELECT COUNT(*) FROM bookings WHERE bookings.tourism_id = remote_tourism.id "
+        "AND bookings.status != 'cancelled')"
+    )
+    with op.batch_alter_table('remote_tourism', schema=None) as batch_op:
+        batch_op.create_index('ix_remote_tourism_city_booking_count', ['city', 'booking_count'], unique=False)
+        batch_op.create_index('ix_remote_tourism_booking_count', ['booking_count'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('remote_tourism', schema=None) as batch_op:
+        batch_op.drop_index('ix_remote_tourism_booking_count')
+        batch_op.drop_index('ix_remote_tourism_city_booking_count')
@@ -0,0 +1,26 @@
+"""move inline data: URL avatars into media storage
+
+Revision ID: e7b3a91c4d25
+Revises: d2c4e6f80a13
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7b3a91c4d25'
+down_revision = 'd2c4e6f80a13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Схема не меняется. Перенос аватаров из data: URL в хранилище выполняет
+    # команда `flask media inline-avatars` (после `flask db upgrade`): ей нужен
+    # живой конвейер загрузки (превью, размеры, заглушка), а миграция не должна
+    # зависеть от кода приложения, который будет меняться.
+    pass
+
+
+def downgrade():
+    pass
@@ -0,0 +1,31 @@
+"""media objects: dimensions and inline placeholder
+
+Revision ID: f4a8c2e6b1d3
+Revises: e7b3a91c4d25
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f4a8c2e6b1d3'
+down_revision = 'e7b3a91c4d25'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Существующие фото заполняются командой `flask media placeholders`
+    with op.batch_alter_table('media_objects', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('width', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('height', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('placeholder', sa.String(length=512), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('media_objects', schema=None) as batch_op:
+        batch_op.drop_column('placeholder')
+        batch_op.drop_column('height')
+        batch_op.drop_column('width')
@@ -0,0 +1,100 @@
+import os
+import tempfile
+
+import pytest
+
+# config.Config reads the environment at import time: point it at throwaway state before the app is imported
+_TMP = tempfile.mkdtemp(prefix="room2room-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_TMP, 'default.db')}"
+os.environ["JINJA_BYTECODE_CACHE_DIR"] = os.path.join(_TMP, "jinja_cache")
+os.environ.setdefault("PAGE_CACHE_ENABLED", "false")
+os.environ.setdefault("SQL_LOG_LEVEL", "WARNING")
+# uploads stay on the local disk unless a test brings its own storage client
+os.environ["S3_BUCKET"] = ""
+
+from app import create_app, db  # noqa: E402
+from config import Config  # noqa: E402
+
+
+@pytest.fixture
+def config():
+    """Config attributes to override before create_app(); override this fixture in a module."""
+    return {}
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch, config):
+    """A fresh app on its own SQLite file with the schema created (CSRF off for form posts).
+
+    No app context is left pushed: requests made through the test client then
+    get their own session, as they would in production. Set up data inside
+    ``with app.app_context():``.
+    """
+    monkeypatch.setattr(Config, "SQLALCHEMY_DATABASE_URI", f"sqlite:///{tmp_path / 'app.db'}")
+    for name, value in config.items():
+        monkeypatch.setattr(Config, name, value, raising=False)
+    app = create_app()
+    app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    with app.app_context():
+        # the models live on the default bind; a bind another test configured is remembered by db
+        db.create_all(bind_key=None)
+    yield app
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def make_user(app):
+    from app.models import User
+
+    created = []
+
+    def make_user(**fields) -> int:
+        n = len(created) + 1
+        user = User(username=f"user{n}", email=f"user{n}@example.com", password_hash="x", **fields)
+        db.session.add(user)
+        db.session.commit()
+        created.append(user.id)
+        return user.id
+
+    return make_user
+
+
+@pytest.fixture
+def login(client):
+    def login(user_id: int):
+        with client.session_transaction() as session:
+            session["_user_id"] = str(user_id)
+            session["_fresh"] = True
+
+    return login
+
+
+@pytest.fixture
+def static_dir(app, tmp_path):
+    """Local uploads (and renditions) go to a temporary static folder."""
+    folder = tmp_path / "static"
+    folder.mkdir()
+    app.static_folder = str(folder)
+    return folder
+
+
+@pytest.fixture
+def png():
+    """Bytes of a small PNG photo, distinct per ``seed``."""
+    import io
+
+    from PIL import Image
+
+    def png(seed: int = 0, size=(900, 600)) -> bytes:
+        buffer = io.BytesIO()
+        Image.new("RGB", size, ((seed * 40) % 256, 120, 200)).save(buffer, "PNG")
+        return buffer.getvalue()
+
+    return png
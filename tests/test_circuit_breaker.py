@@ -0,0 +1,132 @@
+import io
+
+import pytest
+
+from app.utils import helpers
+from app.utils.circuit_breaker import CircuitBreaker, CircuitOpenError
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def breaker(clock):
+    return CircuitBreaker("test", failure_threshold=3, reset_timeout=30, clock=clock)
+
+
+def test_opens_after_consecutive_failures(breaker):
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_success()
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED, "a success resets the failure count"
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+    assert breaker.stats()["trips"] == 1
+    assert breaker.stats()["rejected"] == 1
+
+
+def test_half_open_lets_one_probe_through(breaker, clock):
+    for _ in range(3):
+        breaker.record_failure()
+    clock.now += 29
+    assert not breaker.allow()
+    clock.now += 1
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow(), "only one probe at a time"
+    # a probe that never reports back is replaced after another reset_timeout
+    clock.now += 30
+    assert breaker.allow()
+
+
+def test_probe_success_closes(breaker, clock):
+    for _ in range(3):
+        breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow() and breaker.allow()
+
+
+def test_probe_failure_opens_again(breaker, clock):
+    for _ in range(3):
+        breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.stats()["trips"] == 2
+    clock.now += 29
+    assert not breaker.allow()
+
+
+@pytest.fixture
+def unreachable_s3(app, static_dir, monkeypatch):
+    """A real boto3 client for a bucket nobody listens for, with a fresh breaker (2 failures trip it)."""
+    pytest.importorskip("boto3")
+    monkeypatch.setattr(helpers, "_S3_CLIENT", None)
+    monkeypatch.setattr(helpers, "_S3_BREAKER", None)
+    app.config.update(
+        S3_BUCKET="test-bucket", S3_ENDPOINT_URL="http://127.0.0.1:9", S3_ACCESS_KEY_ID="test",
+        S3_SECRET_ACCESS_KEY="test", S3_MAX_ATTEMPTS=1, S3_CONNECT_TIMEOUT=0.5, S3_BREAKER_FAILURES=2,
+    )
+    with app.app_context():
+        client = helpers._get_s3_client()
+        sent = []
+        client.meta.events.register("before-send.s3", lambda request, **kwargs: sent.append(request.url))
+        yield client, sent
+
+
+def test_uploads_fall_back_to_disk_while_breaker_is_open(app, unreachable_s3, static_dir, clock):
+    client, sent = unreachable_s3
+    for i in range(2):
+        stored = helpers._store_object(io.BytesIO(b"photo"), f"listing_photos/{i}.png", "image/png")
+        assert stored == f"listing_photos/{i}.png"
+    assert helpers._S3_BREAKER.state == CircuitBreaker.OPEN
+    assert not helpers.s3_available()
+    attempts = len(sent)
+
+    # open: no request goes out, the upload lands on disk straight away
+    assert helpers._store_object(io.BytesIO(b"photo"), "listing_photos/2.png", "image/png") == "listing_photos/2.png"
+    assert (static_dir / "listing_photos" / "2.png").read_bytes() == b"photo"
+    assert len(sent) == attempts
+    assert helpers.s3_stats()["rejected"] >= 1
+
+    # half-open after the reset timeout: one probe is sent, its failure opens the breaker again
+    helpers._S3_BREAKER._clock = clock
+    helpers._S3_BREAKER._opened_at = clock.now - helpers._S3_BREAKER.reset_timeout
+    assert helpers.s3_available()
+    helpers._store_object(io.BytesIO(b"photo"), "listing_photos/3.png", "image/png")
+    assert len(sent) > attempts
+    assert helpers._S3_BREAKER.state == CircuitBreaker.OPEN
+
+
+def test_successful_probe_closes_the_breaker(app, unreachable_s3, clock):
+    from botocore.stub import Stubber
+
+    client, _sent = unreachable_s3
+    breaker = helpers._S3_BREAKER
+    breaker._clock = clock
+    for _ in range(2):
+        breaker.record_failure()
+    clock.now += breaker.reset_timeout
+    with Stubber(client) as stub:
+        stub.add_response("head_bucket", {})
+        client.head_bucket(Bucket="test-bucket")
+    assert breaker.state == CircuitBreaker.CLOSED
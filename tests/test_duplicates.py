@@ -0,0 +1,35 @@
+"""Near-duplicate detection: the catalogue index only ever holds committed uploads."""
+from app import db
+from app.models import MediaObject
+from app.utils import duplicates
+
+
+def _media(n: int, phash: int) -> MediaObject:
+    return MediaObject(path=f"listing_photos/{n:064x}.jpg", sha256=f"{n:064x}", ref_count=1, phash=phash)
+
+
+def test_index_skips_uncommitted_uploads(app):
+    with app.app_context():
+        db.session.add(_media(1, 0x0F0F))
+        db.session.commit()
+        # this request's own upload is flushed but may still roll back
+        db.session.add(_media(2, 0x0F0E))
+        db.session.flush()
+        index = duplicates._catalogue_index()
+        db.session.rollback()
+    assert [path for path, _ in index.query(0x0F0F)] == [f"listing_photos/{1:064x}.jpg"]
+
+
+def test_index_picks_up_rows_committed_out_of_id_order(app, monkeypatch):
+    with app.app_context():
+        db.session.add(_media(1, 0x0F0F))
+        db.session.commit()
+        duplicates._catalogue_index()
+        # a row with a lower id that commits only after the index was built
+        db.session.execute(db.insert(MediaObject).values(
+            id=0, path=f"listing_photos/{0:064x}.jpg", ref_count=1, phash=0x0F0E,
+        ))
+        db.session.commit()
+        monkeypatch.setattr(duplicates, "_INDEX_REBUILD_SECONDS", -1)
+        found = {path for path, _ in duplicates._catalogue_index().query(0x0F0F)}
+    assert f"listing_photos/{0:064x}.jpg" in found
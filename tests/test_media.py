@@ -0,0 +1,223 @@
+import io
+import os
+import time
+
+import pytest
+
+from app import db
+from app.models import HousingExchange, MediaObject, RemoteTourism
+from app.utils.images import derivative_paths
+
+
+def _new_listing(client, photos):
+    data = {"title": "Квартира у Кремля", "city": "Казань", "housing_type": "apartment",
+            "photos": [(io.BytesIO(content), f"photo{i}.png") for i, content in enumerate(photos)]}
+    response = client.post("/exchange/new", data=data, content_type="multipart/form-data")
+    assert response.status_code == 302
+    listing = db.session.execute(db.select(HousingExchange).order_by(HousingExchange.id.desc())).scalars().first()
+    return listing.id, listing.photos
+
+
+def test_upload_links_stored_renditions(app, client, make_user, login, static_dir, png):
+    with app.app_context():
+        login(make_user())
+        listing_id, photos = _new_listing(client, [png()])
+        row = db.session.execute(db.select(MediaObject).filter_by(path=photos[0])).scalar_one()
+        assert row.has_renditions
+    page = client.get(f"/exchange/{listing_id}").get_data(as_text=True)
+    assert photos[0].rsplit(".", 1)[0] + ".w800.jpg" in page
+    assert "<picture>" in page
+
+
+def test_failed_renditions_fall_back_to_original(app, client, make_user, login, static_dir, png, monkeypatch):
+    def broken(fileobj, widths):
+        raise OSError("encoder missing")
+        yield
+
+    monkeypatch.setattr("app.utils.helpers.render_derivatives", broken)
+    with app.app_context():
+        login(make_user())
+        listing_id, photos = _new_listing(client, [png()])
+        assert not db.session.execute(db.select(MediaObject.has_renditions).filter_by(path=photos[0])).scalar_one()
+    page = client.get(f"/exchange/{listing_id}").get_data(as_text=True)
+    assert f'src="/static/{photos[0]}"' in page
+    assert ".w800." not in page and "<picture>" not in page
+
+    # the backfill renders them and flags the row, after which pages link the renditions
+    monkeypatch.undo()
+    result = app.test_cli_runner().invoke(args=["media", "derivatives"])
+    assert "rendered: 1" in result.output
+    with app.app_context():
+        assert db.session.execute(db.select(MediaObject.has_renditions).filter_by(path=photos[0])).scalar_one()
+    assert ".w800.jpg" in client.get(f"/exchange/{listing_id}").get_data(as_text=True)
+
+
+def test_legacy_upload_without_row_uses_original(app, client, make_user):
+    with app.app_context():
+        owner = make_user()
+        listing = HousingExchange(owner_id=owner, title="Старое объявление", photos=["listing_photos/legacy.jpg"])
+        db.session.add(listing)
+        db.session.commit()
+        listing_id = listing.id
+    page = client.get(f"/exchange/{listing_id}").get_data(as_text=True)
+    assert 'src="/static/listing_photos/legacy.jpg"' in page
+    assert "legacy.w" not in page
+
+
+def _edit_listing(client, listing_id, delete=(), photos=()):
+    data = {"title": "Квартира у Кремля", "city": "Казань", "housing_type": "apartment",
+            "delete_photos": list(delete),
+            "photos": [(io.BytesIO(content), f"new{i}.png") for i, content in enumerate(photos)]}
+    response = client.post(f"/exchange/edit/{listing_id}", data=data, content_type="multipart/form-data")
+    assert response.status_code == 302
+
+
+def _stored(app, static_dir, path):
+    with app.app_context():
+        return [(static_dir / p).exists() for p in [path, *derivative_paths(path)]]
+
+
+def test_removed_photo_is_deleted_after_commit(app, client, make_user, login, static_dir, png):
+    app.config["MEDIA_DELETE_ASYNC"] = False
+    with app.app_context():
+        login(make_user())
+        listing_id, photos = _new_listing(client, [png(1), png(2)])
+    assert all(_stored(app, static_dir, photos[0]))
+
+    _edit_listing(client, listing_id, delete=[photos[0]])
+    assert not any(_stored(app, static_dir, photos[0]))
+    assert all(_stored(app, static_dir, photos[1]))
+
+
+_TOUR_FORM = {"title": "Казанский кремль", "city": "Казань", "price_per_hour": "500", "duration_hours": "2"}
+
+
+@pytest.mark.parametrize("kind", ["listing", "tour"])
+def test_photo_removed_and_uploaded_again_is_kept(app, client, make_user, login, static_dir, png, kind):
+    app.config["MEDIA_DELETE_ASYNC"] = False
+    with app.app_context():
+        login(make_user())
+        if kind == "listing":
+            item_id, photos = _new_listing(client, [png(1)])
+        else:
+            data = dict(_TOUR_FORM, photos=[(io.BytesIO(png(1)), "tour.png")])
+            assert client.post("/tourism/new", data=data, content_type="multipart/form-data").status_code == 302
+            tour = db.session.execute(db.select(RemoteTourism)).scalar_one()
+            item_id, photos = tour.id, tour.photos
+
+    # one request removes the photo and uploads the same bytes again
+    if kind == "listing":
+        _edit_listing(client, item_id, delete=[photos[0]], photos=[png(1)])
+    else:
+        data = dict(_TOUR_FORM, delete_photos=[photos[0]], photos=[(io.BytesIO(png(1)), "again.png")])
+        assert client.post(f"/tourism/edit/{item_id}", data=data, content_type="multipart/form-data").status_code == 302
+    with app.app_context():
+        model = HousingExchange if kind == "listing" else RemoteTourism
+        assert db.session.get(model, item_id).photos == photos
+        assert db.session.execute(db.select(MediaObject.ref_count).filter_by(path=photos[0])).scalar_one() == 1
+    assert all(_stored(app, static_dir, photos[0]))
+
+
+def test_deferred_deletion_rechecks_references(app, client, make_user, login, static_dir, png):
+    from app.utils.media_deletion import _flush_in_app
+
+    with app.app_context():
+        login(make_user())
+        _listing_id, photos = _new_listing(client, [png(1)])
+    # the pool task got a path that was referenced again after it was queued
+    _flush_in_app(app, photos)
+    assert all(_stored(app, static_dir, photos[0]))
+
+
+def test_direct_upload_claimed_with_renditions(app, client, make_user, login, static_dir, png):
+    with app.app_context():
+        login(make_user())
+    upload = client.post("/uploads/presign", json={"kind": "listing", "content_type": "image/png"}).get_json()
+    assert upload["method"] == "PUT"
+    assert client.put(upload["url"], data=png()).status_code == 204
+    photo = client.post("/uploads/complete", json={"kind": "listing", "token": upload["token"]}).get_json()["photo"]
+
+    data = {"title": "Квартира у Кремля", "city": "Казань", "housing_type": "apartment", "uploaded_photos": [photo]}
+    assert client.post("/exchange/new", data=data).status_code == 302
+    with app.app_context():
+        path = db.session.execute(db.select(HousingExchange.photos)).scalar_one()[0]
+        assert db.session.execute(db.select(MediaObject.has_renditions).filter_by(path=path)).scalar_one()
+    card = client.get("/exchange/").get_data(as_text=True)
+    assert "srcset=" in card and path.rsplit(".", 1)[0] + ".w" in card
+
+
+@pytest.mark.parametrize("config", [{"PAGE_CACHE_ENABLED": True}])
+def test_backfill_refreshes_cached_cards_and_pages(app, client, make_user, login, static_dir, png, monkeypatch):
+    def broken(fileobj, widths):
+        raise OSError("encoder missing")
+        yield
+
+    monkeypatch.setattr("app.utils.helpers.render_derivatives", broken)
+    with app.app_context():
+        login(make_user())
+        _, photos = _new_listing(client, [png()])
+    anonymous = app.test_client()
+    assert ".w800." not in anonymous.get("/exchange/").get_data(as_text=True)
+    assert anonymous.get("/exchange/").headers.get("X-Cache") == "HIT"
+
+    monkeypatch.undo()
+    app.test_cli_runner().invoke(args=["media", "derivatives"])
+    stem = photos[0].rsplit(".", 1)[0]
+    assert stem + ".w" in anonymous.get("/exchange/").get_data(as_text=True)
+    # the logged-in list bypasses the page cache: the card itself was re-rendered
+    assert stem + ".w" in client.get("/exchange/").get_data(as_text=True)
+
+
+def test_concurrent_first_upload_adds_a_reference(app):
+    from app.utils.images import StoredImage
+    from app.utils.media_refs import _insert_media, acquire_media
+
+    path = "listing_photos/" + "ab" * 32 + ".png"
+    with app.app_context():
+        acquire_media([StoredImage(path)])
+        db.session.commit()
+        # the request that lost the race saw no row either and inserts the same path
+        _insert_media(StoredImage(path, width=900, height=600, placeholder="data:x", has_renditions=True), 1)
+        db.session.commit()
+        row = db.session.execute(db.select(MediaObject).filter_by(path=path)).scalar_one()
+        assert (row.ref_count, row.width, row.placeholder, row.has_renditions) == (2, 900, "data:x", True)
+
+
+def test_gc_refuses_to_delete_with_unmapped_references(app, make_user, static_dir):
+    (static_dir / "listing_photos").mkdir()
+    orphan = static_dir / "listing_photos" / "orphan.jpg"
+    orphan.write_bytes(b"x")
+    os.utime(orphan, (time.time() - 3600, time.time() - 3600))
+    with app.app_context():
+        listing = HousingExchange(owner_id=make_user(), title="Квартира",
+                                  photos=["https://old-cdn.example.com/listing_photos/" + "cd" * 32 + ".jpg"])
+        db.session.add(listing)
+        db.session.commit()
+    runner = app.test_cli_runner()
+
+    result = runner.invoke(args=["media", "gc", "--grace-hours", "0"])
+    assert result.exit_code != 0 and "--force" in result.output
+    assert orphan.exists()
+
+    result = runner.invoke(args=["media", "gc", "--grace-hours", "0", "--force"])
+    assert result.exit_code == 0 and "unmapped: 1" in result.output
+    assert not orphan.exists()
+
+
+def test_inline_avatars_move_to_storage(app, make_user, static_dir, png):
+    import base64
+
+    with app.app_context():
+        inline = make_user(avatar="data:image/png;base64," + base64.b64encode(png(size=(400, 400))).decode())
+        broken = make_user(avatar="data:image/png;base64,not-base64!")
+    result = app.test_cli_runner().invoke(args=["media", "inline-avatars"])
+    assert "moved: 1, cleared: 1" in result.output
+    with app.app_context():
+        from app.models import User
+
+        avatar = db.session.get(User, inline).avatar
+        assert avatar.startswith("avatars/") and (static_dir / avatar).is_file()
+        row = db.session.execute(db.select(MediaObject).filter_by(path=avatar)).scalar_one()
+        assert (row.ref_count, row.width, row.has_renditions) == (1, 400, True)
+        assert row.placeholder
+        assert db.session.get(User, broken).avatar is None
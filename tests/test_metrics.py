@@ -0,0 +1,52 @@
+"""/metrics: running totals exported as counters, and who may scrape."""
+import pytest
+from prometheus_client import REGISTRY
+
+from app.utils import metrics, view_counter
+
+
+def _flushed() -> float:
+    return REGISTRY.get_sample_value("listing_views_total", {"event": "flushed"}) or 0.0
+
+
+def test_running_totals_are_counters(app, client, monkeypatch):
+    monkeypatch.setitem(view_counter._stats, "flushed", 0)
+    with app.app_context():
+        metrics.snapshot_stats(app)
+    before = _flushed()
+
+    monkeypatch.setitem(view_counter._stats, "flushed", 5)
+    with app.app_context():
+        metrics.snapshot_stats(app)
+        metrics.snapshot_stats(app)
+    assert _flushed() == before + 5
+
+    # the subsystem restarted from zero (a forked worker): the counter keeps going up
+    monkeypatch.setitem(view_counter._stats, "flushed", 2)
+    with app.app_context():
+        metrics.snapshot_stats(app)
+    assert _flushed() == before + 7
+
+    body = client.get("/metrics").get_data(as_text=True)
+    for name in ("listing_views", "s3_calls", "db_pool_checkouts", "cache_hits"):
+        assert f"# TYPE {name}_total counter" in body
+    assert "# TYPE db_pool_connections gauge" in body
+
+
+@pytest.mark.parametrize("remote_addr, headers, status", [
+    ("127.0.0.1", {}, 200),
+    ("::1", {}, 200),
+    ("10.0.0.5", {}, 404),
+    ("127.0.0.1", {"X-Forwarded-For": "203.0.113.9"}, 404),
+])
+def test_without_token_only_direct_loopback_scrapes(client, remote_addr, headers, status):
+    response = client.get("/metrics", headers=headers, environ_base={"REMOTE_ADDR": remote_addr})
+    assert response.status_code == status
+
+
+@pytest.mark.parametrize("config", [{"METRICS_TOKEN": "s3cret"}])
+@pytest.mark.parametrize("authorization, status", [(None, 401), ("Bearer wrong", 401), ("Bearer s3cret", 200)])
+def test_token_is_required_when_set(client, authorization, status):
+    headers = {"Authorization": authorization} if authorization else {}
+    response = client.get("/metrics", headers=headers, environ_base={"REMOTE_ADDR": "10.0.0.5"})
+    assert response.status_code == status
@@ -0,0 +1,46 @@
+import pytest
+
+from app import db
+from app.models import HousingExchange
+
+
+@pytest.fixture
+def config():
+    return {"PAGE_CACHE_ENABLED": True, "PAGE_CACHE_BACKEND": "memory"}
+
+
+@pytest.fixture
+def listing_id(app, make_user):
+    with app.app_context():
+        listing = HousingExchange(owner_id=make_user(), title="Квартира", city="Казань")
+        db.session.add(listing)
+        db.session.commit()
+        return listing.id
+
+
+def test_anonymous_pages_are_shared_per_cookie(client, listing_id):
+    for expected in ("MISS", "HIT"):
+        response = client.get(f"/exchange/{listing_id}")
+        assert response.headers["X-Cache"] == expected
+        assert "public" in response.headers["Cache-Control"]
+        assert "s-maxage" in response.headers["Cache-Control"]
+        assert "Cookie" in response.vary
+
+
+def test_signed_in_pages_are_private(client, login, make_user, app, listing_id):
+    client.get(f"/exchange/{listing_id}")
+    with app.app_context():
+        login(make_user())
+    response = client.get(f"/exchange/{listing_id}")
+    assert "X-Cache" not in response.headers
+    assert response.cache_control.private
+    assert not response.cache_control.public
+    assert "Cookie" in response.vary
+
+
+def test_home_page_is_not_cached(client):
+    for _ in range(2):
+        response = client.get("/")
+        assert response.status_code == 200
+        assert "X-Cache" not in response.headers
+        assert "s-maxage" not in response.headers.get("Cache-Control", "")
@@ -0,0 +1,60 @@
+"""Query budgets of the list and detail pages: the count must not grow with the number of rows shown."""
+from datetime import date, timedelta
+
+import pytest
+
+from app import db
+from app.models import Booking, HousingExchange, RemoteTourism, Review
+from app.utils.sqlstats import assert_num_queries
+
+
+def _populate(make_user, rows: int):
+    """``rows`` listings and tours by different owners, each booked and reviewed by the first user; returns ids."""
+    me = make_user()
+    today = date.today()
+    for i in range(rows):
+        owner = make_user(city="Казань", rating=4.5, review_count=1)
+        listing = HousingExchange(owner_id=owner, title=f"Квартира {i}", city="Казань",
+                                  housing_type="apartment", photos=["images/Attractions/kremlin.png"])
+        tour = RemoteTourism(guide_id=owner, title=f"Экскурсия {i}", city="Казань", price_per_hour=500,
+                             photos=["images/Attractions/kremlin.png"])
+        db.session.add_all([listing, tour])
+        db.session.flush()
+        db.session.add_all([
+            Booking(user_id=me, exchange_id=listing.id, start_date=today, end_date=today + timedelta(days=2)),
+            Booking(user_id=me, tourism_id=tour.id, start_date=today, end_date=today, hours=2),
+            Review(reviewer_id=me, reviewed_id=owner, exchange_id=listing.id, rating=5, comment="Отлично"),
+            Review(reviewer_id=owner, reviewed_id=me, tourism_id=tour.id, rating=4, comment="Хорошо"),
+        ])
+    db.session.commit()
+    return me, listing.id, tour.id
+
+
+# (page, logged in, statements); a logged-in request also loads the user, an anonymous
+# detail page first checks the timestamps behind its ETag
+PAGES = [
+    ("/exchange/", False, 1),
+    ("/exchange/{listing}", False, 2),
+    ("/tourism/", False, 1),
+    ("/tourism/{tour}", False, 2),
+    ("/exchange/{listing}", True, 2),
+    ("/tourism/{tour}", True, 2),
+    ("/account/", True, 5),
+    ("/account/bookings", True, 4),
+    ("/exchange/my", True, 2),
+    ("/account/tours", True, 2),
+]
+
+
+@pytest.mark.parametrize("rows", [2, 12])
+@pytest.mark.parametrize("url, logged_in, expected", PAGES)
+def test_query_budget(app, client, make_user, login, rows, url, logged_in, expected):
+    with app.app_context():
+        me, listing, tour = _populate(make_user, rows)
+        engine = db.engine
+    if logged_in:
+        login(me)
+    url = url.format(listing=listing, tour=tour)
+    with assert_num_queries(expected, engine=engine, label=url):
+        response = client.get(url)
+    assert response.status_code == 200
@@ -0,0 +1,72 @@
+import pytest
+from flask import g
+from sqlalchemy import select
+
+from app import db
+from app.models import HousingExchange, User
+from app.utils.sqlstats import count_queries
+
+
+@pytest.fixture
+def config(tmp_path):
+    return {"SQLALCHEMY_BINDS": {"replica": f"sqlite:///{tmp_path / 'replica.db'}"}, "REPLICA_STICKY_SECONDS": 30}
+
+
+@pytest.fixture
+def engines(app):
+    """Both databases hold the same rows, except for the listing title, which tells them apart."""
+    with app.app_context():
+        primary, replica = db.engines[None], db.engines["replica"]
+        db.metadata.create_all(replica)
+        for engine, title in ((primary, "primary"), (replica, "replica")):
+            with engine.begin() as conn:
+                conn.execute(User.__table__.insert(), {"id": 1, "username": "owner", "email": "owner@example.com",
+                                                       "password_hash": "x"})
+                conn.execute(HousingExchange.__table__.insert(), {"id": 1, "owner_id": 1, "title": title})
+        return primary, replica
+
+
+def test_get_of_a_read_only_view_reads_from_the_replica(client, engines):
+    primary, replica = engines
+    with count_queries(primary) as on_primary, count_queries(replica) as on_replica:
+        page = client.get("/exchange/1").get_data(as_text=True)
+    assert "replica" in page and "primary" not in page
+    assert on_primary.count == 0 and on_replica.count > 0
+
+
+def test_other_views_and_writes_use_the_primary(app, client, login, engines):
+    primary, replica = engines
+    login(1)
+    with count_queries(replica) as on_replica:
+        response = client.post("/exchange/edit/1", data={"title": "edited", "housing_type": "apartment"})
+        assert response.status_code == 302
+        client.get("/exchange/my")
+    assert on_replica.count == 0
+    with app.app_context():
+        assert db.session.get(HousingExchange, 1).title == "edited"
+
+
+def test_user_who_wrote_reads_from_the_primary(client, login, engines):
+    primary, replica = engines
+    login(1)
+    client.post("/exchange/edit/1", data={"title": "edited", "housing_type": "apartment"})
+    with count_queries(replica) as on_replica:
+        page = client.get("/exchange/1").get_data(as_text=True)
+    assert "edited" in page
+    assert on_replica.count == 0
+
+
+def test_read_after_write_in_a_replica_request_uses_the_primary(app, engines):
+    primary, replica = engines
+    with app.test_request_context("/exchange/1"):
+        g._use_replica = True
+        assert db.session.execute(select(HousingExchange.title)).scalar_one() == "replica"
+        db.session.add(HousingExchange(id=2, owner_id=1, title="new"))
+        with count_queries(replica) as on_replica:
+            db.session.flush()
+            titles = db.session.execute(select(HousingExchange.title).order_by(HousingExchange.id)).scalars().all()
+            locked = db.session.execute(select(HousingExchange).where(HousingExchange.id == 1).with_for_update()).scalar_one()
+        assert titles == ["primary", "new"]
+        assert locked.title == "primary"
+        assert on_replica.count == 0
+        db.session.rollback()
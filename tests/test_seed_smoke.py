@@ -0,0 +1,74 @@
+"""Smoke tests on ``flask seed`` data (``pytest -m e2e``): every hot route renders as the heavy
+seeded user, and a run is reproducible for a given seed and date."""
+import pytest
+from flask import url_for
+
+from app import db
+from app.models import HousingExchange, Message, RemoteTourism, User
+from app.utils.seed import SCALES, seed
+
+pytestmark = pytest.mark.e2e
+
+
+@pytest.fixture
+def seeded(app):
+    """The ``small`` scale seeded; returns the ids the routes are requested with (as benchmarks/e2e.py)."""
+    with app.app_context():
+        seed(SCALES["small"])
+        user = db.session.execute(db.select(db.func.min(User.id))).scalar()
+        partner = db.session.execute(
+            db.select(Message.sender_id).where(Message.receiver_id == user).limit(1)
+        ).scalar()
+        listing = db.session.execute(
+            db.select(HousingExchange).where(HousingExchange.is_active.is_(True)).limit(1)
+        ).scalar()
+        tour = db.session.execute(db.select(RemoteTourism).where(RemoteTourism.guide_id != user).limit(1)).scalar()
+        with app.test_request_context():
+            photos = [url_for("static", filename=p) for p in listing.photos + tour.photos]
+        return {"user": user, "partner": partner, "city": listing.city, "listing": listing.id,
+                "tour": tour.id, "photos": photos}
+
+
+def test_seeded_routes_render(client, login, seeded):
+    anonymous = [
+        "/",
+        "/exchange/",
+        f"/exchange/?city={seeded['city']}",
+        f"/exchange/{seeded['listing']}",
+        "/tourism/",
+        f"/tourism/{seeded['tour']}",
+        *seeded["photos"],
+    ]
+    for url in anonymous:
+        assert client.get(url).status_code == 200, url
+
+    login(seeded["user"])
+    for url in [
+        "/messages/",
+        f"/messages/chat/{seeded['partner']}",
+        f"/exchange/{seeded['listing']}",
+        f"/tourism/{seeded['tour']}",
+        "/account/",
+        "/account/bookings",
+        "/account/tours",
+        "/exchange/my",
+    ]:
+        assert client.get(url).status_code == 200, url
+
+
+def test_seed_is_reproducible_for_a_date(app):
+    from datetime import date
+
+    def run():
+        db.drop_all(bind_key=None)
+        db.create_all(bind_key=None)
+        counts = {"users": 5, "listings": 8, "tours": 4, "bookings": 10, "messages": 30}
+        seed(counts, rng_seed=7, today=date(2026, 1, 15))
+        return {
+            table.name: [{k: v for k, v in row.items() if k != "password_hash"}
+                         for row in db.session.execute(table.select()).mappings()]
+            for table in db.metadata.sorted_tables
+        }
+
+    with app.app_context():
+        assert run() == run()
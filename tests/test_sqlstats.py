@@ -0,0 +1,26 @@
+import logging
+
+import pytest
+
+
+def test_no_server_timing_by_default(client):
+    assert "Server-Timing" not in client.get("/exchange/").headers
+
+
+@pytest.mark.parametrize("config", [{"SQL_SERVER_TIMING": True}])
+def test_server_timing_when_enabled(client):
+    assert 'desc="1 queries"' in client.get("/exchange/").headers["Server-Timing"]
+
+
+def test_server_timing_in_debug_mode(app, client):
+    app.debug = True
+    assert "Server-Timing" in client.get("/exchange/").headers
+
+
+def test_request_line_is_debug_and_skips_static(client, caplog):
+    with caplog.at_level(logging.DEBUG, logger="app.utils.sqlstats"):
+        client.get("/exchange/")
+        client.get("/static/images/hero-mountains.png")
+    lines = [r for r in caplog.records if r.getMessage().startswith("sql_stats")]
+    assert [r.levelno for r in lines] == [logging.DEBUG]
+    assert "endpoint=exchange.listing_search" in lines[0].getMessage()
@@ -0,0 +1,93 @@
+import logging
+from collections import defaultdict
+
+import pytest
+
+from app.utils import view_counter
+from app.utils.view_counter import RedisViewBuffer
+
+
+class FakeRedis:
+    """The few hash commands RedisViewBuffer uses; ``fail_reads`` makes HGETALL raise."""
+
+    def __init__(self):
+        self.hashes = defaultdict(dict)
+        self.fail_reads = False
+
+    def rename(self, src, dst):
+        if src not in self.hashes:
+            raise RuntimeError("ERR no such key")
+        self.hashes[dst] = self.hashes.pop(src)
+
+    def hgetall(self, key):
+        if self.fail_reads:
+            raise ConnectionError("Redis went away")
+        return {str(k).encode(): str(v).encode() for k, v in self.hashes.get(key, {}).items()}
+
+    def hincrby(self, key, field, n):
+        self.hashes[key][field] = self.hashes[key].get(field, 0) + n
+
+    def delete(self, *keys):
+        for key in keys:
+            self.hashes.pop(key, None)
+
+    def pfadd(self, key, value):
+        pass
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args: self.calls.append((name, args))
+
+    def execute(self):
+        for name, args in self.calls:
+            getattr(self.client, name)(*args)
+
+
+@pytest.fixture
+def buffer():
+    buffer = RedisViewBuffer.__new__(RedisViewBuffer)
+    buffer._client = FakeRedis()
+    buffer._unread = []
+    return buffer
+
+
+def test_drain_keeps_the_renamed_hash_when_the_read_fails(buffer):
+    for _ in range(3):
+        buffer.record(7, "visitor")
+    buffer._client.fail_reads = True
+    assert buffer.drain() == ({}, {})
+    left = [key for key in buffer._client.hashes if key.startswith("views:pending:")]
+    assert len(left) == 1 and buffer._client.hashes[left[0]] == {7: 3}
+
+    buffer.record(7, "visitor")
+    buffer._client.fail_reads = False
+    counts, _ = buffer.drain()
+    assert counts == {7: 4}
+    assert not buffer._client.hashes
+
+
+def test_flush_loop_survives_a_failed_flush(monkeypatch, caplog):
+    class Stop(BaseException):
+        pass
+
+    calls = []
+
+    def flush(app):
+        calls.append(app)
+        if len(calls) == 1:
+            raise ConnectionError("Redis went away")
+        raise Stop
+
+    monkeypatch.setattr(view_counter, "flush_views", flush)
+    with caplog.at_level(logging.ERROR, logger="app.utils.view_counter"), pytest.raises(Stop):
+        view_counter._flush_loop(object(), 0)
+    assert len(calls) == 2
+    assert "View count flush failed" in caplog.text